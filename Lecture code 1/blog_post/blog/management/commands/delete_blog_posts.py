@@ -1,11 +1,11 @@
 from django.core.management.base import BaseCommand
+from blog.counters import update_blog_posts
 from blog.models import BlogPost  # Replace with your actual app and model
 
 class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
-        blog_post_count = BlogPost.objects.filter(active=False).count()
-        BlogPost.objects.filter(active=False).update(deleted=True)
+        blog_post_count = update_blog_posts(BlogPost.objects.filter(active=False), deleted=True)
 
         self.stdout.write(self.style.SUCCESS(
             f"Updated Blog posts: {blog_post_count}"
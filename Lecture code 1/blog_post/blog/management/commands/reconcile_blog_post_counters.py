@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog import counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the BlogPost counters from the table and repairs any drift'
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for key, difference in sorted(drift.items()):
+            self.stdout.write(f"{key}: {difference:+d}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled blog post counters, {len(drift)} repaired"
+        ))
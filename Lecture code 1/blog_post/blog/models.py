@@ -57,6 +57,13 @@ class BlogPost(models.Model):
     def get_images(self):
         return BlogPostImage.objects.filter(blog_post=self.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so post_save can tell which state the row moved out of
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     # @property
     # def banner_image(self):
     #     return self.banner_image if self.banner_image else None
@@ -101,3 +108,15 @@ class BlogPostImage(models.Model):
 
     def __str__(self):
         return f'{self.blog_post.title} - {self.id} image'
+
+
+class BlogPostCounter(models.Model):
+    key = models.CharField(verbose_name='Key', max_length=50, unique=True)
+    value = models.BigIntegerField(verbose_name='Value', default=0)
+
+    class Meta:
+        verbose_name = "Blog Post Counter"
+        verbose_name_plural = "Blog Post Counters"
+
+    def __str__(self):
+        return f'{self.key} - {self.value}'
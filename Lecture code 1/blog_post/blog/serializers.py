@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from blog import counters
 from blog.models import BlogPost, BannerImage, Author
+from blog.uploads import validate_image_header
 
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -57,7 +59,11 @@ class BlogPostCreateUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         banner_image = validated_data.pop('banner_image', None)
-        BlogPost.objects.filter(id=instance.id).update(**validated_data)
+        # update() sends no signals, the counters are kept by update_blog_posts()
+        counters.update_blog_posts(BlogPost.objects.filter(id=instance.id), **validated_data)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        counters.remember_state(instance)
         if banner_image:
             if BannerImage.objects.filter(blog_post=instance).exists():
                 instance.banner_image.image = banner_image
@@ -77,10 +83,9 @@ class ReorderBlogPostSerializer(serializers.Serializer):
     asc_desc = serializers.CharField(label='Asc-Desc', required=True)
 
 
-class BlogPostBannerSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = BannerImage
-        fields = ['image']
+class BlogPostBannerSerializer(serializers.Serializer):
+    # Checked from the header, ImageField would read the whole file into Pillow
+    image = serializers.FileField(label='Image', validators=[validate_image_header])
 
 class SendBlogPostEmailSerializer(serializers.Serializer):
     email = serializers.EmailField(label="Email", required=True)
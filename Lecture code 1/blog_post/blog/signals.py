@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog import counters
+from blog.models import BlogPost
+
+
+@receiver(post_save, sender=BlogPost)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counters.record_saved(instance, created)
+
+
+@receiver(post_delete, sender=BlogPost)
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.record_deleted(instance)
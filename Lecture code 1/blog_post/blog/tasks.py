@@ -1,6 +1,7 @@
 from celery import shared_task
 from django.core.mail import send_mail
 
+from blog.counters import update_blog_posts
 from blog.models import BlogPost, BannerImage
 from blog_post import settings
 
@@ -11,8 +12,7 @@ def send_email_task(email: str):
 
 @shared_task
 def delete_blog_post():
-    blog_post_count = BlogPost.objects.filter(active=False).count()
-    BlogPost.objects.filter(active=False).update(deleted=True)
+    blog_post_count = update_blog_posts(BlogPost.objects.filter(active=False), deleted=True)
     print(f"Updated Blog posts: {blog_post_count}")
 
 @shared_task
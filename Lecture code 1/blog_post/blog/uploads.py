@@ -0,0 +1,78 @@
+"""
+Uploads that are never held in memory whole.
+
+The upload handlers in settings.FILE_UPLOAD_HANDLERS hash every file while
+Django receives it in chunks. Small files stay in memory as usual (up to
+FILE_UPLOAD_MAX_MEMORY_SIZE), larger ones are written to a temporary file
+that storage.save() moves into place instead of copying. The SHA-256 hex
+digest ends up on the uploaded file as `sha256`.
+
+validate_image_header() checks an image upload from its header, without
+decoding (or, like ImageField, verifying) the pixel data.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from PIL import Image
+
+IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Bytes read at a time when a file has to be hashed after the fact
+HASH_CHUNK_SIZE = 64 * 2 ** 10
+
+
+class HashingUploadHandlerMixin:
+
+    def new_file(self, *args, **kwargs):
+        # Before super(), a handler taking the file raises StopFutureHandlers there
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        # None means this handler kept the chunk, a handler passing it on doesn't hash it
+        if remaining is None:
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def get_sha256(file):
+    """SHA-256 hex digest of file, taken from the upload handlers when they saw it."""
+    sha256 = getattr(file, 'sha256', None)
+    if sha256 is not None:
+        return sha256
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    file.sha256 = digest.hexdigest()
+    return file.sha256
+
+
+def validate_image_header(file):
+    # Image.open() only parses the header, the pixel data is read on load()
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format = image.format
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image. The file is either not an image or a corrupted image.')
+    finally:
+        file.seek(0)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError(f"Unsupported image format {image_format}, use one of: {', '.join(sorted(IMAGE_FORMATS))}.")
@@ -1,10 +1,10 @@
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 
+from blog import counters
 from blog.filter_set import BlogPostFilter
 from blog.tasks import delete_blog_post, reorder_blog_post, add_banner_image, send_blog_post_to_email
 from blog.models import BlogPost, Author
@@ -20,6 +20,7 @@ from blog.serializers import (
     BlogPostBannerSerializer,
     SendBlogPostEmailSerializer
 )
+from blog.uploads import get_sha256
 
 
 class BlogPostListViewSet(mixins.ListModelMixin,
@@ -92,9 +93,10 @@ class BlogPostViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         res = super().list(request, *args, **kwargs)
+        totals = counters.get_counts()
         res.data = {
-            "count": self.get_queryset().count(),
-            "deleted_count": BlogPost.objects.filter(deleted=True).count(),
+            "count": totals.get('live', 0),
+            "deleted_count": totals.get('deleted', 0),
             "results": res.data,
         }
         return res
@@ -155,10 +157,12 @@ class BlogPostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        file_path = default_storage.save(f"banner_image/{image.name}", ContentFile(image.read()))
+        # Hashed while it was received, stored by moving the temporary file or copying it chunk by chunk
+        sha256 = get_sha256(image)
+        file_path = default_storage.save(f"banner_image/{image.name}", image)
         add_banner_image.delay(image_url=file_path, blog_post_id=self.get_object().id)
         return Response(
-            {'status': 'banner image successfully created'},
+            {'status': 'banner image successfully created', 'sha256': sha256},
             status=status.HTTP_200_OK
         )
     @action(detail=True, methods=['post'])
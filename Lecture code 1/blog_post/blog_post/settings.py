@@ -153,6 +153,12 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Django's handlers, hashing every upload while it is received (see blog.uploads)
+FILE_UPLOAD_HANDLERS = [
+    'blog.uploads.HashingMemoryFileUploadHandler',
+    'blog.uploads.HashingTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,10 +1,11 @@
 from django.contrib import admin
-from blog.models import BlogPost, BlogPostImage, Author, BlogPostCover
+from blog.models import BlogPost, BlogPostImage, Author, BlogPostCover, ArchivedBlogPost
 
 
 admin.site.register(BlogPostImage)
 admin.site.register(Author)
 admin.site.register(BlogPostCover)
+admin.site.register(ArchivedBlogPost)
 
 
 @admin.register(BlogPost)
@@ -16,7 +17,7 @@ class BlogPostAdmin(admin.ModelAdmin):
     filter_horizontal = ('authors',)  # for ManyToMany fields
 
     # Optional: make fields read-only
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'deleted_at')
 
     fieldsets = (
         (None, {
@@ -29,6 +30,6 @@ class BlogPostAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
         ('Status', {
-            'fields': ('deleted', 'published', 'archived')
+            'fields': ('deleted', 'deleted_at', 'published', 'archived')
         }),
     )
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from blog import signals
+
+        post_migrate.connect(signals.ensure_search_index, sender=self)
@@ -0,0 +1,186 @@
+"""
+Cold storage for archived and long-deleted blog posts.
+
+archive_blog_posts() moves them out of blog_blogpost in chunks, into
+ArchivedBlogPost rows that keep the original id, owner, authors (and
+authors_2 links), cover and images with their variants.
+restore_blog_posts() moves them back as live posts. Counters and cached
+responses follow the hot table, so a moved post leaves the counters and the
+lists like a deleted one.
+"""
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from blog import blobs, counters
+from blog.bulk import DUPLICATE_MESSAGE
+from blog.cache import invalidate_blog_posts
+from blog.jobs import CHUNK_SIZE, get_deleted_before, run_in_chunks
+from blog.models import (
+    ArchivedBlogPost,
+    ArchivedBlogPostImage,
+    BlogPost,
+    BlogPostAuthorThroughTable,
+    BlogPostCover,
+    BlogPostImage,
+)
+
+ARCHIVE_JOB = 'archive_blog_posts'
+# Columns both tables share, BlogPost and ArchivedBlogPost keep them in step
+FIELDS = [field.attname for field in BlogPost._meta.concrete_fields]
+
+
+def get_archivable_blog_posts(days=None):
+    if days is None:
+        days = settings.BLOG_POST_ARCHIVE_DELETED_AFTER_DAYS
+    return BlogPost.objects.filter(Q(archived=True) | Q(pk__in=get_deleted_before(days).values('pk')))
+
+
+def group_by_post(rows, key='blog_post_id'):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.pop(key)].append(row)
+    return grouped
+
+
+def move_to_archive(blog_posts):
+    """Copies the posts with their relations into the archive and deletes them from the hot table."""
+    rows = list(blog_posts.order_by('pk').values(*FIELDS))
+    ids = [row['id'] for row in rows]
+    authors = BlogPost.authors.through.objects.filter(blogpost_id__in=ids).values_list('blogpost_id', 'author_id')
+    author_links = group_by_post(
+        BlogPostAuthorThroughTable.objects.filter(blog_post_id__in=ids).order_by('id').values(
+            'blog_post_id', 'authors_id', 'date'))
+    covers = {
+        blog_post_id: {'cover_image': image, 'cover_variants': variants}
+        for blog_post_id, image, variants in BlogPostCover.objects.filter(blog_post_id__in=ids).values_list(
+            'blog_post_id', 'image', 'variants')
+    }
+    images = list(BlogPostImage.objects.filter(blog_post_id__in=ids).order_by('id').values_list(
+        'blog_post_id', 'image', 'variants'))
+
+    ArchivedBlogPost.objects.bulk_create(
+        ArchivedBlogPost(
+            **row,
+            **covers.get(row['id'], {}),
+            author_links=[
+                {'author_id': link['authors_id'], 'date': link['date'].isoformat()}
+                for link in author_links.get(row['id'], [])
+            ],
+        )
+        for row in rows
+    )
+    ArchivedBlogPost.authors.through.objects.bulk_create(
+        ArchivedBlogPost.authors.through(archivedblogpost_id=blog_post_id, author_id=author_id)
+        for blog_post_id, author_id in authors
+    )
+    ArchivedBlogPostImage.objects.bulk_create(
+        ArchivedBlogPostImage(blog_post_id=blog_post_id, image=image, variants=variants)
+        for blog_post_id, image, variants in images
+    )
+    # Files stay where they are, the archive rows point at them now. The hot rows release
+    # their blobs in post_delete, the archive tables send no signals.
+    blobs.retain([
+        *(row['document'] for row in rows),
+        *(cover['cover_image'] for cover in covers.values()),
+        *(image for _, image, _ in images),
+    ])
+    with counters.batch():
+        BlogPost.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_blog_posts(days=None, chunk_size=CHUNK_SIZE, dry_run=False, restart=False, pause=0, progress=None):
+    """Moves archived posts, and posts deleted more than `days` ago, to the archive."""
+    return run_in_chunks(
+        ARCHIVE_JOB,
+        get_archivable_blog_posts(days),
+        move_to_archive,
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        restart=restart,
+        pause=pause,
+        progress=progress,
+    )
+
+
+def check_free_titles(rows):
+    """
+    Reports, per id, the rows whose (title, text) pair is taken by a live
+    post or by an earlier row. An archived post frees its pair, and nothing
+    writing the hot table checks the archive.
+    """
+    ids_by_pair = defaultdict(list)
+    for row in rows:
+        ids_by_pair[(row['title'], row['text'])].append(row['id'])
+    taken = set(BlogPost.objects.filter(
+        title__in={title for title, text in ids_by_pair}).values_list('title', 'text'))
+    errors = {
+        blog_post_id: [DUPLICATE_MESSAGE]
+        for pair, ids in ids_by_pair.items()
+        for blog_post_id in (ids if pair in taken else ids[1:])
+    }
+    if errors:
+        raise serializers.ValidationError({'ids': errors})
+
+
+def restore_blog_posts(archived_blog_posts):
+    """
+    Moves archived posts back to the hot table as live posts, with archived
+    and deleted cleared. Returns the number of restored posts. Restores
+    nothing, and raises a ValidationError, when a live post took the
+    (title, text) pair of one of them.
+    """
+    with transaction.atomic():
+        rows = list(archived_blog_posts.select_for_update().order_by('pk').values(
+            *FIELDS, 'cover_image', 'cover_variants', 'author_links'))
+        if not rows:
+            return 0
+        check_free_titles(rows)
+        ids = [row['id'] for row in rows]
+        covers = {row['id']: (row.pop('cover_image'), row.pop('cover_variants')) for row in rows}
+        author_links = {row['id']: row.pop('author_links') for row in rows}
+
+        restored = BlogPost.objects.bulk_create(
+            BlogPost(**{**row, 'archived': False, 'deleted': False, 'deleted_at': None}) for row in rows
+        )
+        # bulk_create() stamps auto_now/auto_now_add fields, put the original values back
+        for blog_post, row in zip(restored, rows):
+            blog_post.created_at = row['created_at']
+            blog_post.updated_at = row['updated_at']
+        BlogPost.objects.bulk_update(restored, ['created_at', 'updated_at'])
+
+        BlogPost.authors.through.objects.bulk_create(
+            BlogPost.authors.through(blogpost_id=blogpost_id, author_id=author_id)
+            for blogpost_id, author_id in ArchivedBlogPost.authors.through.objects.filter(
+                archivedblogpost_id__in=ids).values_list('archivedblogpost_id', 'author_id')
+        )
+        BlogPostAuthorThroughTable.objects.bulk_create(
+            BlogPostAuthorThroughTable(
+                blog_post_id=blog_post_id, authors_id=link['author_id'], date=date.fromisoformat(link['date']))
+            for blog_post_id, links in author_links.items()
+            for link in links
+        )
+        BlogPostCover.objects.bulk_create(
+            BlogPostCover(blog_post_id=blog_post_id, image=image, variants=variants)
+            for blog_post_id, (image, variants) in covers.items()
+            if image
+        )
+        BlogPostImage.objects.bulk_create(
+            BlogPostImage(blog_post_id=blog_post_id, image=image, variants=variants)
+            for blog_post_id, image, variants in ArchivedBlogPostImage.objects.filter(
+                blog_post_id__in=ids).order_by('id').values_list('blog_post_id', 'image', 'variants')
+        )
+
+        deltas = Counter()
+        for blog_post in restored:
+            deltas.update(counters.get_deltas(None, counters.get_state(blog_post)))
+        counters.apply_deltas(deltas)
+        # Blob references move back without a change in count, neither side sends signals
+        ArchivedBlogPost.objects.filter(pk__in=ids).delete()
+    invalidate_blog_posts(ids)
+    return len(ids)
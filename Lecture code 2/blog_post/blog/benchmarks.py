@@ -0,0 +1,307 @@
+"""
+Synthetic blog data and an endpoint benchmark suite.
+
+generate_blog_data() bulk-creates users, authors, posts with their author
+links, covers and images, in batches, with a mix of categories, ages and
+archived, inactive and deleted posts close to what the endpoints filter on.
+
+run_benchmarks() sends every scenario through the full Django stack with a
+test client (or calls the job directly for the background tasks) and records
+latency percentiles, the number of queries and the peak Python memory of one
+run. compare_with_baseline() reports the scenarios that got slower, run more
+queries or use more memory than a stored run.
+"""
+import math
+import random
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from blog import counters, jobs, reorder
+from blog.cache import invalidate_blog_posts
+from blog.models import Author, BlogPost, BlogPostCover, BlogPostImage
+from user.models import CustomUser
+
+BATCH_SIZE = 5000
+WORDS = (
+    'django python query index cache search archive author cover image order category post blog '
+    'server client request response latency memory stream chunk batch table column row filter '
+    'travel football recipe market weather garden music science history health design startup '
+    'review guide story update release report interview opinion analysis tutorial'
+).split()
+# The smallest valid GIF, every generated cover and image points at one of a few of them
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+# Regressions smaller than these are noise, whatever the tolerance
+MIN_LATENCY_DELTA_MS = 2
+MIN_MEMORY_DELTA_KB = 64
+
+
+def get_words(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def save_image_files(files):
+    names = {'blog_post_covers/': [], 'blog_post_images/': []}
+    for prefix, saved in names.items():
+        for index in range(files):
+            saved.append(default_storage.save(f'{prefix}benchmark-{index}.gif', ContentFile(GIF)))
+    return names['blog_post_covers/'], names['blog_post_images/']
+
+
+def generate_blog_data(users=100, authors=500, posts=10_000, authors_per_post=2, images_per_post=1,
+                       cover_ratio=0.5, archived_ratio=0.05, inactive_ratio=0.05, deleted_ratio=0.05, files=10,
+                       batch_size=BATCH_SIZE, seed=0, progress=None):
+    """
+    Creates the rows in batches of batch_size, each batch in one transaction,
+    and returns the number of created rows per model. Runs can be repeated,
+    generated emails and titles continue after the existing rows.
+    progress(created) is called after every batch of posts.
+    """
+    rng = random.Random(seed)
+    created = Counter()
+    now = timezone.now()
+
+    # Hashing is slow on purpose, every generated user shares one password hash
+    password = make_password('password')
+    offset = CustomUser.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    user_ids = [
+        user.id for user in CustomUser.objects.bulk_create(
+            (
+                CustomUser(email=f'user{offset + index}@example.com', full_name=get_words(rng, 2, 2).title(),
+                           password=password)
+                for index in range(1, users + 1)
+            ),
+            batch_size=batch_size,
+        )
+    ]
+    created['users'] = len(user_ids)
+
+    offset = Author.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    author_ids = [
+        author.id for author in Author.objects.bulk_create(
+            (
+                Author(first_name=rng.choice(WORDS).title(), last_name=rng.choice(WORDS).title(),
+                       email=f'author{offset + index}@example.com')
+                for index in range(1, authors + 1)
+            ),
+            batch_size=batch_size,
+        )
+    ]
+    created['authors'] = len(author_ids)
+
+    cover_names, image_names = save_image_files(files) if files else ([], [])
+    offset = BlogPost.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    next_order = (BlogPost.objects.aggregate(last_order=Max('order'))['last_order'] or 0) + reorder.ORDER_GAP
+    for start in range(0, posts, batch_size):
+        with transaction.atomic():
+            blog_posts = []
+            for number in range(offset + start + 1, offset + min(start + batch_size, posts) + 1):
+                deleted = rng.random() < deleted_ratio
+                created_at = now - timedelta(days=rng.random() * 365)
+                blog_posts.append(BlogPost(
+                    owner_id=rng.choice(user_ids) if user_ids else None,
+                    title=f'{get_words(rng, 3, 8).capitalize()} #{number}',
+                    text=get_words(rng, 50, 300),
+                    category=rng.randint(1, 5),
+                    website=f'https://example.com/posts/{number}' if rng.random() < 0.3 else None,
+                    is_active=rng.random() >= inactive_ratio,
+                    published=rng.random() < 0.7,
+                    archived=rng.random() < archived_ratio,
+                    deleted=deleted,
+                    deleted_at=created_at + timedelta(days=1) if deleted else None,
+                    order=next_order,
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+                next_order += reorder.ORDER_GAP
+            dates = [(blog_post.created_at, blog_post.updated_at) for blog_post in blog_posts]
+            BlogPost.objects.bulk_create(blog_posts, batch_size=batch_size)
+            # bulk_create() stamps auto_now/auto_now_add fields, spread the posts over the year again
+            for blog_post, (created_at, updated_at) in zip(blog_posts, dates):
+                blog_post.created_at, blog_post.updated_at = created_at, updated_at
+            BlogPost.objects.bulk_update(blog_posts, ['created_at', 'updated_at'], batch_size=batch_size)
+
+            through = BlogPost.authors.through
+            links = through.objects.bulk_create(
+                (
+                    through(blogpost_id=blog_post.id, author_id=author_id)
+                    for blog_post in blog_posts
+                    for author_id in rng.sample(author_ids, min(authors_per_post, len(author_ids)))
+                ),
+                batch_size=batch_size,
+            )
+            covers = BlogPostCover.objects.bulk_create(
+                (
+                    BlogPostCover(blog_post_id=blog_post.id, image=rng.choice(cover_names))
+                    for blog_post in blog_posts
+                    if cover_names and rng.random() < cover_ratio
+                ),
+                batch_size=batch_size,
+            )
+            images = BlogPostImage.objects.bulk_create(
+                (
+                    BlogPostImage(blog_post_id=blog_post.id, image=rng.choice(image_names))
+                    for blog_post in blog_posts
+                    for _ in range(images_per_post if image_names else 0)
+                ),
+                batch_size=batch_size,
+            )
+        created['blog_posts'] += len(blog_posts)
+        created['author_links'] += len(links)
+        created['covers'] += len(covers)
+        created['images'] += len(images)
+        if progress is not None:
+            progress(created)
+
+    # bulk_create() sends no signals
+    counters.reconcile()
+    invalidate_blog_posts()
+    return created
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def get_client_host():
+    # The test client has to send a Host the project accepts
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+
+def get_scenarios():
+    """(name, run) pairs, run() performs one request or job run and fails on an unexpected status."""
+    host = get_client_host()
+    client = APIClient(HTTP_HOST=host)
+    admin = CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.create_superuser(
+        email='benchmark-admin@example.com', password='password', full_name='Benchmark Admin')
+    admin_client = APIClient(HTTP_HOST=host)
+    admin_client.force_login(admin)
+
+    live = BlogPost.objects.filter(deleted=False)
+    sample = list(live.order_by('?').values('id', 'title', 'category')[:50])
+    if not sample:
+        raise ValueError('There are no live blog posts to benchmark, run generate_blog_data first')
+    detail_ids = [row['id'] for row in sample]
+    keyword = next((word for word in sample[0]['title'].lower().split() if word.isalpha()), 'blog')
+    detail_index = iter(range(10 ** 9))
+
+    def get(url, using=client):
+        def run():
+            response = using.get(url() if callable(url) else url)
+            if response.status_code != 200:
+                raise AssertionError(f'{response.status_code} from {response.request["PATH_INFO"]}')
+        return run
+
+    def in_rollback(job):
+        def run():
+            with transaction.atomic():
+                job()
+                transaction.set_rollback(True)
+        return run
+
+    return [
+        ('list', get('/blog/blogpost/')),
+        ('list ?category=', get(f"/blog/blogpost/?{urlencode({'category': sample[0]['category']})}")),
+        ('list ?recent=', get('/blog/blogpost/?recent=true')),
+        ('list ?title=', get(f"/blog/blogpost/?{urlencode({'title': sample[0]['title']})}")),
+        ('list ?ordering=-created_at', get('/blog/blogpost/?ordering=-created_at')),
+        ('list ?count=true', get('/blog/blogpost/?count=true')),
+        ('keyword search', get(f"/blog/blogpost/?{urlencode({'keyword': keyword})}")),
+        ('detail', get(lambda: f'/blog/blogpost/{detail_ids[next(detail_index) % len(detail_ids)]}/')),
+        ('archived_posts', get('/blog/blogpost/archived_posts/')),
+        ('page number list', get('/blog/blog_posts/')),
+        ('reorder task', in_rollback(lambda: reorder.reorder_blog_posts('title', 'asc'))),
+        ('delete inactive task', in_rollback(lambda: jobs.delete_inactive_blog_posts(restart=True))),
+        ('admin changelist', get('/admin/blog/blogpost/', using=admin_client)),
+        ('admin changelist search', get(f"/admin/blog/blogpost/?{urlencode({'q': keyword})}", using=admin_client)),
+    ]
+
+
+def measure(run, repeat=20, warmup=2, warm_cache=False):
+    for _ in range(warmup):
+        run()
+
+    timings, queries = [], []
+    for _ in range(repeat):
+        if not warm_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+
+    # tracemalloc slows every allocation down, memory is measured on a run of its own
+    if not warm_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(names=None, repeat=20, warmup=2, warm_cache=False, progress=None):
+    """
+    Measures the scenarios whose name contains one of `names` (all by
+    default) and returns their results by name. progress(name, result) is
+    called after every scenario.
+    """
+    results = {}
+    for name, run in get_scenarios():
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = measure(run, repeat=repeat, warmup=warmup, warm_cache=warm_cache)
+        if progress is not None:
+            progress(name, results[name])
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.25):
+    """
+    Returns a message for every scenario whose p95 latency or peak memory
+    grew by more than `tolerance` (a fraction of the baseline), or that runs
+    more queries. Scenarios missing from either side are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, was {base['queries']}")
+        p95, base_p95 = result['p95_ms'], base['p95_ms']
+        if p95 > base_p95 * (1 + tolerance) and p95 - base_p95 >= MIN_LATENCY_DELTA_MS:
+            regressions.append(f"{name}: p95 {p95:.1f} ms, was {base_p95:.1f} ms")
+        peak, base_peak = result['peak_kb'], base['peak_kb']
+        if peak > base_peak * (1 + tolerance) and peak - base_peak >= MIN_MEMORY_DELTA_KB:
+            regressions.append(f"{name}: peak memory {peak:.0f} KB, was {base_peak:.0f} KB")
+    return regressions
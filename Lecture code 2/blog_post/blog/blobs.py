@@ -0,0 +1,126 @@
+"""
+Reference counts of the content-addressed files of blog.storage.
+
+MediaBlob.ref_count is the number of FILE_FIELDS values pointing at a blob,
+in the hot tables and in the archive. post_save/post_delete keep it for
+posts, covers and images written one by one. The paths writing without
+signals (queryset updates, bulk_create(), the archive tables) call retain()
+and release() themselves, in the same transaction as the write.
+
+A blob nothing points at is removed by jobs.collect_media_garbage() once it
+has been left alone for BLOG_MEDIA_BLOB_GRACE_HOURS, so an upload stored
+before the row pointing at it is written is never lost. The references of
+every candidate are counted again before its file goes, and reconcile()
+recounts all blobs like counters.reconcile() does for the counters.
+
+Files stored before the content-addressed storage keep their names and
+aren't counted, jobs.delete_files() checks their references instead.
+The variant files of a blob aren't counted either, they are deleted with
+the blob.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from blog.models import (
+    ArchivedBlogPost,
+    ArchivedBlogPostImage,
+    BlogPost,
+    BlogPostCover,
+    BlogPostImage,
+    MediaBlob,
+)
+from blog.storage import BLOB_PREFIX
+
+# (model, file field) pairs that can point at a stored file
+FILE_FIELDS = [
+    (BlogPost, 'document'),
+    (BlogPostCover, 'image'),
+    (BlogPostImage, 'image'),
+    (ArchivedBlogPost, 'document'),
+    (ArchivedBlogPost, 'cover_image'),
+    (ArchivedBlogPostImage, 'image'),
+]
+
+
+# Variant files are stored next to their blob, under variants/, and aren't blobs themselves
+BLOB_NAME = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.\w+)?$')
+BLOB_VARIANT_NAME = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/variants/[0-9a-f]{{64}}-')
+
+
+def is_blob(name):
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+def is_blob_variant(name):
+    # Shared by every row pointing at the blob, they go with it
+    return bool(name) and BLOB_VARIANT_NAME.match(name) is not None
+
+
+def change_ref_counts(names, sign):
+    # One UPDATE per distinct count, names repeated in a batch are counted once per occurrence
+    by_delta = defaultdict(list)
+    for name, count in Counter(name for name in names if is_blob(name)).items():
+        by_delta[count * sign].append(name)
+    now = timezone.now()
+    for delta, blob_names in by_delta.items():
+        MediaBlob.objects.filter(name__in=blob_names).update(ref_count=F('ref_count') + delta, updated_at=now)
+
+
+def retain(names):
+    """Counts one more reference for every occurrence of a blob name in names."""
+    change_ref_counts(names, 1)
+
+
+def release(names):
+    change_ref_counts(names, -1)
+
+
+def record_saved(instance, field, created):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if not created and field not in loaded:
+        # Loaded without the field, the previous value is unknown. The garbage collector
+        # recounts before deleting anything, reconcile() repairs the count.
+        return
+    old_name = None if created else loaded[field]
+    new_name = getattr(instance, field).name or None
+    if old_name != new_name:
+        retain([new_name])
+        release([old_name])
+    loaded[field] = new_name
+    instance._loaded_values = loaded
+
+
+def record_deleted(instance, field):
+    # Deleted instances are loaded whole, a deferred field is skipped rather than read
+    if field in instance.__dict__:
+        release([getattr(instance, field).name])
+
+
+def get_reference_counts(names=None):
+    """References per blob name, of the given names or of every blob."""
+    counts = Counter()
+    for model, field in FILE_FIELDS:
+        queryset = model.objects.filter(**{f'{field}__startswith': f'{BLOB_PREFIX}/'})
+        if names is not None:
+            queryset = queryset.filter(**{f'{field}__in': names})
+        for name, references in queryset.order_by().values_list(field).annotate(references=Count('pk')):
+            counts[name] += references
+    return counts
+
+
+def reconcile():
+    """Recounts the references of every blob, returns the number of corrected blobs."""
+    with transaction.atomic():
+        counts = get_reference_counts()
+        stored = dict(MediaBlob.objects.select_for_update().values_list('name', 'ref_count'))
+        by_count = defaultdict(list)
+        for name, ref_count in stored.items():
+            if counts[name] != ref_count:
+                by_count[counts[name]].append(name)
+        for ref_count, names in by_count.items():
+            MediaBlob.objects.filter(name__in=names).update(ref_count=ref_count)
+    return sum(len(names) for names in by_count.values())
@@ -0,0 +1,196 @@
+"""
+Bulk create, update and soft-delete of blog posts.
+
+A batch is validated as a whole first, errors are reported per item in the
+order the items were sent, and nothing is written unless every item is
+valid. The writes then run in one transaction with bulk_create() and
+bulk_update(), which send no signals, so the counters and the response cache
+are updated here explicitly. Authors are given by id and linked with one
+more bulk_create() of the through rows, an update replaces the authors of
+the posts it names them for. Covers are files and still take one request
+per post.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from blog import counters
+from blog.cache import invalidate_blog_posts
+from blog.models import Author, BlogPost
+from blog.reorder import ORDER_GAP, get_next_order
+
+DUPLICATE_MESSAGE = 'A blog post with this title and text already exists.'
+NOT_FOUND_MESSAGE = 'Blog post not found.'
+INVALID_ID_MESSAGE = 'A valid integer is required.'
+
+
+def check_batch_size(items):
+    max_size = settings.BLOG_POST_BULK_MAX_BATCH_SIZE
+    if not isinstance(items, list) or not items:
+        raise serializers.ValidationError({'non_field_errors': ['Expected a non-empty list of items.']})
+    if len(items) > max_size:
+        raise serializers.ValidationError(
+            {'non_field_errors': [f'A batch holds at most {max_size} items, got {len(items)}.']})
+
+
+def raise_for_errors(errors):
+    if any(errors):
+        raise serializers.ValidationError({'errors': errors})
+
+
+def get_editable_blog_posts(user):
+    blog_posts = BlogPost.objects.filter(deleted=False)
+    if not user.is_staff:
+        blog_posts = blog_posts.filter(owner=user)
+    return blog_posts
+
+
+def get_item_id(item):
+    """The id of a bulk update item, None unless it is an integer."""
+    pk = item.get('id') if isinstance(item, dict) else None
+    # bool is an int too
+    if isinstance(pk, int) and not isinstance(pk, bool):
+        return pk
+    return None
+
+
+def check_unique_titles(entries, errors, exclude_ids=()):
+    """
+    Reports items whose (title, text) pair is taken, by another item of the
+    batch or by a stored post, using one query for the whole batch.
+    """
+    pairs = {}
+    for index, entry in enumerate(entries):
+        if entry is None:
+            continue
+        pair = (entry['title'], entry['text'])
+        if pair in pairs:
+            errors[index] = {'non_field_errors': [DUPLICATE_MESSAGE]}
+        pairs.setdefault(pair, index)
+
+    titles = {title for title, text in pairs}
+    taken = set(
+        BlogPost.objects.filter(title__in=titles).exclude(pk__in=exclude_ids).values_list('title', 'text')
+    )
+    for pair in taken & set(pairs):
+        errors[pairs[pair]] = {'non_field_errors': [DUPLICATE_MESSAGE]}
+
+
+def check_authors(entries, errors):
+    """Reports items naming authors that don't exist, using one query for the whole batch."""
+    ids = {pk for entry in entries if entry is not None for pk in entry.get('authors', ())}
+    known = set(Author.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+    for index, entry in enumerate(entries):
+        unknown = sorted(set(entry.get('authors', ())) - known) if entry is not None else []
+        if unknown:
+            errors[index] = {**errors[index], 'authors': [f"Unknown author ids: {', '.join(map(str, unknown))}."]}
+
+
+def set_authors(authors):
+    """Replaces the authors of the posts in authors, {blog post id: author ids}."""
+    through = BlogPost.authors.through
+    through.objects.filter(blogpost_id__in=list(authors)).delete()
+    through.objects.bulk_create(
+        through(blogpost_id=blog_post_id, author_id=author_id)
+        for blog_post_id, author_ids in authors.items()
+        for author_id in dict.fromkeys(author_ids)
+    )
+
+
+def bulk_create_blog_posts(items, serializer_class, context):
+    check_batch_size(items)
+    item_serializers = [serializer_class(data=item, context=context) for item in items]
+    errors = [{} if serializer.is_valid() else serializer.errors for serializer in item_serializers]
+    entries = [
+        serializer.validated_data if not error else None
+        for serializer, error in zip(item_serializers, errors)
+    ]
+    check_unique_titles(entries, errors)
+    check_authors(entries, errors)
+    raise_for_errors(errors)
+
+    owner = context['request'].user
+    authors = [entry.pop('authors', []) for entry in entries]
+    with transaction.atomic():
+        # After every stored post and ORDER_GAP apart, like imports
+        first_order = get_next_order()
+        blog_posts = BlogPost.objects.bulk_create(
+            BlogPost(owner=owner, order=first_order + index * ORDER_GAP, **entry)
+            for index, entry in enumerate(entries)
+        )
+        deltas = Counter()
+        for blog_post in blog_posts:
+            deltas.update(counters.get_deltas(None, counters.get_state(blog_post)))
+        counters.apply_deltas(deltas)
+        set_authors({blog_post.pk: author_ids for blog_post, author_ids in zip(blog_posts, authors) if author_ids})
+    invalidate_blog_posts()
+    return blog_posts
+
+
+def bulk_update_blog_posts(items, serializer_class, context):
+    check_batch_size(items)
+    ids = [get_item_id(item) for item in items]
+    valid_ids = [pk for pk in ids if pk is not None]
+    with transaction.atomic():
+        blog_posts = get_editable_blog_posts(context['request'].user).select_for_update().in_bulk(valid_ids)
+
+        errors, changes, seen = [], [], set()
+        for pk, item in zip(ids, items):
+            if pk is None:
+                errors.append({'id': [INVALID_ID_MESSAGE]})
+                changes.append(None)
+                continue
+            blog_post = blog_posts.get(pk)
+            if blog_post is None or pk in seen:
+                errors.append({'id': [NOT_FOUND_MESSAGE if blog_post is None else 'Updated twice in the batch.']})
+                changes.append(None)
+                continue
+            seen.add(pk)
+            serializer = serializer_class(blog_post, data=item, partial=True, context=context)
+            valid = serializer.is_valid()
+            errors.append({} if valid else serializer.errors)
+            changes.append(serializer.validated_data if valid else None)
+
+        entries = [
+            {'title': change.get('title', blog_posts[pk].title), 'text': change.get('text', blog_posts[pk].text)}
+            if change is not None else None
+            for pk, change in zip(ids, changes)
+        ]
+        check_unique_titles(entries, errors, exclude_ids=valid_ids)
+        check_authors(changes, errors)
+        raise_for_errors(errors)
+
+        now = timezone.now()
+        fields = {'updated_at'}
+        deltas = Counter()
+        authors = {}
+        for pk, change in zip(ids, changes):
+            if 'authors' in change:
+                authors[pk] = change.pop('authors')
+            blog_post = blog_posts[pk]
+            old_state = counters.get_state(blog_post)
+            for field, value in change.items():
+                setattr(blog_post, field, value)
+                fields.add(field)
+            blog_post.updated_at = now
+            deltas.update(counters.get_deltas(old_state, counters.get_state(blog_post)))
+
+        updated = [blog_posts[pk] for pk in ids]
+        BlogPost.objects.bulk_update(updated, sorted(fields))
+        counters.apply_deltas(deltas)
+        set_authors(authors)
+    invalidate_blog_posts(ids)
+    return updated
+
+
+def bulk_delete_blog_posts(ids, user):
+    """Soft-deletes the posts and returns how many were deleted."""
+    check_batch_size(ids)
+    blog_posts = get_editable_blog_posts(user).filter(pk__in=ids)
+    found = set(blog_posts.values_list('pk', flat=True))
+    raise_for_errors([{} if pk in found else {'id': [NOT_FOUND_MESSAGE]} for pk in ids])
+
+    return counters.update_blog_posts(blog_posts, deleted=True, deleted_at=timezone.now())
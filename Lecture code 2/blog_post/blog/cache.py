@@ -0,0 +1,189 @@
+"""
+Versioned response cache for the public BlogPost endpoints.
+
+Cached entries are never deleted, they are made unreachable: every cache key
+embeds version numbers, and every write path bumps the versions it affects.
+
+    blog:posts:version        bumped by any BlogPost write, used by list pages
+    blog:posts:bulk_version   bumped by bulk writes that don't know their ids
+    blog:post:<id>:version    bumped by writes to one post, used by detail
+    blog:authors:version      bumped by Author writes, used by list and detail
+
+Versions are bumped immediately and again after the transaction commits, so
+a response computed from pre-commit data can't outlive the write. The same
+versions make up the ETags used for conditional GET requests. They live in
+the shared cache backend, so a bump made by any web or Celery worker is
+seen by all of them. Cached data holds absolute URLs, its keys also embed
+the request's scheme and host.
+
+Filters relative to the current time (`?recent=`) change their results
+without any write. Lists using them also key on the current time bucket of
+settings.BLOG_POST_TIME_FILTER_BUCKET seconds, so they are never served
+for longer than that.
+"""
+import time
+from functools import wraps
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+POSTS_VERSION_KEY = 'blog:posts:version'
+BULK_VERSION_KEY = 'blog:posts:bulk_version'
+AUTHORS_VERSION_KEY = 'blog:authors:version'
+IGNORED_QUERY_PARAMS = ('format',)
+TIME_DEPENDENT_QUERY_PARAMS = ('recent',)
+
+
+def get_post_version_key(pk):
+    return f'blog:post:{pk}:version'
+
+
+def get_versions(*keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh starting point, so an evicted version never reuses old keys
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys):
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_blog_post(pk):
+    bump_versions(POSTS_VERSION_KEY, get_post_version_key(pk))
+
+
+def invalidate_blog_posts(pks=None):
+    if pks is None:
+        bump_versions(POSTS_VERSION_KEY, BULK_VERSION_KEY)
+    else:
+        bump_versions(POSTS_VERSION_KEY, *[get_post_version_key(pk) for pk in pks])
+
+
+def invalidate_authors():
+    bump_versions(AUTHORS_VERSION_KEY)
+
+
+def get_normalized_query(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in IGNORED_QUERY_PARAMS
+        for value in values
+    )
+    return urlencode(params)
+
+
+def get_time_bucket():
+    return int(time.time() // settings.BLOG_POST_TIME_FILTER_BUCKET)
+
+
+def get_list_version(request):
+    posts_version, authors_version = get_versions(POSTS_VERSION_KEY, AUTHORS_VERSION_KEY)
+    version = f'{posts_version}.{authors_version}:{get_normalized_query(request)}'
+    if any(key in request.query_params for key in TIME_DEPENDENT_QUERY_PARAMS):
+        version = f'{version}:{get_time_bucket()}'
+    return version
+
+
+def get_detail_version(request, pk):
+    post_version, bulk_version, authors_version = get_versions(
+        get_post_version_key(pk), BULK_VERSION_KEY, AUTHORS_VERSION_KEY)
+    return f'{post_version}.{bulk_version}.{authors_version}:{get_normalized_query(request)}'
+
+
+def get_response_cache_key(scope, request, version):
+    # The data holds absolute URLs built from the request's scheme and host
+    origin = request.build_absolute_uri('/')
+    return f"blog:response:{scope}:{md5(f'{origin}:{version}'.encode()).hexdigest()}"
+
+
+def get_lookup_value(view, kwargs):
+    pk = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    return int(pk) if str(pk).isdigit() else pk
+
+
+def cache_response(scope, detail=False):
+    """
+    Caches `response.data` of a viewset action under a key built from the
+    normalized query string and the current versions. The data is cached
+    instead of the rendered body so renderer negotiation still happens per
+    request.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if detail:
+                pk = get_lookup_value(self, kwargs)
+                key = get_response_cache_key(f'{scope}:{pk}', request, get_detail_version(request, pk))
+            else:
+                key = get_response_cache_key(scope, request, get_list_version(request))
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, settings.BLOG_POST_RESPONSE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def make_etag(*parts):
+    return quote_etag(md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def conditional_response(detail=False):
+    """
+    Answers GET/HEAD with 304 Not Modified when If-None-Match still matches.
+    List ETags come from the collection versions alone, detail ETags from
+    the versions plus `updated_at`, which is read with a single primary key
+    lookup and no model instance. There is no Last-Modified: author, cover
+    and image writes bump the versions but leave `updated_at` alone, so
+    If-Modified-Since would answer 304 for changed posts.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            renderer_format = getattr(request.accepted_renderer, 'format', '')
+            if detail:
+                pk = get_lookup_value(self, kwargs)
+                rows = list(self.queryset.filter(pk=pk).order_by().values_list('updated_at', flat=True)[:1])
+                if not rows:
+                    return view_method(self, request, *args, **kwargs)
+                etag = make_etag(renderer_format, rows[0], get_detail_version(request, pk))
+            else:
+                etag = make_etag(renderer_format, get_list_version(request))
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response.headers['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
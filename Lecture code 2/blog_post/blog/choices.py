@@ -5,3 +5,23 @@ CATEGORY_CHOICES = [
         (4, 'News'),
         (5, 'Other'),
     ]
+
+REORDER_SORT_FIELD_CHOICES = [
+        ('id', 'Id'),
+        ('title', 'Title'),
+        ('created_at', 'Created at'),
+        ('updated_at', 'Updated at'),
+        ('category', 'Category'),
+        ('published', 'Published'),
+        ('archived', 'Archived'),
+    ]
+
+SORT_DIRECTION_CHOICES = [
+        ('asc', 'Ascending'),
+        ('des', 'Descending'),
+    ]
+
+EXPORT_FORMAT_CHOICES = [
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
@@ -0,0 +1,186 @@
+"""
+Incrementally maintained BlogPost counters.
+
+Every write path adjusts the counters in the same transaction as the write,
+so list endpoints can read totals from one small table instead of running
+COUNT(*) over blog_blogpost. Counter keys:
+
+    total          every row
+    deleted        soft-deleted rows
+    live           rows with deleted=False
+    published      live rows with published=True
+    archived       live rows with archived=True
+    category:<id>  live rows in a category
+"""
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import DEFERRED, Count, F
+from django.utils import timezone
+
+from blog.cache import invalidate_blog_posts
+from blog.models import BlogPost, BlogPostCounter
+
+TRACKED_FIELDS = ('deleted', 'published', 'archived', 'category')
+
+_local = threading.local()
+
+
+def get_counter_keys(state):
+    if state is None:
+        return set()
+    keys = {'total'}
+    if state['deleted']:
+        keys.add('deleted')
+        return keys
+    keys.add('live')
+    if state['published']:
+        keys.add('published')
+    if state['archived']:
+        keys.add('archived')
+    if state['category'] is not None:
+        keys.add(f"category:{state['category']}")
+    return keys
+
+
+def get_deltas(old_state, new_state, rows=1):
+    old_keys, new_keys = get_counter_keys(old_state), get_counter_keys(new_state)
+    deltas = Counter()
+    for key in new_keys - old_keys:
+        deltas[key] += rows
+    for key in old_keys - new_keys:
+        deltas[key] -= rows
+    return deltas
+
+
+def get_state(blog_post):
+    return {field: getattr(blog_post, field) for field in TRACKED_FIELDS}
+
+
+def get_loaded_state(blog_post):
+    loaded = getattr(blog_post, '_loaded_values', None)
+    if loaded is None:
+        return None
+    if all(field in loaded and loaded[field] is not DEFERRED for field in TRACKED_FIELDS):
+        return {field: loaded[field] for field in TRACKED_FIELDS}
+    # Loaded with only()/defer(), read the previous state from the database
+    return BlogPost.objects.filter(pk=blog_post.pk).values(*TRACKED_FIELDS).first()
+
+
+def remember_state(blog_post):
+    loaded = getattr(blog_post, '_loaded_values', None) or {}
+    loaded.update(get_state(blog_post))
+    blog_post._loaded_values = loaded
+
+
+def apply_deltas(deltas):
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.update(deltas)
+        return
+    for key, value in sorted(deltas.items()):
+        updated = BlogPostCounter.objects.filter(key=key).update(value=F('value') + value)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                BlogPostCounter.objects.create(key=key, value=value)
+        except IntegrityError:
+            BlogPostCounter.objects.filter(key=key).update(value=F('value') + value)
+
+
+@contextmanager
+def batch():
+    """Collect deltas of a block and write them once per counter key at the end."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = Counter()
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    apply_deltas(pending)
+
+
+def record_saved(blog_post, created):
+    old_state = None if created else get_loaded_state(blog_post)
+    apply_deltas(get_deltas(old_state, get_state(blog_post)))
+    remember_state(blog_post)
+
+
+def record_deleted(blog_post):
+    apply_deltas(get_deltas(get_state(blog_post), None))
+
+
+def get_grouped_states(queryset):
+    groups = queryset.order_by().values(*TRACKED_FIELDS).annotate(rows=Count('id'))
+    for group in groups:
+        rows = group.pop('rows')
+        yield group, rows
+
+
+def update_blog_posts(queryset, **values):
+    """
+    queryset.update() that keeps the counters and the response cache in step.
+    Returns the number of updated rows as reported by update().
+    """
+    if 'deleted' in values:
+        # Like BlogPost.save(), restoring clears deleted_at
+        values.setdefault('deleted_at', timezone.now() if values['deleted'] else None)
+    changed_fields = [field for field in TRACKED_FIELDS if field in values]
+    with transaction.atomic():
+        deltas = Counter()
+        if changed_fields:
+            for state, rows in get_grouped_states(queryset):
+                new_state = {**state, **{field: values[field] for field in changed_fields}}
+                deltas.update(get_deltas(state, new_state, rows))
+        updated = queryset.update(**values)
+        apply_deltas(deltas)
+    if updated:
+        invalidate_blog_posts()
+    return updated
+
+
+def get_counts():
+    return dict(BlogPostCounter.objects.values_list('key', 'value'))
+
+
+def get_count(key):
+    return get_counts().get(key, 0)
+
+
+def compute_counts():
+    counts = Counter()
+    for state, rows in get_grouped_states(BlogPost.objects.all()):
+        for key in get_counter_keys(state):
+            counts[key] += rows
+    return counts
+
+
+def reconcile():
+    """Recompute every counter from the table and return the repaired drift."""
+    with transaction.atomic():
+        actual = compute_counts()
+        stored = {
+            counter.key: counter
+            for counter in BlogPostCounter.objects.select_for_update()
+        }
+        drift = {}
+        for key in set(actual) | set(stored):
+            value = actual.get(key, 0)
+            counter = stored.get(key)
+            if counter is None:
+                BlogPostCounter.objects.create(key=key, value=value)
+                drift[key] = value
+            elif counter.value != value:
+                drift[key] = value - counter.value
+                counter.value = value
+                counter.save(update_fields=['value'])
+    return drift
@@ -1,10 +1,10 @@
 import django_filters
 
 from datetime import timedelta
-from django.db.models import Q
 from django.utils import timezone
 
 from blog.models import BlogPost
+from blog.search import search_blog_posts
 
 class BlogPostFilter(django_filters.FilterSet):
     keyword = django_filters.CharFilter(method='filter_by_keyword', label='Keyword')
@@ -15,9 +15,7 @@ class BlogPostFilter(django_filters.FilterSet):
         fields = ['category', 'title', 'keyword', 'recent']
 
     def filter_by_keyword(self, queryset, name, value):
-        return queryset.filter(
-            Q(title__icontains=value) | Q(text__icontains=value)
-        )
+        return search_blog_posts(queryset, value)
 
     def filter_recent(self, queryset, name, value):
         if value:
@@ -0,0 +1,303 @@
+"""
+Resized variants of blog post covers and gallery images.
+
+Every image is decoded once with Pillow and written as each variant of
+settings.BLOG_IMAGE_VARIANTS (the largest first, every smaller one is
+resized from the previous one) in each of settings.BLOG_IMAGE_VARIANT_FORMATS.
+EXIF orientation is applied to the pixels, metadata (EXIF, ICC, comments)
+is not copied. Files go next to the original, under `variants/`:
+
+    blog_post_covers/variants/<name>-thumbnail.webp
+
+The `variants` column of the row records them as
+
+    {'thumbnail': {'width': 160, 'height': 107, 'webp': <name>, 'jpeg': <name>}, ...}
+
+The variants of a blob (blog.storage) are named after its hash and belong
+to it. Every row pointing at the same content shares them: a row whose blob
+already has variants recorded elsewhere copies them without rendering, and
+the files are only deleted with the blob by jobs.collect_media_garbage().
+
+New uploads are handled by the generate_image_variants Celery task, one
+image per task, so the worker pool is the process pool. The
+generate_image_variants command fans the backlog out to a
+ProcessPoolExecutor: the workers decode and encode, the main process writes.
+"""
+import os
+import posixpath
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from blog import blobs
+from blog.cache import invalidate_blog_post
+from blog.models import ArchivedBlogPost, ArchivedBlogPostImage, BlogPostCover, BlogPostImage
+from blog.storage import blob_storage
+
+CHUNK_SIZE = 100
+WORKERS = os.cpu_count() or 1
+IMAGE_MODELS = {model._meta.label: model for model in (BlogPostCover, BlogPostImage)}
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+# (model, image field, variants field) of every row recording the variants of an image
+VARIANT_FIELDS = [
+    (BlogPostCover, 'image', 'variants'),
+    (BlogPostImage, 'image', 'variants'),
+    (ArchivedBlogPost, 'cover_image', 'cover_variants'),
+    (ArchivedBlogPostImage, 'image', 'variants'),
+]
+
+
+def get_variant_sizes():
+    # Largest first, every variant is resized from the one before it
+    return sorted(settings.BLOG_IMAGE_VARIANTS.items(), key=lambda item: item[1][0] * item[1][1], reverse=True)
+
+
+def encode(image, image_format):
+    pillow_format, _ = FORMATS[image_format]
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha, transparent areas become white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+    buffer = BytesIO()
+    options = {'quality': settings.BLOG_IMAGE_VARIANT_QUALITY}
+    if image_format == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    # No exif/icc_profile options, the encoders write no metadata without them
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(data):
+    """
+    Encoded variants of the image in data, {variant: {'width', 'height',
+    <format>: bytes}}. Touches neither the database nor the storage, so it
+    can run in any process.
+    """
+    sizes = get_variant_sizes()
+    with Image.open(BytesIO(data)) as source:
+        # JPEGs are decoded straight at a reduced scale when that is still large enough,
+        # square because the EXIF orientation may still swap the sides
+        largest = max(sizes[0][1])
+        source.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    rendered = {}
+    for variant, size in sizes:
+        # thumbnail() keeps the aspect ratio and never upscales
+        image = image.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        rendered[variant] = {
+            'width': image.width,
+            'height': image.height,
+            **{image_format: encode(image, image_format) for image_format in settings.BLOG_IMAGE_VARIANT_FORMATS},
+        }
+    return rendered
+
+
+def render_file(name):
+    with default_storage.open(name, 'rb') as file:
+        return render_variants(file.read())
+
+
+def get_variant_name(name, variant, image_format):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}-{variant}.{FORMATS[image_format][1]}')
+
+
+def get_variant_names(variants):
+    """Storage names of the files recorded in a `variants` value."""
+    return {
+        name
+        for variant in (variants or {}).values()
+        for key, name in variant.items()
+        if key in FORMATS
+    }
+
+
+def get_blob_variant_names(name):
+    """Storage names of the variant files stored for the blob `name`."""
+    directory, filename = posixpath.split(name)
+    prefix = f'{posixpath.splitext(filename)[0]}-'
+    variants_directory = posixpath.join(directory, 'variants')
+    try:
+        filenames = blob_storage.listdir(variants_directory)[1]
+    except FileNotFoundError:
+        return []
+    return [posixpath.join(variants_directory, filename) for filename in filenames if filename.startswith(prefix)]
+
+
+def get_shared_variants(name):
+    """The variants some row already records for the blob `name`, {} when there are none."""
+    if not blobs.is_blob(name):
+        return {}
+    for model, field, variants_field in VARIANT_FIELDS:
+        variants = model.objects.filter(**{field: name}).exclude(**{variants_field: {}}).values_list(
+            variants_field, flat=True).first()
+        if variants:
+            return variants
+    return {}
+
+
+def save_variant_file(source, name, data):
+    if blobs.is_blob(source):
+        # Named after the hash, rendering the same content again writes the same files
+        return blob_storage.replace(name, ContentFile(data))
+    return default_storage.save(name, ContentFile(data))
+
+
+def delete_variant_files(names):
+    # The variants of a blob may be shared, they are deleted with the blob
+    for name in sorted(name for name in names if not blobs.is_blob_variant(name)):
+        try:
+            default_storage.delete(name)
+        except OSError as error:
+            print(f"Could not delete {name}: {error}")
+
+
+def record_variants(model, row, variants):
+    """
+    Records variants on the row (pk, image, variants and blog_post_id
+    values), as long as it still points at the same image, and deletes the
+    files it recorded before. Returns the variants, None when the row was
+    deleted or got another image meanwhile.
+    """
+    # Conditional on the image, an upload replacing it meanwhile schedules its own variants
+    if not model.objects.filter(pk=row['pk'], image=row['image']).update(variants=variants):
+        delete_variant_files(get_variant_names(variants))
+        return None
+    delete_variant_files(get_variant_names(row['variants']) - get_variant_names(variants))
+    invalidate_blog_post(row['blog_post_id'])
+    return variants
+
+
+def store_variants(model, row, rendered):
+    """Saves the rendered files and records them on the row, see record_variants()."""
+    source = row['image']
+    variants = {}
+    for variant, encoded in rendered.items():
+        variants[variant] = {'width': encoded['width'], 'height': encoded['height']}
+        for image_format in settings.BLOG_IMAGE_VARIANT_FORMATS:
+            variants[variant][image_format] = save_variant_file(
+                source, get_variant_name(source, variant, image_format), encoded[image_format])
+    return record_variants(model, row, variants)
+
+
+ROW_FIELDS = ('pk', 'image', 'variants', 'blog_post_id')
+
+
+def generate_variants(model, pk):
+    """
+    Records the variants of one cover or image, rendered unless another row
+    of the same blob has them already. Returns them or None.
+    """
+    row = model.objects.filter(pk=pk).values(*ROW_FIELDS).first()
+    if row is None or not row['image']:
+        return None
+    variants = get_shared_variants(row['image'])
+    if variants:
+        return record_variants(model, row, variants)
+    return store_variants(model, row, render_file(row['image']))
+
+
+def get_pending_images(model, force=False):
+    queryset = model.objects.exclude(image='')
+    if not force:
+        queryset = queryset.filter(variants={})
+    return queryset
+
+
+def iter_pending_rows(models, force=False, chunk_size=CHUNK_SIZE):
+    for model in models:
+        last_pk = 0
+        while True:
+            # Keyset chunks, rows that fail keep no variants and must not be read again
+            rows = list(get_pending_images(model, force).filter(pk__gt=last_pk).order_by('pk').values(
+                *ROW_FIELDS)[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1]['pk']
+            for row in rows:
+                yield model, row
+
+
+def render_row(model, row):
+    try:
+        return model, row, render_file(row['image'])
+    except (OSError, Image.DecompressionBombError) as error:
+        return model, row, error
+
+
+def iter_rendered(rows, workers):
+    """(model, row, rendered variants or error) for every (model, row) of rows."""
+    if workers <= 1:
+        for model, row in rows:
+            yield render_row(model, row)
+        return
+
+    # Workers set Django up again when they are spawned instead of forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for model, row in rows:
+            pending.append(executor.submit(render_row, model, row))
+            # Bounded read-ahead, every result holds the encoded files
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_missing_variants(models=None, workers=WORKERS, chunk_size=CHUNK_SIZE, force=False, progress=None):
+    """
+    Generates the variants of every cover and image that has none (all of
+    them with force). Returns stats counting generated, reused (the same
+    blob has variants already), failed (unreadable or not an image) and
+    skipped (changed meanwhile) images.
+    progress(stats) is called every chunk_size images.
+    """
+    stats = Counter()
+    # Variants of the blobs rendered by this run, forced runs render every blob once
+    rendered_blobs = {}
+
+    def count(outcome):
+        stats[outcome] += 1
+        if progress is not None and stats.total() % chunk_size == 0:
+            progress(stats)
+
+    def iter_rows():
+        for model, row in iter_pending_rows(models or IMAGE_MODELS.values(), force, chunk_size):
+            variants = rendered_blobs.get(row['image']) or (None if force else get_shared_variants(row['image']))
+            if not variants:
+                yield model, row
+            elif record_variants(model, row, variants) is None:
+                count('skipped')
+            else:
+                count('reused')
+
+    for model, row, rendered in iter_rendered(iter_rows(), workers):
+        if isinstance(rendered, Exception):
+            count('failed')
+            print(f"Could not render {row['image']}: {rendered}")
+            continue
+        variants = store_variants(model, row, rendered)
+        if variants is None:
+            count('skipped')
+            continue
+        count('generated')
+        if blobs.is_blob(row['image']):
+            rendered_blobs[row['image']] = variants
+    return stats
@@ -0,0 +1,225 @@
+"""
+Streaming import of blog posts from JSONL (NDJSON) or CSV files, in the
+formats blog.export writes.
+
+The file is read in batches of chunk_size records. Records are parsed and
+validated with BlogPostImportSerializer in a process pool, which never
+touches the database, while the main process writes the previous batches.
+Only a few batches are in flight at a time, so memory stays flat for any
+file size.
+
+Every batch is written in one transaction: the posts whose (title, text)
+pair is still free with one bulk_create(), which returns their ids, then
+their author links with another one. Authors are matched by email through a lookup loaded
+once, unknown emails are counted and skipped. bulk_create() sends no
+signals, so the counters and the response cache are updated here.
+"""
+import csv
+import json
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers
+
+from blog import counters
+from blog.cache import invalidate_blog_posts
+from blog.export import CSV_AUTHOR_SEPARATOR
+from blog.models import Author, BlogPost
+from blog.reorder import ORDER_GAP, get_next_order
+from blog.serializers import BlogPostImportSerializer
+
+CHUNK_SIZE = 5000
+# Times a batch is written again after a concurrent write took one of its pairs
+INSERT_ATTEMPTS = 3
+WORKERS = os.cpu_count() or 1
+# Invalid records kept for the report, the rest are only counted
+MAX_ERRORS = 100
+IMPORT_FORMATS = {
+    '.jsonl': 'ndjson',
+    '.ndjson': 'ndjson',
+    '.csv': 'csv',
+}
+
+
+def get_import_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Can't tell the format of {path}, use one of: {', '.join(IMPORT_FORMATS)}")
+    return IMPORT_FORMATS[extension]
+
+
+def iter_records(file, import_format):
+    """(line number, raw record) pairs, ndjson records are left unparsed for the workers."""
+    if import_format == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(file, start=1):
+        if line.strip():
+            yield line_number, line
+
+
+def parse_record(raw, import_format):
+    if import_format == 'csv':
+        # Empty cells are missing values, the serializer applies the defaults
+        record = {key: value for key, value in raw.items() if value != ''}
+        if 'authors' in record:
+            record['authors'] = record['authors'].split(CSV_AUTHOR_SEPARATOR)
+        return record
+    record = json.loads(raw)
+    if not isinstance(record, dict):
+        raise ValueError('Expected a JSON object.')
+    # Exports carry authors as objects
+    record['authors'] = [
+        author.get('email') if isinstance(author, dict) else author for author in record.get('authors') or []
+    ]
+    return record
+
+
+def validate_batch(batch, import_format):
+    """Returns (line number, validated data, errors) for every record, runs in the worker processes."""
+    # One serializer for the batch, a ModelSerializer builds its fields per instance
+    serializer = BlogPostImportSerializer()
+    results = []
+    for line_number, raw in batch:
+        try:
+            results.append((line_number, dict(serializer.run_validation(parse_record(raw, import_format))), None))
+        except serializers.ValidationError as error:
+            results.append((line_number, None, error.detail))
+        except ValueError as error:
+            results.append((line_number, None, {'non_field_errors': [str(error)]}))
+    return results
+
+
+def iter_validated(batches, import_format, workers=WORKERS):
+    if workers <= 1:
+        for batch in batches:
+            yield validate_batch(batch, import_format)
+        return
+
+    # Workers set Django up again when they are spawned instead of forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(validate_batch, batch, import_format))
+            # Bounded read-ahead, executor.map() would read the whole file first
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_author_lookup():
+    # Author.email isn't unique, the oldest author with an email wins
+    return {
+        email.lower(): author_id
+        for author_id, email in Author.objects.order_by('-id').values_list('id', 'email').iterator()
+    }
+
+
+def create_new_blog_posts(blog_posts):
+    """
+    bulk_create()s the posts whose (title, text) pair no stored post and no
+    earlier post of the list has, and returns them with their ids. Conflicts
+    aren't ignored by the INSERT, so every returned post was written here.
+    """
+    for attempt in range(INSERT_ATTEMPTS):
+        taken = set(BlogPost.objects.filter(
+            title__in={blog_post.title for blog_post in blog_posts}).values_list('title', 'text'))
+        new = []
+        for blog_post in blog_posts:
+            pair = (blog_post.title, blog_post.text)
+            if pair not in taken:
+                taken.add(pair)
+                new.append(blog_post)
+        try:
+            with transaction.atomic():
+                created = BlogPost.objects.bulk_create(new)
+            break
+        except IntegrityError:
+            # Another writer stored one of the pairs since they were read
+            if attempt == INSERT_ATTEMPTS - 1:
+                raise
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # The pairs are unique and were free, the rows holding them are these
+        ids = {
+            (title, text): pk
+            for pk, title, text in BlogPost.objects.filter(
+                title__in={blog_post.title for blog_post in created}).values_list('id', 'title', 'text')
+        }
+        for blog_post in created:
+            blog_post.pk = ids[(blog_post.title, blog_post.text)]
+    return created
+
+
+def write_chunk(entries, author_lookup, owner, next_order, stats):
+    """Writes one batch of validated records and returns the next free order key."""
+    through = BlogPost.authors.through
+    with transaction.atomic():
+        blog_posts, authors = [], {}
+        for entry in entries:
+            # A pair repeated in the file keeps the authors of its first record, like the row itself
+            authors.setdefault((entry['title'], entry['text']), entry.pop('authors'))
+            if 'order' not in entry:
+                entry['order'] = next_order
+                next_order += ORDER_GAP
+            blog_posts.append(BlogPost(owner=owner, **entry))
+        created = create_new_blog_posts(blog_posts)
+
+        links, deltas = [], Counter()
+        for blog_post in created:
+            deltas.update(counters.get_deltas(None, counters.get_state(blog_post)))
+            for email in authors.get((blog_post.title, blog_post.text), []):
+                author_id = author_lookup.get(email.lower())
+                if author_id is None:
+                    stats['unknown_authors'] += 1
+                    continue
+                links.append(through(blogpost_id=blog_post.pk, author_id=author_id))
+        through.objects.bulk_create(links, ignore_conflicts=True)
+        counters.apply_deltas(deltas)
+    stats['created'] += len(created)
+    stats['skipped'] += len(entries) - len(created)
+    stats['author_links'] += len(links)
+    return next_order
+
+
+def import_blog_posts(file, import_format, chunk_size=CHUNK_SIZE, workers=WORKERS, owner=None, dry_run=False,
+                      progress=None):
+    """
+    Imports the records of an open file and returns (stats, errors). stats
+    counts read, created, skipped (already stored or repeated in the file),
+    invalid and linked records, errors holds (line number, errors) of the
+    first MAX_ERRORS invalid records. A dry run only validates.
+    progress(stats) is called after every batch.
+    """
+    stats, errors = Counter(), []
+    author_lookup = None if dry_run else get_author_lookup()
+    next_order = None if dry_run else get_next_order()
+    records = iter_records(file, import_format)
+    batches = iter(lambda: list(islice(records, chunk_size)), [])
+
+    for results in iter_validated(batches, import_format, workers):
+        entries = []
+        for line_number, entry, entry_errors in results:
+            stats['read'] += 1
+            if entry_errors:
+                stats['invalid'] += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append((line_number, entry_errors))
+            else:
+                entries.append(entry)
+        if dry_run:
+            stats['valid'] += len(entries)
+        elif entries:
+            next_order = write_chunk(entries, author_lookup, owner, next_order, stats)
+        if progress is not None:
+            progress(stats)
+
+    if stats['created']:
+        invalidate_blog_posts()
+    return stats, errors
@@ -0,0 +1,167 @@
+"""
+Per-request cost of every view and DRF action.
+
+collect() counts the queries run on every database connection with their
+total time and how many repeat an earlier query with the same SQL and
+parameters. The time spent in serializer.data (without the SQL it runs) and
+in rendering the response are added by RequestInstrumentationMiddleware.
+
+Finished requests are folded into an in-process report, per view name like
+`BlogPostViewSet.list` or `BlogPostViewSet.publish`. Every worker process
+keeps its own report.
+"""
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+# Latest requests per view the percentiles are computed from
+SAMPLE_SIZE = 1000
+
+_current = ContextVar('blog_request_metrics', default=None)
+_lock = threading.Lock()
+_report = defaultdict(lambda: {
+    'requests': 0, 'queries': 0, 'duplicated_queries': 0, 'sql_ms': 0.0, 'serialize_ms': 0.0,
+    'render_ms': 0.0, 'total_ms': 0.0, 'bytes': 0, 'max_queries': 0, 'max_ms': 0.0,
+    'samples': deque(maxlen=SAMPLE_SIZE),
+})
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.duplicated_queries = 0
+        self.sql_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self.bytes = None
+        self.seen_queries = set()
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+            key = (sql, repr(params))
+            if key in self.seen_queries:
+                self.duplicated_queries += 1
+            else:
+                self.seen_queries.add(key)
+
+    def get_server_timing(self):
+        return ', '.join([
+            f'db;dur={self.sql_ms:.1f};desc="{self.queries} queries, {self.duplicated_queries} duplicated"',
+            f'serialize;dur={self.serialize_ms:.1f}',
+            f'render;dur={self.render_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+@contextmanager
+def collect():
+    """Collects the queries run inside the block into the yielded RequestMetrics."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.record_query))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def get_view_name(view_func, method):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    # ViewSets map the HTTP method to an action, plain APIViews to a handler of the same name
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+_serializer_data = BaseSerializer.data
+
+
+def timed_serializer_data(self):
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        return _serializer_data.fget(self)
+    metrics.serializing = True
+    sql_ms = metrics.sql_ms
+    started = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        # Lazy querysets run while serializing, their time is already counted as SQL
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.serialize_ms += max(elapsed - (metrics.sql_ms - sql_ms), 0)
+        metrics.serializing = False
+
+
+def install():
+    """Times serializer.data, only called when instrumentation is enabled."""
+    BaseSerializer.data = property(timed_serializer_data)
+
+
+def record(metrics):
+    with _lock:
+        entry = _report[metrics.view]
+        entry['requests'] += 1
+        entry['queries'] += metrics.queries
+        entry['duplicated_queries'] += metrics.duplicated_queries
+        entry['sql_ms'] += metrics.sql_ms
+        entry['serialize_ms'] += metrics.serialize_ms
+        entry['render_ms'] += metrics.render_ms
+        entry['total_ms'] += metrics.total_ms
+        entry['bytes'] += metrics.bytes or 0
+        entry['max_queries'] = max(entry['max_queries'], metrics.queries)
+        entry['max_ms'] = max(entry['max_ms'], metrics.total_ms)
+        entry['samples'].append(metrics.total_ms)
+
+
+def percentile(ordered, percent):
+    # Nearest rank, like the benchmark suite
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def get_report():
+    """Aggregated metrics per view, the most expensive views in total first."""
+    with _lock:
+        entries = [(view, dict(entry), sorted(entry['samples'])) for view, entry in _report.items()]
+
+    report = []
+    for view, entry, samples in entries:
+        requests = entry['requests']
+        report.append({
+            'view': view,
+            'requests': requests,
+            'total_ms': round(entry['total_ms'], 1),
+            'avg_ms': round(entry['total_ms'] / requests, 2),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'max_ms': round(entry['max_ms'], 2),
+            'avg_queries': round(entry['queries'] / requests, 2),
+            'max_queries': entry['max_queries'],
+            'duplicated_queries': entry['duplicated_queries'],
+            'avg_sql_ms': round(entry['sql_ms'] / requests, 2),
+            'avg_serialize_ms': round(entry['serialize_ms'] / requests, 2),
+            'avg_render_ms': round(entry['render_ms'] / requests, 2),
+            'avg_bytes': round(entry['bytes'] / requests),
+        })
+    return sorted(report, key=lambda item: item['total_ms'], reverse=True)
+
+
+def reset_report():
+    with _lock:
+        _report.clear()
@@ -0,0 +1,248 @@
+"""
+Batch jobs that walk a queryset in primary key order, one short transaction
+per chunk.
+
+Every chunk commits together with its JobCheckpoint row, so a job that is
+interrupted (worker restart, deploy, Ctrl-C) carries on after the last
+committed chunk the next time it runs. A finished job starts from the
+beginning again.
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from blog import blobs, counters
+from blog.blobs import FILE_FIELDS
+from blog.counters import update_blog_posts
+from blog.images import get_blob_variant_names, get_variant_names
+from blog.models import (
+    ArchivedBlogPost,
+    ArchivedBlogPostImage,
+    BlogPost,
+    BlogPostCover,
+    BlogPostImage,
+    JobCheckpoint,
+    MediaBlob,
+)
+from blog.storage import blob_storage
+
+CHUNK_SIZE = 1000
+DELETE_INACTIVE_JOB = 'delete_inactive_blog_posts'
+PURGE_DELETED_JOB = 'purge_deleted_blog_posts'
+PURGE_ARCHIVED_JOB = 'purge_deleted_archived_blog_posts'
+MEDIA_GARBAGE_JOB = 'collect_media_garbage'
+
+
+def start_checkpoint(name, restart=False):
+    checkpoint, created = JobCheckpoint.objects.get_or_create(name=name)
+    if created or restart or checkpoint.finished_at is not None:
+        checkpoint.last_pk = None
+        checkpoint.processed = 0
+        checkpoint.started_at = timezone.now()
+        checkpoint.finished_at = None
+        checkpoint.save()
+    return checkpoint
+
+
+def run_in_chunks(name, queryset, process_chunk, chunk_size=CHUNK_SIZE, dry_run=False, restart=False,
+                  pause=0, progress=None):
+    """
+    Calls process_chunk(chunk_queryset) for consecutive primary key ranges
+    holding up to chunk_size rows of queryset and returns the sum of its
+    return values. A dry run writes nothing and counts the rows instead.
+    progress(processed, last_pk) is called after every chunk.
+    """
+    checkpoint = None if dry_run else start_checkpoint(name, restart)
+    last_pk = checkpoint.last_pk if checkpoint else None
+    processed = checkpoint.processed if checkpoint else 0
+
+    while True:
+        pending = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        # The chunk is bounded by primary keys, so the write below is a range on the primary key
+        pks = list(pending.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        chunk = pending.filter(pk__lte=pks[-1])
+        if dry_run:
+            processed += len(pks)
+        else:
+            with transaction.atomic():
+                processed += process_chunk(chunk)
+                checkpoint.last_pk = pks[-1]
+                checkpoint.processed = processed
+                checkpoint.save(update_fields=['last_pk', 'processed', 'updated_at'])
+        last_pk = pks[-1]
+        if progress is not None:
+            progress(processed, last_pk)
+        if pause:
+            # Leaves room for other writers, SQLite only has one write lock
+            time.sleep(pause)
+
+    if checkpoint is not None:
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at', 'updated_at'])
+    return processed
+
+
+def delete_inactive_blog_posts(chunk_size=CHUNK_SIZE, dry_run=False, restart=False, pause=0, progress=None):
+    """Soft-deletes inactive blog posts and returns how many were deleted."""
+    return run_in_chunks(
+        DELETE_INACTIVE_JOB,
+        BlogPost.objects.filter(is_active=False, deleted=False),
+        lambda chunk: update_blog_posts(chunk, deleted=True, deleted_at=timezone.now()),
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        restart=restart,
+        pause=pause,
+        progress=progress,
+    )
+
+
+def get_file_references(blog_posts):
+    """
+    (references, variant names) of the posts with their covers and images:
+    a Counter of the FILE_FIELDS values they hold and the set of their
+    variant files.
+    """
+    references = Counter(blog_posts.values_list('document', flat=True))
+    if blog_posts.model is ArchivedBlogPost:
+        image_rows = [
+            blog_posts.values_list('cover_image', 'cover_variants'),
+            ArchivedBlogPostImage.objects.filter(blog_post__in=blog_posts).values_list('image', 'variants'),
+        ]
+    else:
+        image_rows = [
+            BlogPostCover.objects.filter(blog_post__in=blog_posts).values_list('image', 'variants'),
+            BlogPostImage.objects.filter(blog_post__in=blog_posts).values_list('image', 'variants'),
+        ]
+    variant_names = set()
+    for rows in image_rows:
+        for image, variants in rows:
+            references[image] += 1
+            variant_names.update(get_variant_names(variants))
+    del references['']
+    del references[None]
+    return references, variant_names
+
+
+def get_file_names(blog_posts):
+    references, variant_names = get_file_references(blog_posts)
+    return set(references) | variant_names
+
+
+def get_referenced_file_names(names):
+    referenced = set()
+    for model, field in FILE_FIELDS:
+        referenced.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def delete_files(names):
+    # Blobs and their variants are left to collect_media_garbage(), other files still used
+    # by other rows (the same upload attached twice) are kept
+    names = {name for name in names if not blobs.is_blob(name) and not blobs.is_blob_variant(name)}
+    for name in sorted(names - get_referenced_file_names(names)):
+        try:
+            default_storage.delete(name)
+        except OSError as error:
+            print(f"Could not delete {name}: {error}")
+
+
+def purge_blog_posts(blog_posts):
+    """
+    Deletes the blog posts with their covers, images and author links, and
+    removes their files from storage once the transaction has committed.
+    Returns the number of deleted blog posts.
+    """
+    references, variant_names = get_file_references(blog_posts)
+    with counters.batch():
+        deleted, per_model = blog_posts.delete()
+    if blog_posts.model is ArchivedBlogPost:
+        # The archive tables send no signals
+        blobs.release(references.elements())
+    names = set(references) | variant_names
+    if names:
+        transaction.on_commit(lambda: delete_files(names))
+    return per_model.get(blog_posts.model._meta.label, 0)
+
+
+def get_deleted_before(days, model=BlogPost):
+    cutoff = timezone.now() - timedelta(days=days)
+    # Posts deleted by a raw queryset update, or before deleted_at existed, have none, their last update stands in
+    return model.objects.filter(deleted=True).filter(
+        Q(deleted_at__lt=cutoff) | Q(deleted_at__isnull=True, updated_at__lt=cutoff)
+    )
+
+
+def purge_deleted_blog_posts(days=None, chunk_size=CHUNK_SIZE, dry_run=False, restart=False, pause=None,
+                             progress=None):
+    """
+    Hard-deletes blog posts soft-deleted more than `days` ago, in the hot
+    table and in the archive, and returns how many were purged.
+    """
+    if days is None:
+        days = settings.BLOG_POST_PURGE_AFTER_DAYS
+    if pause is None:
+        pause = settings.BLOG_POST_PURGE_PAUSE
+    return sum(
+        run_in_chunks(
+            name,
+            get_deleted_before(days, model),
+            purge_blog_posts,
+            chunk_size=chunk_size,
+            dry_run=dry_run,
+            restart=restart,
+            pause=pause,
+            progress=progress,
+        )
+        for name, model in ((PURGE_DELETED_JOB, BlogPost), (PURGE_ARCHIVED_JOB, ArchivedBlogPost))
+    )
+
+
+def delete_unreferenced_blobs(blob_rows):
+    names = list(blob_rows.values_list('name', flat=True))
+    # The counts are only trusted to pick candidates, a blob still referenced gets its count back
+    references = blobs.get_reference_counts(names)
+    for name, ref_count in references.items():
+        MediaBlob.objects.filter(name=name).update(ref_count=ref_count)
+    deleted = 0
+    for name in names:
+        if name in references:
+            continue
+        # Rows first, still conditional on the candidate filter: the same content uploaded meanwhile
+        # bumped updated_at and keeps its file. An upload after the delete waits for this transaction
+        # and writes the file again, the storage touches the row before it checks for the file.
+        if not blob_rows.filter(name=name).delete()[0]:
+            continue
+        deleted += 1
+        for file_name in [name, *get_blob_variant_names(name)]:
+            try:
+                blob_storage.delete(file_name)
+            except OSError as error:
+                print(f"Could not delete {file_name}: {error}")
+    return deleted
+
+
+def collect_media_garbage(hours=None, chunk_size=CHUNK_SIZE, dry_run=False, restart=False, progress=None):
+    """
+    Deletes the blobs nothing has referenced for `hours`, with their files
+    and variant files, and returns how many were deleted. A dry run counts the candidates.
+    """
+    if hours is None:
+        hours = settings.BLOG_MEDIA_BLOB_GRACE_HOURS
+    cutoff = timezone.now() - timedelta(hours=hours)
+    return run_in_chunks(
+        MEDIA_GARBAGE_JOB,
+        MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff),
+        delete_unreferenced_blobs,
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        restart=restart,
+        progress=progress,
+    )
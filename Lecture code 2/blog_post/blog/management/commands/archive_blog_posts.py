@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.archive import archive_blog_posts
+from blog.jobs import CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Moves archived blog posts and posts deleted more than --days ago to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.BLOG_POST_ARCHIVE_DELETED_AFTER_DAYS,
+            help='Move posts deleted more than this many days ago'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the posts that would be moved')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        blog_posts_count = archive_blog_posts(
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+            pause=options['pause'],
+            progress=lambda processed, last_pk: self.stdout.write(f"{verb} {processed} blog posts up to id {last_pk}"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {blog_posts_count} blog posts"
+        ))
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog.benchmarks import compare_with_baseline, generate_blog_data, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency percentiles, query counts and peak memory of the blog endpoints and jobs, '
+        'and fails when they regress against a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append',
+            help='Only run scenarios whose name contains this text, can be repeated'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Measured runs per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured runs per scenario')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Keep the response cache between runs, by default every run starts cold'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=0,
+            help='Generate this many posts for the run first, they are rolled back with the rest'
+        )
+        parser.add_argument(
+            '--baseline', default='benchmark_baseline.json',
+            help='Results file to compare against, the run fails when it regresses'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true', help='Write the results to --baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed growth of p95 latency and peak memory, as a fraction of the baseline'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'scenario':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'queries':>8} {'peak KB':>9}"
+        )
+        # Everything runs in a transaction that is rolled back, the database is left untouched
+        with transaction.atomic():
+            if options['posts']:
+                generate_blog_data(posts=options['posts'], users=10, authors=100, files=0)
+            try:
+                results = run_benchmarks(
+                    names=options['scenario'],
+                    repeat=options['repeat'],
+                    warmup=options['warmup'],
+                    warm_cache=options['warm_cache'],
+                    progress=self.report,
+                )
+            except (AssertionError, ValueError) as error:
+                raise CommandError(error)
+            transaction.set_rollback(True)
+        if not results:
+            raise CommandError('No scenario matches --scenario')
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Saved {len(results)} results to {options['baseline']}"))
+            return
+
+        try:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {options['baseline']}, run with --save-baseline to store one"))
+            return
+
+        regressions = compare_with_baseline(results, baseline, options['tolerance'])
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<28} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+            f"{result['max_ms']:9.2f} {result['queries']:8d} {result['peak_kb']:9.1f}"
+        )
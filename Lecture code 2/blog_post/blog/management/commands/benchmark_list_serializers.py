@@ -0,0 +1,66 @@
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+
+from blog.models import Author, BlogPost
+from blog.serializers import BlogPostListSerializer, BlogPostListValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares the per-row cost of BlogPostListSerializer and its .values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows serialized per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per serializer, the best one is reported')
+        parser.add_argument('--text-size', type=int, default=5000, help='Length of the generated text column')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # Everything runs in a transaction that is rolled back, the database is left untouched
+        with transaction.atomic():
+            self.create_rows(rows, options['text_size'])
+            queryset = BlogPost.objects.filter(deleted=False, title__startswith='benchmark-')
+
+            regular = self.measure(options['repeat'], lambda: BlogPostListSerializer(
+                BlogPostListSerializer.setup_eager_loading(queryset), many=True).data)
+            fast = self.measure(options['repeat'], lambda: BlogPostListValuesSerializer(
+                BlogPostListValuesSerializer.get_values_queryset(queryset), many=True).data)
+            transaction.set_rollback(True)
+
+        for name, (seconds, queries) in (('BlogPostListSerializer', regular), ('BlogPostListValuesSerializer', fast)):
+            self.stdout.write(
+                f"{name:<30} {seconds * 1000:9.2f} ms total  "
+                f"{seconds / rows * 1_000_000:8.2f} us/row  {queries} queries"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fast path is {regular[0] / fast[0]:.1f}x faster over {rows} rows"
+        ))
+
+    def create_rows(self, rows, text_size):
+        authors = Author.objects.bulk_create(
+            Author(first_name=f'First {index}', last_name=f'Last {index}', email=f'author{index}@example.com')
+            for index in range(10)
+        )
+        blog_posts = BlogPost.objects.bulk_create(
+            BlogPost(title=f'benchmark-{index}', text='x' * text_size, order=index, category=index % 5 + 1)
+            for index in range(rows)
+        )
+        through = BlogPost.authors.through
+        through.objects.bulk_create(
+            through(blogpost_id=blog_post.id, author_id=authors[(blog_post.id + offset) % len(authors)].id)
+            for blog_post in blog_posts
+            for offset in range(2)
+        )
+
+    def measure(self, repeat, serialize):
+        best, queries = None, 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                serialize()
+                elapsed = time.perf_counter() - started
+            if best is None or elapsed < best:
+                best, queries = elapsed, len(context.captured_queries)
+        return best, queries
@@ -0,0 +1,70 @@
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+
+from blog.models import BlogPost
+from blog.reorder import reorder_blog_posts, supports_update_from
+
+
+class Command(BaseCommand):
+    help = 'Times the set-based, bulk_update and row-by-row BlogPost reorder on generated rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[100_000, 1_000_000],
+            help='Table sizes to benchmark, one run per size'
+        )
+        parser.add_argument(
+            '--row-by-row-limit', type=int, default=2000,
+            help='The row-by-row save() loop only runs on this many rows and is extrapolated'
+        )
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            # Everything runs in a transaction that is rolled back, the database is left untouched
+            with transaction.atomic():
+                BlogPost.objects.all().delete()
+                self.create_rows(rows)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{rows} rows"))
+                if supports_update_from(connection):
+                    self.report('UPDATE ... FROM', rows, lambda sort: reorder_blog_posts(sort, 'asc'))
+                self.report('bulk_update', rows, lambda sort: reorder_blog_posts(sort, 'asc', set_based=False))
+                self.report_row_by_row(min(rows, options['row_by_row_limit']), rows)
+                transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Finished reorder benchmark'))
+
+    def create_rows(self, rows):
+        # Titles run against ids, so every reorder by title rewrites every row
+        BlogPost.objects.bulk_create(
+            (
+                BlogPost(title=f'benchmark-{rows - index:08d}', text='x', order=index, category=index % 5 + 1)
+                for index in range(rows)
+            ),
+            batch_size=5000
+        )
+
+    def report(self, name, rows, reorder):
+        # Alternate the sort field so every run rewrites every row
+        for sort_field in ('title', 'id'):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                updated = reorder(sort_field)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name:<16} by {sort_field:<6} {elapsed:9.2f} s  {elapsed / rows * 1_000_000:8.2f} us/row  "
+                f"{updated} updated  {len(context.captured_queries)} queries"
+            )
+
+    def report_row_by_row(self, sample, rows):
+        started = time.perf_counter()
+        for index, blog_post in enumerate(BlogPost.objects.order_by('-title')[:sample], start=1):
+            blog_post.order = index
+            blog_post.save(update_fields=['order'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{'row by row':<16} by title  {elapsed / sample * rows:9.2f} s  "
+            f"{elapsed / sample * 1_000_000:8.2f} us/row  extrapolated from {sample} rows"
+        )
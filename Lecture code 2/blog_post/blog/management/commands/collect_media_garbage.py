@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import blobs
+from blog.jobs import CHUNK_SIZE, collect_media_garbage
+
+
+class Command(BaseCommand):
+    help = 'Deletes the media blobs no cover, image or document has referenced for --hours, with their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.BLOG_MEDIA_BLOB_GRACE_HOURS,
+            help='Only delete blobs unreferenced for more than this many hours'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the blobs that would be deleted')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument(
+            '--reconcile', action='store_true', help='Recount the references of every blob first'
+        )
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            self.stdout.write(f"Recounted the references, {blobs.reconcile()} blobs repaired")
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        blobs_count = collect_media_garbage(
+            hours=options['hours'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+            progress=lambda processed, last_pk: self.stdout.write(f"{verb} {processed} blobs up to id {last_pk}"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {blobs_count} blobs"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from blog.jobs import CHUNK_SIZE
+from blog.upload_sessions import delete_expired_document_uploads
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired chunked document upload sessions with their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the sessions that would be deleted')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+
+    def handle(self, *args, **options):
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        sessions_count = delete_expired_document_uploads(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+            progress=lambda processed, last_pk: self.stdout.write(
+                f"{verb} {processed} upload sessions up to id {last_pk}"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sessions_count} upload sessions"
+        ))
@@ -1,12 +1,25 @@
 from django.core.management.base import BaseCommand
-from blog.models import BlogPost
+from blog.jobs import CHUNK_SIZE, delete_inactive_blog_posts
 
 class Command(BaseCommand):
+    help = 'Soft-deletes inactive blog posts in primary key chunks, resuming an interrupted run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the posts that would be deleted')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
 
     def handle(self, *args, **kwargs):
-        blog_posts_count = BlogPost.objects.filter(is_active=False).count()
-        BlogPost.objects.filter(is_active=False).update(deleted=True)
+        verb = 'Would delete' if kwargs['dry_run'] else 'Deleted'
+        blog_posts_count = delete_inactive_blog_posts(
+            chunk_size=kwargs['chunk_size'],
+            dry_run=kwargs['dry_run'],
+            restart=kwargs['restart'],
+            pause=kwargs['pause'],
+            progress=lambda processed, last_pk: self.stdout.write(f"{verb} {processed} blog posts up to id {last_pk}"),
+        )
 
         self.stdout.write(self.style.SUCCESS(
-            f"Updated {blog_posts_count} blog posts"
+            f"{verb} {blog_posts_count} blog posts"
         ))
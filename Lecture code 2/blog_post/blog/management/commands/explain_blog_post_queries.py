@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from blog.filtersets import BlogPostFilter
+from blog.jobs import CHUNK_SIZE
+from blog.models import ArchivedBlogPost, BlogPost
+from blog.pagination import BlogPostKeysetPagination, BlogPostPagination
+
+
+class Command(BaseCommand):
+    help = 'Prints the EXPLAIN plan of the queryset behind every BlogPost endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            help='Only explain endpoints whose name contains this text, can be repeated'
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run the queries and show actual timings (PostgreSQL, MySQL, MariaDB)'
+        )
+        parser.add_argument(
+            '--sql',
+            action='store_true',
+            help='Print the SQL above every plan'
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        endpoints = [
+            (name, queryset) for name, queryset in self.get_querysets()
+            if not options['endpoint'] or any(part in name for part in options['endpoint'])
+        ]
+        if not endpoints:
+            raise CommandError('No endpoint matches --endpoint')
+
+        for name, queryset in endpoints:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if options['sql']:
+                self.stdout.write(str(queryset.query))
+            try:
+                self.stdout.write(queryset.explain(**explain_options))
+            except (NotSupportedError, ValueError) as error:
+                raise CommandError(error)
+            self.stdout.write('')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Explained {len(endpoints)} blog post querysets"
+        ))
+
+    def get_querysets(self):
+        # Mirrors the querysets the viewsets build, the lookup values are placeholders
+        live = BlogPost.objects.filter(deleted=False)
+        page_size = BlogPostKeysetPagination.page_size + 1
+        paginator = BlogPostKeysetPagination()
+        paginator.field = 'order'
+
+        yield '/blog/blogpost/', live.order_by('order', 'id')[:page_size]
+        yield '/blog/blogpost/ next page', live.filter(
+            paginator.get_keyset_filter(0, 0, descending=False)
+        ).order_by('order', 'id')[:page_size]
+        yield '/blog/blogpost/?ordering=-id', live.order_by('-id')[:page_size]
+        for params in ({'category': 1}, {'title': 'title'}, {'recent': True}, {'keyword': 'keyword'}):
+            name = next(iter(params))
+            yield f'/blog/blogpost/?{name}=', BlogPostFilter(
+                params, queryset=live
+            ).qs.order_by('order', 'id')[:page_size]
+        yield '/blog/blogpost/<id>/', live.filter(pk=1)
+        yield '/blog/blogpost/archived_posts/', BlogPost.objects.filter(archived=True)
+        yield '/blog/blogpost/archived_posts/ archive', ArchivedBlogPost.objects.filter(archived=True)
+        yield '/blog/blog_posts/', live[:BlogPostPagination.page_size]
+        yield 'delete_inactive_blog_posts', BlogPost.objects.filter(
+            is_active=False, deleted=False
+        ).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE]
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.choices import EXPORT_FORMAT_CHOICES
+from blog.export import CHUNK_SIZE, iter_archived_rows, iter_export, iter_rows
+from blog.filtersets import BlogPostFilter
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Streams blog posts with their authors to a file or stdout as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--export-format', choices=[choice for choice, label in EXPORT_FORMAT_CHOICES], default='ndjson',
+            help='Output format'
+        )
+        parser.add_argument('--output', help='File to write, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows read per query')
+        parser.add_argument(
+            '--archived', action='store_true',
+            help='Export archived posts, of the hot table and the archive, instead of live ones'
+        )
+        # The same filters as the list and export endpoints
+        parser.add_argument('--category', help='Only posts of this category')
+        parser.add_argument('--title', help='Only posts with this exact title')
+        parser.add_argument('--keyword', help='Only posts matching this full-text search')
+        parser.add_argument('--recent', action='store_true', help='Only posts created in the last days')
+
+    def handle(self, *args, **options):
+        if options['archived']:
+            rows = iter_archived_rows(options['chunk_size'])
+        else:
+            rows = iter_rows(self.get_queryset(options), options['chunk_size'])
+
+        lines = iter_export(self.count(rows), options['export_format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(lines)
+        self.stdout.write(self.style.SUCCESS(f"Exported {self.exported} blog posts to {options['output']}"))
+
+    def count(self, rows):
+        self.exported = 0
+        for row in rows:
+            self.exported += 1
+            yield row
+
+    def get_queryset(self, options):
+        data = {name: options[name] for name in ('category', 'title', 'keyword') if options[name] is not None}
+        if options['recent']:
+            data['recent'] = 'true'
+        filterset = BlogPostFilter(data=data, queryset=BlogPost.objects.filter(deleted=False))
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        return filterset.qs
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks import BATCH_SIZE, generate_blog_data
+
+
+class Command(BaseCommand):
+    help = 'Bulk-creates synthetic users, authors and blog posts with author links, covers and images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to create, posts are spread over them')
+        parser.add_argument('--authors', type=int, default=500, help='Authors to create')
+        parser.add_argument('--posts', type=int, default=10_000, help='Blog posts to create')
+        parser.add_argument('--authors-per-post', type=int, default=2, help='Authors linked to every post')
+        parser.add_argument('--images-per-post', type=int, default=1, help='Images attached to every post')
+        parser.add_argument('--cover-ratio', type=float, default=0.5, help='Share of posts with a cover')
+        parser.add_argument('--archived-ratio', type=float, default=0.05, help='Share of archived posts')
+        parser.add_argument('--inactive-ratio', type=float, default=0.05, help='Share of inactive posts')
+        parser.add_argument('--deleted-ratio', type=float, default=0.05, help='Share of soft-deleted posts')
+        parser.add_argument(
+            '--files', type=int, default=10,
+            help='Image files written to storage, covers and images point at them; 0 creates none'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Posts per transaction')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same data')
+
+    def handle(self, *args, **options):
+        created = generate_blog_data(
+            users=options['users'],
+            authors=options['authors'],
+            posts=options['posts'],
+            authors_per_post=options['authors_per_post'],
+            images_per_post=options['images_per_post'],
+            cover_ratio=options['cover_ratio'],
+            archived_ratio=options['archived_ratio'],
+            inactive_ratio=options['inactive_ratio'],
+            deleted_ratio=options['deleted_ratio'],
+            files=options['files'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=lambda created: self.stdout.write(f"Created {created['blog_posts']} blog posts"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['users']} users, {created['authors']} authors, {created['blog_posts']} blog posts, "
+            f"{created['author_links']} author links, {created['covers']} covers and {created['images']} images"
+        ))
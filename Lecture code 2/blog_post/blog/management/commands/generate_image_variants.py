@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from blog.images import CHUNK_SIZE, IMAGE_MODELS, WORKERS, generate_missing_variants
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized variants of covers and gallery images that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', choices=sorted(IMAGE_MODELS),
+            help='Only these models, covers and gallery images by default'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=WORKERS,
+            help='Processes decoding and encoding images, 1 renders in this process'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows read per query')
+        parser.add_argument('--force', action='store_true', help='Regenerate the variants of every image')
+
+    def handle(self, *args, **options):
+        models = [IMAGE_MODELS[label] for label in options['model'] or IMAGE_MODELS]
+        stats = generate_missing_variants(
+            models,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            force=options['force'],
+            progress=lambda stats: self.stdout.write(f"Generated the variants of {stats['generated']} images"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated the variants of {stats['generated']} images, {stats['failed']} could not be read, "
+            f"{stats['skipped']} changed meanwhile, {stats['reused']} reused the variants of the same file"
+        ))
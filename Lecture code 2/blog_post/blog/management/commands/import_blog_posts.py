@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.imports import CHUNK_SIZE, IMPORT_FORMATS, WORKERS, get_import_format, import_blog_posts
+from user.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Imports blog posts from a JSONL or CSV file, skipping posts whose title and text are already stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL (.jsonl, .ndjson) or CSV (.csv) file, as written by export_blog_posts')
+        parser.add_argument(
+            '--import-format', choices=sorted(set(IMPORT_FORMATS.values())),
+            help='File format, taken from the extension by default'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Records per batch and transaction')
+        parser.add_argument(
+            '--workers', type=int, default=WORKERS,
+            help='Processes parsing and validating records, 1 validates in this process'
+        )
+        parser.add_argument('--owner', help='Email of the user the imported posts belong to')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+
+    def handle(self, *args, **options):
+        try:
+            import_format = options['import_format'] or get_import_format(options['path'])
+        except ValueError as error:
+            raise CommandError(error)
+        owner = None
+        if options['owner']:
+            owner = CustomUser.objects.filter(email=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"No user with email {options['owner']}")
+
+        try:
+            file = open(options['path'], encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(f"Could not open {options['path']}: {error}")
+        with file:
+            stats, errors = import_blog_posts(
+                file,
+                import_format,
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+                owner=owner,
+                dry_run=options['dry_run'],
+                progress=lambda stats: self.stdout.write(
+                    f"Read {stats['read']} records, created {stats['created']} blog posts"),
+            )
+
+        for line_number, line_errors in errors:
+            self.stderr.write(f"Line {line_number}: {json.dumps(line_errors)}")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{stats['valid']} of {stats['read']} records are valid, {stats['invalid']} invalid"
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created']} blog posts from {stats['read']} records: {stats['skipped']} already stored, "
+            f"{stats['invalid']} invalid, {stats['author_links']} author links, "
+            f"{stats['unknown_authors']} unknown author emails"
+        ))
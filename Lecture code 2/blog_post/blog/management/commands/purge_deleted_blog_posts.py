@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.jobs import CHUNK_SIZE, purge_deleted_blog_posts
+
+
+class Command(BaseCommand):
+    help = 'Hard-deletes blog posts soft-deleted more than --days ago, with their covers, images and files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.BLOG_POST_PURGE_AFTER_DAYS,
+            help='Only purge posts deleted more than this many days ago'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the posts that would be purged')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument(
+            '--pause', type=float, default=settings.BLOG_POST_PURGE_PAUSE,
+            help='Seconds to sleep between chunks'
+        )
+
+    def handle(self, *args, **options):
+        verb = 'Would purge' if options['dry_run'] else 'Purged'
+        blog_posts_count = purge_deleted_blog_posts(
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+            pause=options['pause'],
+            progress=lambda processed, last_pk: self.stdout.write(f"{verb} {processed} blog posts up to id {last_pk}"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {blog_posts_count} blog posts"
+        ))
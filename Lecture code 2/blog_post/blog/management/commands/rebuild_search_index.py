@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the BlogPost full-text search index from the blog_blogpost table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to rebuild the index on'
+        )
+
+    def handle(self, *args, **options):
+        rebuild_search_index(using=options['database'])
+
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt blog post search index"
+        ))
@@ -1,5 +1,6 @@
-from django.core.management.base import BaseCommand
-from blog.models import BlogPost
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.reorder import BATCH_SIZE, SORT_DIRECTIONS, SORT_FIELDS, reorder_blog_posts
 
 class Command(BaseCommand):
 
@@ -7,25 +8,29 @@ class Command(BaseCommand):
         parser.add_argument(
             'sort_field',
             type=str,
+            choices=SORT_FIELDS,
             help='Field to sort by, e.g., "id", "title"'
         )
         parser.add_argument(
             'asc_des',
             type=str,
-            help='Field to sort by, e.g., "-id", "title"'
+            choices=SORT_DIRECTIONS,
+            help='Sort direction, "asc" or "des"'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Rows per bulk_update() when the backend has no UPDATE ... FROM'
         )
 
     def handle(self, *args, **kwargs):
-        sort_field = kwargs['sort_field']
-        asc_des = kwargs['asc_des']
-        if asc_des == 'des':
-            sort_field = f'-{sort_field}'
-        blog_posts = BlogPost.objects.order_by(sort_field)
-
-        for index, blog_post in enumerate(blog_posts, start=1):
-            blog_post.order = index
-            blog_post.save(update_fields=['order'])
+        try:
+            blog_posts_count = reorder_blog_posts(
+                kwargs['sort_field'], kwargs['asc_des'], batch_size=kwargs['batch_size'])
+        except ValueError as error:
+            raise CommandError(error)
 
         self.stdout.write(self.style.SUCCESS(
-            f"Updated order for {blog_posts.count()} blog posts."
+            f"Updated order for {blog_posts_count} blog posts."
         ))
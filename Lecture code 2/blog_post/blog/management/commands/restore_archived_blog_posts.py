@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blog.archive import restore_blog_posts
+from blog.models import ArchivedBlogPost
+
+
+class Command(BaseCommand):
+    help = 'Moves blog posts from the archive table back to the live table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', type=int, nargs='+', help='Ids of the archived blog posts')
+
+    def handle(self, *args, **options):
+        blog_posts_count = restore_blog_posts(ArchivedBlogPost.objects.filter(pk__in=options['ids']))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {blog_posts_count} blog posts"
+        ))
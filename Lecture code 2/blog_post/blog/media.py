@@ -0,0 +1,173 @@
+"""
+Serving covers, gallery images and documents after the permission checks.
+
+The view only decides whether the file may be sent. The bytes are sent by
+the front proxy, named by settings.BLOG_MEDIA_OFFLOAD:
+
+    'x-accel-redirect'  nginx, an `internal` location at
+                        BLOG_MEDIA_ACCEL_REDIRECT_PREFIX aliasing MEDIA_ROOT
+    'x-sendfile'        Apache mod_xsendfile, lighttpd, the absolute path
+
+Both answer Range and conditional requests themselves. Without a proxy
+(development, tests) a FileResponse streams the file, handing the open
+file to the server's wsgi.file_wrapper, with single byte ranges, If-Range,
+If-None-Match and If-Modified-Since handled here.
+
+Blobs are named after their SHA-256, which is their ETag. Other files
+(variants, files stored before blog.storage) get one from their size and
+modification time. Revalidations are answered with a 304 before anything
+is handed to the proxy.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer
+
+from blog import blobs
+
+OFFLOAD_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Lets media actions be negotiated for any Accept header. Files are
+    returned as plain Django responses and never rendered, errors are sent
+    without a body when the client takes no JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    """The `length` bytes of an open file from its current position on."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def get_etag(name, stat):
+    if blobs.is_blob(name):
+        return quote_etag(posixpath.splitext(posixpath.basename(name))[0])
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single `bytes=` range, end exclusive. None for
+    anything else, which is answered with the whole file.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range, the last `last` bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size
+    start = int(first)
+    end = size if last == '' else min(int(last) + 1, size)
+    if last != '' and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Strong comparison, a weak validator never matches
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def stream_file(request, path, size, response_kwargs, etag, last_modified):
+    byte_range = None
+    if 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, **response_kwargs)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start), status=status.HTTP_206_PARTIAL_CONTENT, **response_kwargs)
+        response['Content-Length'] = end - start
+        response['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(request, storage, name, filename=None, as_attachment=False):
+    """
+    Response sending the file `name` of storage, through the front proxy
+    when one is configured. `filename` is the name given to the client.
+    """
+    try:
+        path = storage.path(name)
+        stat = os.stat(path)
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404
+    etag = get_etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        filename = filename or posixpath.basename(name)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        offload = settings.BLOG_MEDIA_OFFLOAD
+        if offload is None:
+            response = stream_file(
+                request, path, stat.st_size,
+                {'content_type': content_type, 'as_attachment': as_attachment, 'filename': filename},
+                etag, last_modified,
+            )
+        else:
+            # No body, the proxy replaces it with the file
+            response = HttpResponse(content_type=content_type)
+            if offload == 'x-accel-redirect':
+                response[OFFLOAD_HEADERS[offload]] = quote(f'{settings.BLOG_MEDIA_ACCEL_REDIRECT_PREFIX}{name}')
+            else:
+                response[OFFLOAD_HEADERS[offload]] = path
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from blog import instrumentation
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Adds a Server-Timing header with the SQL, serialization and rendering
+    time of every request, and records them in the in-process report.
+
+    Unless BLOG_REQUEST_INSTRUMENTATION is on, Django drops the middleware
+    when it loads it and nothing is wrapped.
+    """
+
+    def __init__(self, get_response):
+        if not settings.BLOG_REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        instrumentation.install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with instrumentation.collect() as metrics:
+            request.instrumentation = metrics
+            response = self.get_response(request)
+        metrics.total_ms = (time.perf_counter() - started) * 1000
+        if metrics.view is None:
+            # Not resolved to a view, a 404 or a response from an earlier middleware
+            metrics.view = f'{response.status_code} {request.method}'
+        # Streamed content is produced after the middleware returns
+        metrics.bytes = None if response.streaming else len(response.content)
+        response['Server-Timing'] = metrics.get_server_timing()
+        instrumentation.record(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.instrumentation.view = instrumentation.get_view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook
+        started = time.perf_counter()
+        metrics = request.instrumentation
+
+        def rendered(response):
+            metrics.render_ms += (time.perf_counter() - started) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:30
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_counters(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    BlogPostCounter = apps.get_model('blog', 'BlogPostCounter')
+
+    counts = Counter()
+    groups = BlogPost.objects.order_by().values(
+        'deleted', 'published', 'archived', 'category').annotate(rows=Count('id'))
+    for group in groups:
+        rows = group['rows']
+        counts['total'] += rows
+        if group['deleted']:
+            counts['deleted'] += rows
+            continue
+        counts['live'] += rows
+        if group['published']:
+            counts['published'] += rows
+        if group['archived']:
+            counts['archived'] += rows
+        if group['category'] is not None:
+            counts[f"category:{group['category']}"] += rows
+
+    BlogPostCounter.objects.bulk_create(
+        BlogPostCounter(key=key, value=value) for key, value in counts.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_blogpost_archived_blogpost_published'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogPostCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='Key')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'Blog Post Counter',
+                'verbose_name_plural': 'Blog Post Counters',
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
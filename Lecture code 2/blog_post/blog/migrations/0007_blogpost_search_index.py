@@ -0,0 +1,16 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:32
+
+from django.db import migrations
+
+from blog.search import create_search_index, drop_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blogpostcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_blogpost_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['order', 'id'], name='blog_post_live_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['category', 'order', 'id'], name='blog_post_live_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['created_at'], name='blog_post_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('archived', True)), fields=['order'], name='blog_post_archived_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='blog_post_inactive_idx'),
+        ),
+    ]
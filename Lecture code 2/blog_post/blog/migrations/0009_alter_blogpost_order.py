@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:44
+
+from django.db import migrations, models
+from django.db.models import F
+
+ORDER_GAP = 1024
+
+
+def spread_order(apps, schema_editor):
+    # Existing dense keys keep their order and get room for single-row moves
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    BlogPost.objects.update(order=F('order') * ORDER_GAP)
+
+
+def compact_order(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    BlogPost.objects.update(order=F('order') / ORDER_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_blogpost_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blogpost',
+            name='order',
+            field=models.BigIntegerField(default=0, verbose_name='Order'),
+        ),
+        migrations.RunPython(spread_order, compact_order),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_alter_blogpost_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('last_pk', models.BigIntegerField(null=True, verbose_name='Last processed id')),
+                ('processed', models.BigIntegerField(default=0, verbose_name='Processed rows')),
+                ('started_at', models.DateTimeField(null=True, verbose_name='Started at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('finished_at', models.DateTimeField(null=True, verbose_name='Finished at')),
+            ],
+            options={
+                'verbose_name': 'Job Checkpoint',
+                'verbose_name_plural': 'Job Checkpoints',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='blogpost',
+            name='blog_post_inactive_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('deleted', False), ('is_active', False)), fields=['id'], name='blog_post_inactive_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blogpost_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBlogPost',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('author_links', models.JSONField(default=list, verbose_name='Authors 2 links')),
+                ('title', models.CharField(max_length=255, verbose_name='სათაური')),
+                ('text', models.TextField(verbose_name='ტექსტი')),
+                ('is_active', models.BooleanField(default=True, verbose_name='აქტიურია')),
+                ('created_at', models.DateTimeField(null=True, verbose_name='შექმნის თარიღი')),
+                ('updated_at', models.DateTimeField(null=True, verbose_name='განახლების თარიღი')),
+                ('website', models.URLField(null=True, verbose_name='ვებ მისამართი')),
+                ('document', models.FileField(null=True, upload_to='blog_post_documents/')),
+                ('cover_image', models.ImageField(null=True, upload_to='blog_post_covers/', verbose_name='Cover image')),
+                ('category', models.IntegerField(choices=[(1, 'Technology'), (2, 'Lifestyle'), (3, 'Sports'), (4, 'News'), (5, 'Other')], null=True, verbose_name='Category')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Deleted')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Deleted at')),
+                ('order', models.BigIntegerField(default=0, verbose_name='Order')),
+                ('published', models.BooleanField(default=False, verbose_name='Published')),
+                ('archived', models.BooleanField(default=False, verbose_name='Archived')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Moved to archive at')),
+                ('authors', models.ManyToManyField(related_name='archived_blog_posts', to='blog.author', verbose_name='Authors')),
+                ('owner', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_blog_posts', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'Archived Blog Post',
+                'verbose_name_plural': 'Archived Blog Posts',
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBlogPostImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='blog_post_images/', verbose_name='Image')),
+                ('blog_post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='blog.archivedblogpost', verbose_name='Archived Blog Post')),
+            ],
+            options={
+                'verbose_name': 'Archived Blog Post Image',
+                'verbose_name_plural': 'Archived Blog Post Images',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedblogpost',
+            index=models.Index(fields=['order', 'id'], name='archived_post_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedblogpost',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['id'], name='archived_post_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_archivedblogpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedblogpost',
+            name='cover_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Cover variants'),
+        ),
+        migrations.AddField(
+            model_name='archivedblogpostimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Variants'),
+        ),
+        migrations.AddField(
+            model_name='blogpostcover',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Variants'),
+        ),
+        migrations.AddField(
+            model_name='blogpostimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Variants'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:30
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedblogpost',
+            name='cover_image',
+            field=models.ImageField(null=True, storage=blog.storage.get_blob_storage, upload_to='blog_post_covers/', verbose_name='Cover image'),
+        ),
+        migrations.AlterField(
+            model_name='archivedblogpost',
+            name='document',
+            field=models.FileField(null=True, storage=blog.storage.get_blob_storage, upload_to='blog_post_documents/'),
+        ),
+        migrations.AlterField(
+            model_name='archivedblogpostimage',
+            name='image',
+            field=models.ImageField(storage=blog.storage.get_blob_storage, upload_to='blog_post_images/', verbose_name='Image'),
+        ),
+        migrations.AlterField(
+            model_name='blogpost',
+            name='document',
+            field=models.FileField(null=True, storage=blog.storage.get_blob_storage, upload_to='blog_post_documents/'),
+        ),
+        migrations.AlterField(
+            model_name='blogpostcover',
+            name='image',
+            field=models.ImageField(storage=blog.storage.get_blob_storage, upload_to='blog_post_covers/', verbose_name='Image'),
+        ),
+        migrations.AlterField(
+            model_name='blogpostimage',
+            name='image',
+            field=models.ImageField(storage=blog.storage.get_blob_storage, upload_to='blog_post_images/', verbose_name='Image'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Size')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='References')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+            ],
+            options={
+                'verbose_name': 'Media Blob',
+                'verbose_name_plural': 'Media Blobs',
+                'indexes': [models.Index(condition=models.Q(('ref_count__lte', 0)), fields=['updated_at'], name='media_blob_unreferenced_idx')],
+            },
+        ),
+    ]
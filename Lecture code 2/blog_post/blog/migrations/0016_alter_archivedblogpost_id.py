@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_documentuploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedblogpost',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+class EagerLoadingViewSetMixin:
+    """
+    Applies the select_related/prefetch_related declared by the serializer
+    class to the viewset queryset, so nested relations are loaded in a fixed
+    number of queries instead of one query per row.
+
+    Read requests also accept `?fields=` and `?expand=`. They are passed to the
+    serializer and turned into only() columns, and relations of fields that
+    are not rendered are not loaded at all.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            queryset = self.setup_eager_loading(queryset)
+        return queryset
+
+    def get_query_param_list(self, name):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_default_fields(self):
+        return None
+
+    def get_fieldset(self):
+        fields = self.get_query_param_list(self.fields_query_param)
+        default_fields = self.get_default_fields()
+        if fields is None:
+            fields = default_fields
+        elif default_fields is not None:
+            fields = [field for field in fields if field in default_fields]
+        return {'fields': fields, 'expand': self.get_query_param_list(self.expand_query_param)}
+
+    def get_required_fields(self):
+        # Fields the paginator reads from every row to build its links
+        ordering = getattr(self.paginator, 'ordering_fields', None) or getattr(self.paginator, 'ordering', ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return [field.lstrip('-') for field in ordering]
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_output_fields'):
+            for key, value in self.get_fieldset().items():
+                if value is not None:
+                    kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def setup_eager_loading(self, queryset):
+        serializer_class = self.get_serializer_class()
+        field_names = None
+        if hasattr(serializer_class, 'prune_queryset'):
+            queryset, field_names = serializer_class.prune_queryset(
+                queryset, required=self.get_required_fields(), **self.get_fieldset())
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset, field_names)
+        return queryset
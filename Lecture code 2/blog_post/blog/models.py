@@ -1,7 +1,20 @@
 from datetime import date
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 from blog.choices import CATEGORY_CHOICES
+from blog.storage import get_blob_storage
+
+
+class LoadedValuesMixin:
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so post_save can tell which state the row moved out of
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
 
 class Author(models.Model):
@@ -39,7 +52,7 @@ class BlogPostAuthorThroughTable(models.Model):
 
 
 
-class BlogPost(models.Model):
+class BlogPost(LoadedValuesMixin, models.Model):
     owner = models.ForeignKey(
         to='user.CustomUser',
         on_delete=models.CASCADE,
@@ -65,11 +78,12 @@ class BlogPost(models.Model):
     updated_at = models.DateTimeField(
         verbose_name='განახლების თარიღი', auto_now=True, null=True)
     website = models.URLField(verbose_name='ვებ მისამართი', null=True)
-    document = models.FileField(upload_to='blog_post_documents/', null=True)
+    document = models.FileField(upload_to='blog_post_documents/', storage=get_blob_storage, null=True)
 
     category = models.IntegerField(verbose_name='Category', choices=CATEGORY_CHOICES, null=True)
     deleted = models.BooleanField(verbose_name="Deleted", default=False)
-    order = models.IntegerField(verbose_name="Order", default=0)
+    deleted_at = models.DateTimeField(verbose_name="Deleted at", null=True, blank=True)
+    order = models.BigIntegerField(verbose_name="Order", default=0)
 
     published = models.BooleanField(verbose_name="Published", default=False)
     archived = models.BooleanField(verbose_name="Archived", default=False)
@@ -77,24 +91,49 @@ class BlogPost(models.Model):
     def get_images(self):
         return self.images.all()
 
+    def save(self, *args, **kwargs):
+        # deleted_at follows `deleted` however the post is saved (API, admin, shell), so the
+        # retention of a post deleted again after a restore starts over
+        deleted_at = self.deleted_at
+        if not self.deleted:
+            self.deleted_at = None
+        elif self.deleted_at is None:
+            self.deleted_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.deleted_at != deleted_at:
+            kwargs['update_fields'] = {*update_fields, 'deleted_at'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Blog Post"
         verbose_name_plural = "Blog Posts"
         ordering = ['order']
         unique_together = [['title', 'text']]
+        # Shaped after the endpoint querysets, see the explain_blog_post_queries command.
+        # `title` lookups are served by the (title, text) unique index.
+        indexes = [
+            models.Index(fields=['order', 'id'], condition=Q(deleted=False), name='blog_post_live_order_idx'),
+            models.Index(fields=['category', 'order', 'id'], condition=Q(deleted=False), name='blog_post_live_category_idx'),
+            models.Index(fields=['created_at'], condition=Q(deleted=False), name='blog_post_live_created_idx'),
+            models.Index(fields=['order'], condition=Q(archived=True), name='blog_post_archived_order_idx'),
+            models.Index(fields=['id'], condition=Q(is_active=False, deleted=False), name='blog_post_inactive_idx'),
+            models.Index(fields=['id'], condition=Q(deleted=True), name='blog_post_deleted_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class BlogPostCover(models.Model):
+class BlogPostCover(LoadedValuesMixin, models.Model):
     blog_post = models.OneToOneField(
         to="BlogPost",
         verbose_name='Blog Post',
         related_name='cover',
         on_delete=models.CASCADE
     )
-    image = models.ImageField(verbose_name="Image", upload_to='blog_post_covers/')
+    image = models.ImageField(verbose_name="Image", upload_to='blog_post_covers/', storage=get_blob_storage)
+    # Resized copies, see blog.images
+    variants = models.JSONField(verbose_name="Variants", default=dict, blank=True)
 
     class Meta:
         verbose_name = "Blog Post Cover"
@@ -104,14 +143,15 @@ class BlogPostCover(models.Model):
         return f"{self.blog_post.title} - Cover id: {self.id}"
 
 
-class BlogPostImage(models.Model):
+class BlogPostImage(LoadedValuesMixin, models.Model):
     blog_post = models.ForeignKey(
         to="BlogPost",
         related_name='images',
         verbose_name='Blog Post',
         on_delete=models.CASCADE
     )
-    image = models.ImageField(verbose_name="Image", upload_to='blog_post_images/')
+    image = models.ImageField(verbose_name="Image", upload_to='blog_post_images/', storage=get_blob_storage)
+    variants = models.JSONField(verbose_name="Variants", default=dict, blank=True)
 
     class Meta:
         verbose_name = "Blog Post Image"
@@ -119,3 +159,150 @@ class BlogPostImage(models.Model):
 
     def __str__(self):
         return f"{self.blog_post.title} - {self.id}"
+
+
+class BlogPostCounter(models.Model):
+    key = models.CharField(verbose_name='Key', max_length=50, unique=True)
+    value = models.BigIntegerField(verbose_name='Value', default=0)
+
+    class Meta:
+        verbose_name = "Blog Post Counter"
+        verbose_name_plural = "Blog Post Counters"
+
+    def __str__(self):
+        return f"{self.key} - {self.value}"
+
+
+class JobCheckpoint(models.Model):
+    name = models.CharField(verbose_name='Name', max_length=100, unique=True)
+    last_pk = models.BigIntegerField(verbose_name='Last processed id', null=True)
+    processed = models.BigIntegerField(verbose_name='Processed rows', default=0)
+    started_at = models.DateTimeField(verbose_name='Started at', null=True)
+    updated_at = models.DateTimeField(verbose_name='Updated at', auto_now=True)
+    finished_at = models.DateTimeField(verbose_name='Finished at', null=True)
+
+    class Meta:
+        verbose_name = "Job Checkpoint"
+        verbose_name_plural = "Job Checkpoints"
+
+    def __str__(self):
+        return f"{self.name} - {self.processed}"
+
+
+class ArchivedBlogPost(models.Model):
+    # Keeps the id the post had in blog_blogpost (a BigAutoField), so a restore brings it back unchanged
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(
+        to='user.CustomUser',
+        on_delete=models.CASCADE,
+        related_name='archived_blog_posts',
+        verbose_name='Owner',
+        null=True
+    )
+    authors = models.ManyToManyField(
+        to="Author",
+        related_name='archived_blog_posts',
+        verbose_name='Authors'
+    )
+    # (author_id, date) pairs of BlogPost.authors_2
+    author_links = models.JSONField(verbose_name='Authors 2 links', default=list)
+    title = models.CharField(verbose_name='სათაური', max_length=255)
+    text = models.TextField(verbose_name='ტექსტი')
+    is_active = models.BooleanField(verbose_name='აქტიურია', default=True)
+    created_at = models.DateTimeField(verbose_name='შექმნის თარიღი', null=True)
+    updated_at = models.DateTimeField(verbose_name='განახლების თარიღი', null=True)
+    website = models.URLField(verbose_name='ვებ მისამართი', null=True)
+    document = models.FileField(upload_to='blog_post_documents/', storage=get_blob_storage, null=True)
+    cover_image = models.ImageField(
+        verbose_name="Cover image", upload_to='blog_post_covers/', storage=get_blob_storage, null=True)
+    cover_variants = models.JSONField(verbose_name="Cover variants", default=dict, blank=True)
+
+    category = models.IntegerField(verbose_name='Category', choices=CATEGORY_CHOICES, null=True)
+    deleted = models.BooleanField(verbose_name="Deleted", default=False)
+    deleted_at = models.DateTimeField(verbose_name="Deleted at", null=True, blank=True)
+    order = models.BigIntegerField(verbose_name="Order", default=0)
+
+    published = models.BooleanField(verbose_name="Published", default=False)
+    archived = models.BooleanField(verbose_name="Archived", default=False)
+    archived_at = models.DateTimeField(verbose_name="Moved to archive at", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Archived Blog Post"
+        verbose_name_plural = "Archived Blog Posts"
+        ordering = ['order']
+        indexes = [
+            models.Index(fields=['order', 'id'], name='archived_post_order_idx'),
+            models.Index(fields=['id'], condition=Q(deleted=True), name='archived_post_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedBlogPostImage(models.Model):
+    blog_post = models.ForeignKey(
+        to="ArchivedBlogPost",
+        related_name='images',
+        verbose_name='Archived Blog Post',
+        on_delete=models.CASCADE
+    )
+    image = models.ImageField(verbose_name="Image", upload_to='blog_post_images/', storage=get_blob_storage)
+    variants = models.JSONField(verbose_name="Variants", default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "Archived Blog Post Image"
+        verbose_name_plural = "Archived Blog Post Images"
+
+    def __str__(self):
+        return f"{self.blog_post.title} - {self.id}"
+
+
+class MediaBlob(models.Model):
+    # A file of blog.storage.ContentAddressedStorage, see blog.blobs
+    name = models.CharField(verbose_name='Name', max_length=255, unique=True)
+    sha256 = models.CharField(verbose_name='SHA-256', max_length=64)
+    size = models.BigIntegerField(verbose_name='Size', default=0)
+    ref_count = models.IntegerField(verbose_name='References', default=0)
+    created_at = models.DateTimeField(verbose_name='Created at', auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='Updated at', auto_now=True)
+
+    class Meta:
+        verbose_name = "Media Blob"
+        verbose_name_plural = "Media Blobs"
+        indexes = [
+            models.Index(fields=['updated_at'], condition=Q(ref_count__lte=0), name='media_blob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.ref_count}"
+
+
+class DocumentUploadSession(models.Model):
+    # A BlogPost.document uploaded in chunks, see blog.upload_sessions
+    blog_post = models.ForeignKey(
+        to="BlogPost",
+        related_name='document_uploads',
+        verbose_name='Blog Post',
+        on_delete=models.CASCADE
+    )
+    owner = models.ForeignKey(
+        to='user.CustomUser',
+        on_delete=models.CASCADE,
+        related_name='document_uploads',
+        verbose_name='Owner',
+        null=True
+    )
+    filename = models.CharField(verbose_name='File name', max_length=255)
+    size = models.BigIntegerField(verbose_name='Size')
+    # Sorted, merged [start, end) byte ranges written so far
+    received = models.JSONField(verbose_name='Received ranges', default=list)
+    created_at = models.DateTimeField(verbose_name='Created at', auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='Updated at', auto_now=True)
+    expires_at = models.DateTimeField(verbose_name='Expires at', db_index=True)
+
+    class Meta:
+        verbose_name = "Document Upload Session"
+        verbose_name_plural = "Document Upload Sessions"
+
+    def __str__(self):
+        return f"{self.filename} - {self.id}"
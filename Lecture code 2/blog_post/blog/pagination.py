@@ -1,4 +1,19 @@
-from rest_framework.pagination import PageNumberPagination, LimitOffsetPagination, CursorPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    PageNumberPagination,
+    LimitOffsetPagination,
+    CursorPagination,
+    BasePagination,
+    _positive_int
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class BlogPostPagination(PageNumberPagination):
@@ -16,3 +31,153 @@ class BlogPostCursorPagination(CursorPagination):
     page_size = 2
     # ordering = '-created_at'
     ordering = '-id'
+
+
+class BlogPostKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (ordering field, id).
+
+    Every page is a single indexed range scan no matter how deep it is, the
+    cursor is an opaque token holding the last seen key, and the total count
+    is only computed when the client asks for it with ?count=true.
+    """
+    # The global default BlogPostViewSet paginated with before
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering_query_param = 'ordering'
+    # Non-nullable fields the keyset can be built on, `id` is always the tie-breaker
+    ordering_fields = ('order', 'id', 'title')
+    default_ordering = 'order'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+
+        self.count = self.get_count(queryset, view) if self.is_count_requested(request) else None
+
+        reverse = bool(cursor and cursor['r'])
+        descending = self.descending != reverse
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(cursor['v'], cursor['i'], descending))
+        direction = '-' if descending else ''
+        if self.field == 'id':
+            queryset = queryset.order_by(f'{direction}id')
+        else:
+            queryset = queryset.order_by(f'{direction}{self.field}', f'{direction}id')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param, '').split(',')[0].strip()
+        field = ordering.lstrip('-')
+        if field in self.ordering_fields:
+            return field, ordering.startswith('-')
+        # Keyword searches are ranked by relevance unless the client orders them
+        if 'search_rank' in queryset.query.annotations:
+            return 'search_rank', True
+        return self.default_ordering, False
+
+    def is_count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_count(self, queryset, view):
+        if hasattr(view, 'get_count'):
+            return view.get_count(queryset)
+        return queryset.count()
+
+    def get_keyset_filter(self, value, pk, descending):
+        lookup = 'lt' if descending else 'gt'
+        if self.field == 'id':
+            return Q(**{f'id__{lookup}': pk})
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'id__{lookup}': pk})
+
+    def get_item_value(self, item, field):
+        if isinstance(item, dict):
+            return item[field]
+        return getattr(item, field)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['f'] != self.field or cursor['d'] != self.descending:
+                raise ValueError
+            if not isinstance(cursor['v'], (int, float, str)):
+                raise ValueError
+            return {'v': cursor['v'], 'i': int(cursor['i']), 'r': bool(cursor['r'])}
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse):
+        cursor = {
+            'f': self.field,
+            'd': self.descending,
+            'v': self.get_item_value(item, self.field),
+            'i': self.get_item_value(item, 'id'),
+            'r': reverse,
+        }
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -17,6 +17,7 @@ class ReadOnlyOrIsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in ('GET', 'HEAD', 'OPTIONS'):
             return True
-        elif (request.user and (request.user == obj.owner)) or request.user.is_staff:
+        # owner_id avoids loading the owner just to compare it
+        elif (request.user and request.user.pk == obj.owner_id) or request.user.is_staff:
             return True
         return False
@@ -0,0 +1,184 @@
+"""
+Ordering of BlogPost.order.
+
+Order keys are gapped: a full reorder numbers rows ORDER_GAP apart, so moving
+one post only writes that post, with a key halfway between its new
+neighbours. Only when two neighbours have no key left between them are all
+rows renumbered, keeping their current order.
+
+A full reorder ranks rows with a ROW_NUMBER() window and writes them with one
+UPDATE ... FROM statement, only touching rows whose order actually changes.
+Backends without UPDATE ... FROM fall back to reading (id, order) pairs and
+writing the changed ones with chunked bulk_update(). Both run in a single
+transaction.
+"""
+from django.db import connections, transaction
+from django.db.models import F, Max, Q
+from django.db.models.functions import RowNumber
+from django.db.models.expressions import Window
+
+from blog.cache import invalidate_blog_post, invalidate_blog_posts
+from blog.choices import REORDER_SORT_FIELD_CHOICES, SORT_DIRECTION_CHOICES
+from blog.models import BlogPost
+
+SORT_FIELDS = [field for field, label in REORDER_SORT_FIELD_CHOICES]
+SORT_DIRECTIONS = [direction for direction, label in SORT_DIRECTION_CHOICES]
+BATCH_SIZE = 5000
+ORDER_GAP = 1024
+# A move leaving less room than this next to the post asks for a background rebalance
+MIN_GAP = 16
+
+
+def get_next_order():
+    """Order key for a new post, ORDER_GAP after every stored one."""
+    return (BlogPost.objects.aggregate(last_order=Max('order'))['last_order'] or 0) + ORDER_GAP
+
+
+def get_ordering(sort_field, asc_des):
+    if sort_field not in SORT_FIELDS:
+        raise ValueError(f"Can't reorder by {sort_field!r}, choose one of: {', '.join(SORT_FIELDS)}")
+    if asc_des not in SORT_DIRECTIONS:
+        raise ValueError(f"Unknown direction {asc_des!r}, choose one of: {', '.join(SORT_DIRECTIONS)}")
+    descending = asc_des == 'des'
+    ordering = [F(sort_field).desc() if descending else F(sort_field).asc()]
+    if sort_field != 'id':
+        # Ties keep a stable order, so running the same reorder twice changes nothing
+        ordering.append(F('id').desc() if descending else F('id').asc())
+    return ordering
+
+
+def get_ranked_queryset(ordering, using):
+    return BlogPost.objects.using(using).order_by().annotate(
+        rank=Window(RowNumber(), order_by=ordering)
+    ).values('id', 'rank')
+
+
+def supports_update_from(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 33)
+
+
+def reorder_with_update_from(ordering, connection):
+    ranked_sql, params = get_ranked_queryset(ordering, connection.alias).query.get_compiler(
+        connection=connection).as_sql()
+    table = connection.ops.quote_name(BlogPost._meta.db_table)
+    order = connection.ops.quote_name('order')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {order} = ranked.rank * %s "
+            f"FROM ({ranked_sql}) AS ranked "
+            f"WHERE {table}.id = ranked.id AND {table}.{order} <> ranked.rank * %s",
+            (ORDER_GAP, *params, ORDER_GAP)
+        )
+        return cursor.rowcount
+
+
+def reorder_with_bulk_update(ordering, batch_size, using):
+    manager = BlogPost.objects.db_manager(using)
+    # Only (id, order) pairs are read, and all of them before the first write,
+    # so the updates never run under an open cursor over the same rows
+    rows = list(manager.order_by(*ordering).values_list('id', 'order'))
+    changed = [
+        BlogPost(id=pk, order=rank * ORDER_GAP)
+        for rank, (pk, order) in enumerate(rows, start=1)
+        if order != rank * ORDER_GAP
+    ]
+    updated = 0
+    for start in range(0, len(changed), batch_size):
+        updated += manager.bulk_update(changed[start:start + batch_size], ['order'])
+    return updated
+
+
+def renumber_blog_posts(ordering, batch_size=BATCH_SIZE, using='default', set_based=None):
+    connection = connections[using]
+    if set_based is None:
+        set_based = supports_update_from(connection)
+
+    with transaction.atomic(using=using):
+        if set_based:
+            updated = reorder_with_update_from(ordering, connection)
+        else:
+            updated = reorder_with_bulk_update(ordering, batch_size, using)
+    if updated:
+        invalidate_blog_posts()
+    return updated
+
+
+def reorder_blog_posts(sort_field, asc_des, batch_size=BATCH_SIZE, using='default', set_based=None):
+    """
+    Numbers every blog post ORDER_GAP apart in the requested order and returns
+    the number of rows whose order changed. `set_based` forces or disables the
+    UPDATE ... FROM path, by default it is used when the backend supports it.
+    """
+    return renumber_blog_posts(get_ordering(sort_field, asc_des), batch_size, using, set_based)
+
+
+def rebalance_blog_posts(batch_size=BATCH_SIZE, using='default'):
+    """Spreads the order keys ORDER_GAP apart again without changing the order."""
+    return renumber_blog_posts([F('order').asc(), F('id').asc()], batch_size, using)
+
+
+def get_key_between(lower, upper):
+    if lower is None and upper is None:
+        return 0
+    if lower is None:
+        return upper - ORDER_GAP
+    if upper is None:
+        return lower + ORDER_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+
+def get_neighbour_bounds(queryset, before=None, after=None, position=None):
+    """Order keys of the rows the moved post has to end up between, None at either end."""
+    rows = queryset.order_by('order', 'id').values_list('order', flat=True)
+    if position is not None:
+        if position == 1:
+            return None, rows.first()
+        window = list(rows[position - 2:position])
+        if not window:
+            return rows.last(), None
+        return window[0], window[1] if len(window) > 1 else None
+
+    anchor = before if before is not None else after
+    anchor_order = queryset.filter(pk=anchor.pk).values_list('order', flat=True).get()
+    if before is not None:
+        lower = queryset.filter(
+            Q(order__lt=anchor_order) | Q(order=anchor_order, id__lt=anchor.pk)
+        ).order_by('-order', '-id').values_list('order', flat=True).first()
+        return lower, anchor_order
+    upper = queryset.filter(
+        Q(order__gt=anchor_order) | Q(order=anchor_order, id__gt=anchor.pk)
+    ).order_by('order', 'id').values_list('order', flat=True).first()
+    return anchor_order, upper
+
+
+def move_blog_post(blog_post, queryset=None, before=None, after=None, position=None):
+    """
+    Moves blog_post right before or after another post, or to a 1-based
+    position, among the posts of queryset (live posts by default). Only
+    blog_post is written unless its new neighbours have no key left between
+    them, then every row is renumbered first.
+
+    Returns (order, low_on_gaps), low_on_gaps tells the caller to schedule a
+    background rebalance before the next move here has to renumber in-line.
+    """
+    if queryset is None:
+        queryset = BlogPost.objects.filter(deleted=False)
+    others = queryset.exclude(pk=blog_post.pk)
+
+    with transaction.atomic():
+        lower, upper = get_neighbour_bounds(others, before, after, position)
+        order = get_key_between(lower, upper)
+        if order is None:
+            rebalance_blog_posts()
+            lower, upper = get_neighbour_bounds(others, before, after, position)
+            order = get_key_between(lower, upper)
+        BlogPost.objects.filter(pk=blog_post.pk).update(order=order)
+    blog_post.order = order
+    invalidate_blog_post(blog_post.pk)
+
+    gaps = [order - lower if lower is not None else None, upper - order if upper is not None else None]
+    return order, any(gap is not None and gap < MIN_GAP for gap in gaps)
@@ -0,0 +1,146 @@
+"""
+Full-text search over BlogPost title and text.
+
+SQLite keeps an external-content FTS5 table in sync with blog_blogpost through
+triggers, so saves, queryset.update() and raw SQL writes are all indexed.
+PostgreSQL uses a GIN index over the same tsvector expression the queries
+filter on. Other backends fall back to icontains.
+"""
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'blog_blogpost_fts'
+SEARCH_INDEX = 'blog_post_search_idx'
+SEARCH_CONFIG = 'simple'
+
+SQLITE_CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, text, content='blog_blogpost', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON blog_blogpost BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON blog_blogpost BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF title, text ON blog_blogpost BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO {SEARCH_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+]
+
+
+def get_search_vector():
+    return SearchVector('title', 'text', config=SEARCH_CONFIG)
+
+
+def get_search_index():
+    return GinIndex(get_search_vector(), name=SEARCH_INDEX)
+
+
+def sqlite_index_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+    return cursor.fetchone() is not None
+
+
+def ensure_sqlite_index(connection, rebuild=False):
+    """
+    Creates the FTS5 table and its triggers when missing. Re-run after every
+    migrate because SQLite drops the triggers whenever a migration remakes
+    blog_blogpost.
+    """
+    with connection.cursor() as cursor:
+        rebuild = rebuild or not sqlite_index_exists(cursor)
+        for sql in SQLITE_CREATE_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        ensure_sqlite_index(schema_editor.connection, rebuild=True)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('blog', 'BlogPost'), get_search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_DROP_SQL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('blog', 'BlogPost'), get_search_index())
+
+
+def rebuild_search_index(using='default'):
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        ensure_sqlite_index(connection, rebuild=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {connection.ops.quote_name(SEARCH_INDEX)}")
+
+
+def get_sqlite_match_query(value):
+    # Every word has to match, as a prefix, so partial words still find posts
+    terms = re.findall(r'\w+', value)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_blog_posts(queryset, value):
+    """
+    Filters the queryset to posts matching `value` and annotates it with
+    `search_rank`, where a higher rank is a better match.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match_query = get_sqlite_match_query(value)
+        if not match_query:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        # Joined rather than ranked in a correlated subquery, which would run
+        # the MATCH again for every matching row
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.rowid = {table}.id", f"{SEARCH_TABLE} MATCH %s"],
+            params=[match_query],
+        ).annotate(
+            search_rank=RawSQL(f"-bm25({SEARCH_TABLE})", ())
+        )
+    if vendor == 'postgresql':
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_vector=get_search_vector(),
+        ).filter(
+            search_vector=query
+        ).annotate(
+            search_rank=SearchRank(get_search_vector(), query)
+        )
+    return queryset.filter(Q(title__icontains=value) | Q(text__icontains=value))
@@ -1,18 +1,110 @@
+import posixpath
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import serializers
-from blog.models import BlogPost, BlogPostCover, Author
+
+from blog import blobs, counters, images, upload_sessions
+from blog.cache import invalidate_blog_post
+from blog.choices import EXPORT_FORMAT_CHOICES, REORDER_SORT_FIELD_CHOICES, SORT_DIRECTION_CHOICES
+from blog.models import ArchivedBlogPost, BlogPost, BlogPostCover, BlogPostImage, Author, DocumentUploadSession
+from blog.reorder import get_next_order
+from blog.tasks import generate_image_variants
+from blog.uploads import validate_image_header
+
+
+def get_lookup_root(lookup):
+    if isinstance(lookup, Prefetch):
+        lookup = lookup.prefetch_to
+    return lookup.split('__')[0]
+
+
+class EagerLoadingMixin:
+    # Relations the serializer reads, applied to the queryset by the viewsets
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, field_names=None):
+        # With field_names only the relations of fields that are rendered are loaded
+        select_related = [
+            lookup for lookup in cls.select_related_fields
+            if field_names is None or get_lookup_root(lookup) in field_names
+        ]
+        prefetch_related = [
+            lookup for lookup in cls.prefetch_related_fields
+            if field_names is None or get_lookup_root(lookup) in field_names
+        ]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
 
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    `fields` limits the rendered fields and `expand` adds the optional fields
+    listed in Meta.expandable_fields. prune_queryset() turns the resulting
+    field set into only() columns so unused columns are never read.
+
+    Meta.field_sources maps fields that are not model columns (method fields,
+    properties) to the columns they read.
+    """
+
     def __init__(self, *args, **kwargs):
         fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
         super().__init__(*args, **kwargs)
 
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        for field_name in expandable - set(expand or ()):
+            self.fields.pop(field_name, None)
+
         if fields is not None:
             allowed = set(fields)
             existing = set(self.fields)
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+    @classmethod
+    def get_output_fields(cls, fields=None, expand=None):
+        return list(cls(fields=fields, expand=expand).fields)
+
+    @classmethod
+    def get_only_columns(cls, field_names):
+        """Model fields needed to render field_names, None when it can't be told."""
+        model_fields = {field.name: field for field in cls.Meta.model._meta.get_fields()}
+        field_sources = getattr(cls.Meta, 'field_sources', {})
+        serializer_fields = cls(fields=field_names, expand=field_names).fields
+        columns = set()
+        for field_name, field in serializer_fields.items():
+            if field_name in field_sources:
+                columns.update(field_sources[field_name])
+                continue
+            source = field.source.split('.')[0]
+            model_field = model_fields.get(source)
+            if model_field is None:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(source)
+            elif model_field.one_to_one:
+                # Reverse one-to-one relations are joined with select_related
+                columns.add(source)
+        return columns
+
+    @classmethod
+    def prune_queryset(cls, queryset, fields=None, expand=None, required=()):
+        field_names = cls.get_output_fields(fields, expand)
+        columns = cls.get_only_columns(field_names)
+        if columns is not None:
+            queryset = queryset.only('pk', *columns, *required)
+        return queryset, field_names
+
 
 class AuthorSerializer(DynamicFieldsModelSerializer):
     full_name = serializers.SerializerMethodField()
@@ -24,26 +116,184 @@ class AuthorSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'full_name', 'first_name', 'last_name', 'email', 'birth_date', 'age']
+        field_sources = {
+            'full_name': ('first_name', 'last_name'),
+            'age': ('birth_date',),
+        }
+
+
+def get_file_url(name, request=None):
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def get_variant_urls(variants, request=None):
+    """A `variants` value (see blog.images) with URLs in place of the storage names."""
+    return {
+        variant: {key: value if key in ('width', 'height') else get_file_url(value, request) for key, value in files.items()}
+        for variant, files in (variants or {}).items()
+    }
+
+
+class VariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        return get_variant_urls(value, self.context.get('request'))
+
+
+class BlogPostCoverSerializer(serializers.ModelSerializer):
+    variants = VariantsField()
+
+    class Meta:
+        model = BlogPostCover
+        fields = ['image', 'variants']
+
+
+class BlogPostCoverUploadSerializer(serializers.Serializer):
+    # Checked from the header, ImageField would read the whole file into Pillow
+    image = serializers.FileField(label='Image', validators=[validate_image_header])
 
 
-class BlogPostListSerializer(serializers.ModelSerializer):
+class BlogPostImageSerializer(serializers.ModelSerializer):
+    variants = VariantsField()
+
+    class Meta:
+        model = BlogPostImage
+        fields = ['id', 'image', 'variants']
+
+
+class BlogPostListSerializer(EagerLoadingMixin, DynamicFieldsModelSerializer):
+    select_related_fields = ('cover',)
+    prefetch_related_fields = (
+        Prefetch('authors', queryset=Author.objects.order_by('id').only('id', 'first_name', 'last_name')),
+    )
     authors = AuthorSerializer(many=True, read_only=True, fields=('id', 'first_name', 'last_name'))
+    cover = BlogPostCoverSerializer(read_only=True)
 
     class Meta:
         model = BlogPost
-        fields = ['id', 'title', 'created_at', 'category', 'authors']
+        fields = ['id', 'title', 'created_at', 'category', 'authors', 'cover']
+        expandable_fields = ['cover']
+
+
+class ArchivedBlogPostSerializer(EagerLoadingMixin, DynamicFieldsModelSerializer):
+    """Renders archive rows like BlogPostListSerializer renders live posts."""
+    prefetch_related_fields = (
+        Prefetch('authors', queryset=Author.objects.order_by('id').only('id', 'first_name', 'last_name')),
+    )
+    authors = AuthorSerializer(many=True, read_only=True, fields=('id', 'first_name', 'last_name'))
+    cover = serializers.SerializerMethodField()
+
+    def get_cover(self, obj):
+        if not obj.cover_image:
+            return None
+        request = self.context.get('request')
+        return {
+            'image': get_file_url(obj.cover_image.name, request),
+            'variants': get_variant_urls(obj.cover_variants, request),
+        }
+
+    class Meta:
+        model = ArchivedBlogPost
+        fields = ['id', 'title', 'created_at', 'category', 'authors', 'cover']
+        expandable_fields = ['cover']
+        field_sources = {'cover': ('cover_image', 'cover_variants')}
+
+
+class BlogPostValuesListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rows = list(data)
+        if 'authors' not in self.child.field_names:
+            return [self.child.to_representation(row) for row in rows]
+        authors = self.child.get_authors([row['id'] for row in rows])
+        for row in rows:
+            row['authors'] = authors.get(row['id'], [])
+        return [self.child.to_representation(row) for row in rows]
+
+
+class BlogPostListValuesSerializer(serializers.BaseSerializer):
+    """
+    Read-only fast path for BlogPostListSerializer. Works on rows from
+    `.values()` instead of model instances, loads the authors of a whole page
+    with one query and returns the same JSON as BlogPostListSerializer,
+    including its `fields`/`expand` handling.
+    """
+    values_fields = ('id', 'title', 'created_at', 'category')
+    author_fields = ('id', 'first_name', 'last_name')
+    created_at_field = serializers.DateTimeField()
+
+    class Meta:
+        list_serializer_class = BlogPostValuesListSerializer
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field_names = self.get_output_fields(fields, expand)
+
+    @classmethod
+    def get_output_fields(cls, fields=None, expand=None):
+        return BlogPostListSerializer.get_output_fields(fields, expand)
+
+    @classmethod
+    def get_values_queryset(cls, queryset, fields=None, expand=None):
+        field_names = cls.get_output_fields(fields, expand)
+        columns = [field for field in cls.values_fields if field in field_names]
+        if 'cover' in field_names:
+            columns.extend(['cover__image', 'cover__variants'])
+        # The ordering field and annotations (search_rank) are kept for the keyset paginator
+        return queryset.values('id', *columns, 'order', 'title', *queryset.query.annotations)
+
+    @classmethod
+    def get_authors(cls, blog_post_ids):
+        through = BlogPost.authors.through
+        rows = through.objects.filter(blogpost_id__in=blog_post_ids).order_by('author_id').values_list(
+            'blogpost_id', *(f'author__{field}' for field in cls.author_fields))
+        authors = {}
+        for blog_post_id, *values in rows:
+            authors.setdefault(blog_post_id, []).append(dict(zip(cls.author_fields, values)))
+        return authors
 
+    def get_cover(self, row):
+        name = row['cover__image']
+        if name is None:
+            return None
+        request = self.context.get('request')
+        return {
+            'image': get_file_url(name, request) if name else None,
+            'variants': get_variant_urls(row['cover__variants'], request),
+        }
 
-class BlogPostDetailSerializer(serializers.ModelSerializer):
+    def to_representation(self, row):
+        if 'authors' in self.field_names and 'authors' not in row:
+            row['authors'] = self.get_authors([row['id']]).get(row['id'], [])
+        data = {}
+        for field_name in self.field_names:
+            if field_name == 'created_at':
+                created_at = row['created_at']
+                data[field_name] = None if created_at is None else self.created_at_field.to_representation(created_at)
+            elif field_name == 'cover':
+                data[field_name] = self.get_cover(row)
+            else:
+                data[field_name] = row[field_name]
+        return data
+
+
+class BlogPostDetailSerializer(EagerLoadingMixin, DynamicFieldsModelSerializer):
+    select_related_fields = ('cover',)
+    prefetch_related_fields = (
+        Prefetch('authors', queryset=Author.objects.order_by('id')),
+        Prefetch('images', queryset=BlogPostImage.objects.order_by('id')),
+    )
     authors = AuthorSerializer(many=True, read_only=True)
+    cover = BlogPostCoverSerializer(read_only=True)
+    images = BlogPostImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = BlogPost
-        fields = ['id', 'title', 'text', 'created_at', 'category', 'website', 'document', 'authors']
+        fields = ['id', 'title', 'text', 'created_at', 'category', 'website', 'document', 'authors', 'cover', 'images']
+        expandable_fields = ['cover', 'images']
 
 
 class BlogPostCreateUpdateSerializer(serializers.ModelSerializer):
-    cover = serializers.ImageField(required=False)
+    cover = serializers.FileField(required=False, write_only=True, validators=[validate_image_header])
 
     class Meta:
         model = BlogPost
@@ -52,34 +302,165 @@ class BlogPostCreateUpdateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         cover = validated_data.pop('cover', None)
         validated_data['owner'] = self.context['request'].user
+        # Gapped like every other key, so moves next to the new post have room
+        validated_data['order'] = get_next_order()
         blog_post = BlogPost.objects.create(**validated_data)
         if cover:
             BlogPostCover.objects.create(blog_post=blog_post, image=cover)
         return blog_post
 
     def update(self, instance, validated_data):
+        """
+        One UPDATE for the post and, only when a cover was sent, one upsert
+        for the cover. The instance is refreshed from the written values
+        instead of being read back. Blob references are counted here, neither
+        write sends signals.
+        """
         cover = validated_data.pop('cover', None)
-        BlogPost.objects.filter(id=instance.id).update(**validated_data)
-        blog_post_cover = BlogPostCover.objects.filter(blog_post=instance)
-        if blog_post_cover.exists():
-            cover_instance = blog_post_cover.first()
-            cover_instance.image = cover
-            cover_instance.save()
-        else:
-            BlogPostCover.objects.create(blog_post=instance, image=cover)
+        # update() skips auto_now, the detail ETag is derived from updated_at
+        validated_data['updated_at'] = timezone.now()
+        if validated_data.get('document'):
+            validated_data['document'] = self.save_file(instance, 'document', validated_data['document'])
+
+        old_state = counters.get_state(instance)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        with transaction.atomic():
+            BlogPost.objects.filter(pk=instance.pk).update(**validated_data)
+            counters.apply_deltas(counters.get_deltas(old_state, counters.get_state(instance)))
+            blobs.record_saved(instance, 'document', created=False)
+            if cover is not None:
+                # The upsert can't return the cover it replaces, the views load it with the post
+                old_image, old_variants = self.get_loaded_cover(instance)
+                # bulk_create() stores the upload through the field, like save() would. The
+                # variants of the old image are reset, the new ones are generated after commit.
+                blog_post_cover = BlogPostCover(blog_post=instance, image=cover)
+                BlogPostCover.objects.bulk_create(
+                    [blog_post_cover], update_conflicts=True, unique_fields=['blog_post'],
+                    update_fields=['image', 'variants'])
+                instance.cover = blog_post_cover
+                blobs.retain([blog_post_cover.image.name])
+                blobs.release([old_image])
+                old_variant_names = images.get_variant_names(old_variants)
+                if old_variant_names:
+                    transaction.on_commit(partial(images.delete_variant_files, old_variant_names))
+                # bulk_create() sends no post_save
+                transaction.on_commit(partial(
+                    generate_image_variants.delay, BlogPostCover._meta.label, blog_post_cover.pk))
+        counters.remember_state(instance)
+        invalidate_blog_post(instance.pk)
         return instance
 
+    @staticmethod
+    def get_loaded_cover(instance):
+        """(image, variants) of the current cover, read only when it wasn't loaded with the post."""
+        if BlogPost.cover.is_cached(instance):
+            cover = getattr(instance, 'cover', None)
+            return (cover.image.name, cover.variants) if cover is not None else (None, {})
+        row = BlogPostCover.objects.filter(blog_post=instance).values_list('image', 'variants').first()
+        return row or (None, {})
+
+    @staticmethod
+    def save_file(instance, field_name, file):
+        # queryset.update() doesn't run FileField.pre_save(), store the upload the way it would
+        field = instance._meta.get_field(field_name)
+        name = field.generate_filename(instance, file.name)
+        return field.storage.save(name, file, max_length=field.max_length)
+
+
+class BlogPostBulkSerializer(serializers.ModelSerializer):
+    # Author ids, checked and linked once per batch in blog.bulk
+    authors = serializers.ListField(label='Authors', child=serializers.IntegerField(), required=False, write_only=True)
+
+    class Meta:
+        model = BlogPost
+        fields = ['id', 'title', 'text', 'category', 'website', 'authors']
+        # (title, text) uniqueness is checked once per batch in blog.bulk
+        validators = []
+
+
+class BlogPostImportSerializer(serializers.ModelSerializer):
+    # Emails, import_blog_posts resolves them to authors in one lookup
+    authors = serializers.ListField(label='Authors', child=serializers.EmailField(), required=False, default=list)
+
+    class Meta:
+        model = BlogPost
+        fields = ['title', 'text', 'category', 'website', 'is_active', 'published', 'archived', 'order', 'authors']
+        # (title, text) conflicts are skipped by the insert itself
+        validators = []
+
+
+class BlogPostBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(label='Ids', child=serializers.IntegerField(), allow_empty=False, required=True)
+
 
 class BlogPostReorderSerializer(serializers.Serializer):
-    sort_field = serializers.CharField(label='Sort field', required=True)
-    asc_des = serializers.CharField(label='Asc_Des', required=True)
+    sort_field = serializers.ChoiceField(label='Sort field', choices=REORDER_SORT_FIELD_CHOICES, required=True)
+    asc_des = serializers.ChoiceField(label='Asc_Des', choices=SORT_DIRECTION_CHOICES, required=True)
+
+
+class BlogPostMoveSerializer(serializers.Serializer):
+    before = serializers.PrimaryKeyRelatedField(
+        label='Before', queryset=BlogPost.objects.filter(deleted=False), required=False)
+    after = serializers.PrimaryKeyRelatedField(
+        label='After', queryset=BlogPost.objects.filter(deleted=False), required=False)
+    position = serializers.IntegerField(label='Position', min_value=1, required=False)
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError('Provide exactly one of before, after or position.')
+        anchor = attrs.get('before') or attrs.get('after')
+        if anchor is not None and anchor.pk == self.context['blog_post'].pk:
+            raise serializers.ValidationError("A blog post can't be moved next to itself.")
+        return attrs
+
+
+class BlogPostRestoreSerializer(serializers.Serializer):
+    ids = serializers.ListField(label='Ids', child=serializers.IntegerField(), allow_empty=False, required=True)
+
+
+class BlogPostExportSerializer(serializers.Serializer):
+    # Not `format`, DRF reads that one for renderer negotiation
+    export_format = serializers.ChoiceField(label='Export format', choices=EXPORT_FORMAT_CHOICES, default='ndjson')
+
+
+class BlogPostImageVariantSerializer(serializers.Serializer):
+    variant = serializers.CharField(label='Variant', required=False)
+    # Not `format`, DRF reads that one for renderer negotiation
+    variant_format = serializers.ChoiceField(label='Variant format', choices=sorted(images.FORMATS), default='webp')
 
 
 class BlogPostSendEmailSerializer(serializers.Serializer):
     email = serializers.EmailField(label='Email address', required=True)
 
 
-class BlogPostCoverSerializer(serializers.ModelSerializer):
+class DocumentUploadSessionSerializer(serializers.ModelSerializer):
+    missing = serializers.SerializerMethodField()
+
     class Meta:
-        model = BlogPostCover
-        fields = ['image']
+        model = DocumentUploadSession
+        fields = ['id', 'filename', 'size', 'received', 'missing', 'expires_at']
+        read_only_fields = ['received', 'expires_at']
+
+    def get_missing(self, obj):
+        return upload_sessions.get_missing(obj.received, obj.size)
+
+    def validate_filename(self, value):
+        # Only the name, the directory comes from the document field
+        filename = posixpath.basename(value.replace('\\', '/'))
+        if filename in ('', '.', '..'):
+            raise serializers.ValidationError('Expected a file name.')
+        return filename
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.BLOG_DOCUMENT_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Expected between 1 and {settings.BLOG_DOCUMENT_UPLOAD_MAX_SIZE} bytes.')
+        return value
+
+
+class DocumentUploadFinalizeSerializer(serializers.Serializer):
+    sha256 = serializers.RegexField(
+        label='SHA-256', regex=r'^[0-9a-fA-F]{64}$', required=False,
+        help_text='Hex digest the assembled file is checked against'
+    )
@@ -0,0 +1,98 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from blog import blobs, cache, counters, search, upload_sessions
+from blog.models import Author, BlogPost, BlogPostCover, BlogPostImage, DocumentUploadSession
+from blog.tasks import generate_image_variants
+
+
+@receiver(post_save, sender=BlogPost)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counters.record_saved(instance, created)
+
+
+@receiver(post_delete, sender=BlogPost)
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.record_deleted(instance)
+
+
+# The file field every sender points at its blob with
+BLOB_FIELDS = {BlogPost: 'document', BlogPostCover: 'image', BlogPostImage: 'image'}
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=BlogPostCover)
+@receiver(post_save, sender=BlogPostImage)
+def update_blob_references_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    blobs.record_saved(instance, BLOB_FIELDS[sender], created)
+
+
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=BlogPostCover)
+@receiver(post_delete, sender=BlogPostImage)
+def update_blob_references_on_delete(sender, instance, **kwargs):
+    blobs.record_deleted(instance, BLOB_FIELDS[sender])
+
+
+@receiver(post_delete, sender=DocumentUploadSession)
+def delete_document_upload_file(sender, instance, **kwargs):
+    # Finalized, expired, aborted or deleted with its post. Once committed, a rollback keeps the session usable.
+    path = upload_sessions.get_path(instance)
+    transaction.on_commit(partial(upload_sessions.delete_partial_files, [path]))
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_blog_post_cache(sender, instance, **kwargs):
+    cache.invalidate_blog_post(instance.pk)
+
+
+@receiver(post_save, sender=BlogPostCover)
+@receiver(post_delete, sender=BlogPostCover)
+@receiver(post_save, sender=BlogPostImage)
+@receiver(post_delete, sender=BlogPostImage)
+def invalidate_blog_post_media_cache(sender, instance, **kwargs):
+    cache.invalidate_blog_post(instance.blog_post_id)
+
+
+@receiver(post_save, sender=BlogPostCover)
+@receiver(post_save, sender=BlogPostImage)
+def schedule_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.image or (update_fields is not None and 'image' not in update_fields):
+        return
+    # After the commit, the worker has to see the row and the stored file
+    transaction.on_commit(partial(generate_image_variants.delay, sender._meta.label, instance.pk))
+
+
+@receiver(m2m_changed, sender=BlogPost.authors.through)
+def invalidate_blog_post_authors_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        cache.invalidate_blog_post(instance.pk)
+    elif pk_set:
+        cache.invalidate_blog_posts(pk_set)
+    else:
+        cache.invalidate_blog_posts()
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_cache(sender, instance, **kwargs):
+    cache.invalidate_authors()
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    # Restores the triggers when a migration remade blog_blogpost
+    if search.SEARCH_TABLE in connection.introspection.table_names():
+        search.ensure_sqlite_index(connection)
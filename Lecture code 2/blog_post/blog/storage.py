@@ -0,0 +1,74 @@
+"""
+Content-addressed storage for covers, gallery images and documents.
+
+Every file is stored once, under the SHA-256 of its content:
+
+    blobs/3a/7b/3a7bd3e2360a3d29eea436fcfb7e44c735d117c42d1c1835420b6b9942dd4f1b.jpg
+
+An upload whose content is already stored costs no write, only the
+MediaBlob row is touched. The name never collides with another file, so
+there are no existence checks or renames either. Uploads hashed by the
+blog.uploads handlers aren't read again.
+
+The resized variants of an image blob (blog.images) are stored next to it
+and named after the same hash:
+
+    blobs/3a/7b/variants/3a7bd3e2...4f1b-thumbnail.webp
+
+Which rows point at a blob, and when it can go, is tracked in blog.blobs.
+"""
+import os
+import posixpath
+from uuid import uuid4
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+
+from blog.uploads import get_sha256
+
+BLOB_PREFIX = 'blobs'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # _save() derives the name from the content, an existing file is the same file
+        return name
+
+    @staticmethod
+    def get_blob_name(sha256, name):
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(BLOB_PREFIX, sha256[:2], sha256[2:4], f'{sha256}{extension}')
+
+    def _save(self, name, content):
+        sha256 = get_sha256(content)
+        name = self.get_blob_name(sha256, name)
+        # Looked up lazily, the models module uses this storage
+        MediaBlob = apps.get_model('blog', 'MediaBlob')
+        # Before the file is checked: a fresh updated_at keeps an unreferenced blob from garbage
+        # collection until the row pointing at it is written, and a collection deleting the row
+        # right now makes this wait until its file is gone too
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name, sha256=sha256, size=content.size)],
+            update_conflicts=True, unique_fields=['name'], update_fields=['updated_at'])
+        if not self.exists(name):
+            self.replace(name, content)
+        return name
+
+    def replace(self, name, content):
+        """
+        Writes content at exactly `name`, over the file already there. Written
+        under a unique name and renamed, concurrent writers of the same name
+        all end with a whole file.
+        """
+        temp_name = super()._save(f'{name}.{uuid4().hex}.part', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    # Migrations reference the callable instead of serializing the storage
+    return blob_storage
@@ -1,6 +1,7 @@
 from celery import shared_task
 from django.core.mail import send_mail
 
+from blog import archive, images, jobs, reorder, upload_sessions
 from blog.models import BlogPost, BlogPostCover
 from blog_post import settings
 
@@ -10,25 +11,73 @@ def send_email_task(email):
     print(f"Sending email to {email}")
 
 
-@shared_task
-def delete_inactive_blog_posts():
-    blog_posts_count = BlogPost.objects.filter(is_active=False).count()
-    BlogPost.objects.filter(is_active=False).update(deleted=True)
+@shared_task(acks_late=True)
+def delete_inactive_blog_posts(chunk_size: int = jobs.CHUNK_SIZE, dry_run: bool = False):
+    # acks_late redelivers the task after a worker restart, it resumes from its checkpoint
+    blog_posts_count = jobs.delete_inactive_blog_posts(
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        progress=lambda processed, last_pk: print(f"Deleted {processed} blog posts up to id {last_pk}"),
+    )
 
     print(f"Deleted {blog_posts_count} blog posts")
 
 
+@shared_task(acks_late=True)
+def purge_deleted_blog_posts(days: int = None, chunk_size: int = jobs.CHUNK_SIZE):
+    blog_posts_count = jobs.purge_deleted_blog_posts(
+        days=days,
+        chunk_size=chunk_size,
+        progress=lambda processed, last_pk: print(f"Purged {processed} blog posts up to id {last_pk}"),
+    )
+
+    print(f"Purged {blog_posts_count} blog posts")
+
+
+@shared_task(acks_late=True)
+def collect_media_garbage(hours: int = None, chunk_size: int = jobs.CHUNK_SIZE):
+    blobs_count = jobs.collect_media_garbage(
+        hours=hours,
+        chunk_size=chunk_size,
+        progress=lambda processed, last_pk: print(f"Deleted {processed} blobs up to id {last_pk}"),
+    )
+
+    print(f"Deleted {blobs_count} blobs")
+
+
+@shared_task(acks_late=True)
+def delete_expired_document_uploads(chunk_size: int = jobs.CHUNK_SIZE):
+    sessions_count = upload_sessions.delete_expired_document_uploads(
+        chunk_size=chunk_size,
+        progress=lambda processed, last_pk: print(f"Deleted {processed} upload sessions up to id {last_pk}"),
+    )
+
+    print(f"Deleted {sessions_count} upload sessions")
+
+
+@shared_task(acks_late=True)
+def archive_blog_posts(days: int = None, chunk_size: int = jobs.CHUNK_SIZE):
+    blog_posts_count = archive.archive_blog_posts(
+        days=days,
+        chunk_size=chunk_size,
+        progress=lambda processed, last_pk: print(f"Archived {processed} blog posts up to id {last_pk}"),
+    )
+
+    print(f"Archived {blog_posts_count} blog posts")
+
+
 @shared_task
 def reorder_blog_posts(sort_field: str, asc_des: str):
-    if asc_des == 'des':
-        sort_field = f'-{sort_field}'
-    blog_posts = BlogPost.objects.order_by(sort_field)
+    blog_posts_count = reorder.reorder_blog_posts(sort_field, asc_des)
 
-    for index, blog_post in enumerate(blog_posts, start=1):
-        blog_post.order = index
-        blog_post.save(update_fields=['order'])
+    print(f"reordered {blog_posts_count} blog posts")
 
-    print(f"reordered {blog_posts.count()} blog posts")
+
+@shared_task
+def rebalance_blog_posts():
+    blog_posts_count = reorder.rebalance_blog_posts()
+
+    print(f"rebalanced {blog_posts_count} blog posts")
 
 
 @shared_task
@@ -54,3 +103,12 @@ def create_blog_post_cover(image_url: str, blog_post_id: int):
         print(f"Blog post cover created")
     except BlogPost.DoesNotExist:
         return f"Blog Post with ID {blog_post_id} not found."
+
+
+@shared_task
+def generate_image_variants(model_label: str, pk: int):
+    # One image per task, the worker pool spreads the uploads over the processes
+    variants = images.generate_variants(images.IMAGE_MODELS[model_label], pk)
+    if variants is None:
+        return f"{model_label} {pk} not found or replaced."
+    return f"Generated {len(variants)} variants of {model_label} {pk}"
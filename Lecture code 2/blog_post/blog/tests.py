@@ -1,3 +1,1881 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.test import APITestCase, force_authenticate
+
+from blog import (
+    archive, benchmarks, blobs, counters, export, images, imports, instrumentation, jobs, reorder, upload_sessions,
+)
+from blog.cache import get_time_bucket
+from blog.middleware import RequestInstrumentationMiddleware
+from blog.models import (
+    ArchivedBlogPost,
+    Author,
+    BlogPost,
+    BlogPostAuthorThroughTable,
+    BlogPostCounter,
+    BlogPostCover,
+    BlogPostImage,
+    DocumentUploadSession,
+    JobCheckpoint,
+    MediaBlob,
+)
+from blog.storage import blob_storage
+from blog.tasks import delete_inactive_blog_posts, generate_image_variants, rebalance_blog_posts
+from blog.views import BlogPostViewSet
+from user.models import CustomUser
+
+sequence = count(1)
+
+
+def create_blog_posts(number, authors_per_post=2, **kwargs):
+    blog_posts = []
+    for _ in range(number):
+        index = next(sequence)
+        blog_post = BlogPost.objects.create(
+            title=f'Title {index}', text=f'Text {index}', order=index, **kwargs)
+        authors = [
+            Author.objects.create(first_name=f'First {index}-{i}', last_name='Last', email=f'{index}-{i}@example.com')
+            for i in range(authors_per_post)
+        ]
+        blog_post.authors.set(authors)
+        blog_posts.append(blog_post)
+    return blog_posts
+
+
+class BlogAPITestCase(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class BlogPostQueryCountTests(BlogAPITestCase):
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, posts_per_step=5):
+        create_blog_posts(1)
+        baseline = self.count_queries(url)
+        create_blog_posts(posts_per_step)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_blog_post_viewset_list(self):
+        self.assertConstantQueries('/blog/blogpost/')
+
+    def test_blog_post_list_viewset(self):
+        self.assertConstantQueries('/blog/blog_posts/')
+
+    def test_archived_posts(self):
+        create_blog_posts(1, archived=True)
+        baseline = self.count_queries('/blog/blogpost/archived_posts/')
+        for blog_post in create_blog_posts(5):
+            BlogPost.objects.filter(id=blog_post.id).update(archived=True)
+        self.assertEqual(self.count_queries('/blog/blogpost/archived_posts/'), baseline)
+
+    def test_retrieve_prefetches_authors(self):
+        blog_post = create_blog_posts(1, authors_per_post=5)[0]
+        # ETag lookup, post, authors
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/blog/blogpost/{blog_post.id}/')
+        self.assertEqual(len(response.data['authors']), 5)
+        with self.assertNumQueries(3):
+            self.client.get(f'/blog/blog_post/{blog_post.id}/')
+
+
+class BlogPostKeysetPaginationTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog_posts = create_blog_posts(5, authors_per_post=0)
+        # Duplicate order values make sure the id tie-breaker is used
+        BlogPost.objects.filter(id__in=[post.id for post in self.blog_posts[1:3]]).update(order=0)
+
+    def collect(self, url):
+        ids, response = [], self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [post['id'] for post in response.data['results']['paginated_results']]
+            if response.data['next'] is None:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def expected_ids(self, *ordering):
+        return list(BlogPost.objects.order_by(*ordering).values_list('id', flat=True))
+
+    def test_walks_forward_in_order_then_id(self):
+        ids, _ = self.collect('/blog/blogpost/')
+        self.assertEqual(ids, self.expected_ids('order', 'id'))
+
+    def test_descending_ordering(self):
+        ids, _ = self.collect('/blog/blogpost/?ordering=-order')
+        self.assertEqual(ids, self.expected_ids('-order', '-id'))
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/blog/blogpost/?page_size=2')
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(previous.data['results'], first.data['results'])
+        self.assertIsNone(previous.data['previous'])
+
+    def test_default_page_size_is_the_global_one(self):
+        create_blog_posts(1, authors_per_post=0)
+        response = self.client.get('/blog/blogpost/')
+        self.assertEqual(len(response.data['results']['paginated_results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/blog/blogpost/?page_size=4')
+        self.assertEqual(len(response.data['results']['paginated_results']), 4)
+        response = self.client.get('/blog/blogpost/?page_size=100000')
+        self.assertEqual(len(response.data['results']['paginated_results']), 5)
+
+    def test_count_is_optional(self):
+        response = self.client.get('/blog/blogpost/')
+        self.assertNotIn('count', response.data)
+        self.assertNotIn('total_products', response.data['results'])
+        response = self.client.get('/blog/blogpost/?count=true')
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['results']['total_products'], 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/blog/blogpost/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class BlogPostCounterTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.client.force_authenticate(self.user)
+
+    def assertCountersMatchTable(self):
+        self.assertEqual(
+            {key: value for key, value in counters.get_counts().items() if value},
+            dict(counters.compute_counts()),
+        )
+
+    def test_write_paths_keep_counters_in_step(self):
+        blog_posts = create_blog_posts(4, authors_per_post=0, owner=self.user, category=1)
+        self.assertEqual(counters.get_count('live'), 4)
+
+        self.client.post(f'/blog/blogpost/{blog_posts[0].id}/publish/')
+        self.client.post(f'/blog/blogpost/{blog_posts[1].id}/archive/')
+        self.client.delete(f'/blog/blogpost/{blog_posts[2].id}/')
+        blog_posts[3].category = 2
+        blog_posts[3].save()
+        self.assertEqual(counters.get_count('published'), 1)
+        self.assertEqual(counters.get_count('archived'), 1)
+        self.assertEqual(counters.get_count('deleted'), 1)
+        self.assertEqual(counters.get_count('category:1'), 2)
+        self.assertCountersMatchTable()
+
+        BlogPost.objects.filter(id=blog_posts[0].id).update(is_active=False)
+        delete_inactive_blog_posts()
+        self.assertEqual(counters.get_count('live'), 2)
+        self.assertCountersMatchTable()
+
+        BlogPost.objects.get(id=blog_posts[1].id).delete()
+        self.assertEqual(counters.get_count('total'), 3)
+        self.assertCountersMatchTable()
+
+    def test_list_total_reads_counters(self):
+        create_blog_posts(3, authors_per_post=0, category=1)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/blog/blogpost/?count=true&category=1')
+        self.assertEqual(response.data['results']['total_products'], 3)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+
+        response = self.client.get('/blog/blogpost/?count=true&title=missing')
+        self.assertEqual(response.data['results']['total_products'], 0)
+
+    def test_reconcile_repairs_drift(self):
+        create_blog_posts(2, authors_per_post=0)
+        BlogPostCounter.objects.filter(key='live').update(value=10)
+        self.assertEqual(counters.reconcile(), {'live': -8})
+        self.assertCountersMatchTable()
+
+
+class BlogPostKeywordSearchTests(BlogAPITestCase):
+
+    def search(self, keyword, **params):
+        response = self.client.get('/blog/blogpost/', {'keyword': keyword, **params})
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']['paginated_results']]
+
+    def test_index_follows_save_and_bulk_update(self):
+        blog_post = BlogPost.objects.create(title='Django tips', text='Query planning')
+        self.assertEqual(self.search('planning'), [blog_post.id])
+
+        blog_post.text = 'Indexes'
+        blog_post.save()
+        self.assertEqual(self.search('planning'), [])
+        self.assertEqual(self.search('index'), [blog_post.id])
+
+        BlogPost.objects.filter(id=blog_post.id).update(title='Celery workers')
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(self.search('celery'), [blog_post.id])
+
+        blog_post.delete()
+        self.assertEqual(self.search('celery'), [])
+
+    def test_results_are_ranked_and_paginated_by_relevance(self):
+        weak = BlogPost.objects.create(title='Cooking', text='A short note about python', order=1)
+        strong = BlogPost.objects.create(title='Python', text='Python python python', order=2)
+        middle = BlogPost.objects.create(title='Python', text='Gardening', order=3)
+        BlogPost.objects.create(title='Unrelated', text='Nothing here', order=4)
+
+        self.assertEqual(self.search('python', page_size=5), [strong.id, middle.id, weak.id])
+
+        first = self.client.get('/blog/blogpost/', {'keyword': 'python', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+        self.assertEqual([post['id'] for post in second.data['results']['paginated_results']], [weak.id])
+
+        self.assertEqual(self.search('python', ordering='order', page_size=5), [weak.id, strong.id, middle.id])
+
+    def test_punctuation_only_keyword(self):
+        BlogPost.objects.create(title='Title', text='Text')
+        self.assertEqual(self.search('"*'), [])
+
+
+class BlogPostResponseCacheTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.blog_post = create_blog_posts(1, owner=self.user)[0]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_repeated_reads_are_served_from_cache(self):
+        # Detail still reads updated_at for its ETag
+        urls = {'/blog/blogpost/': 0, f'/blog/blogpost/{self.blog_post.id}/': 1, '/blog/blogpost/archived_posts/': 0}
+        for url, queries in urls.items():
+            self.get(url)
+            with self.assertNumQueries(queries):
+                self.get(url)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.example.com'])
+    def test_cached_urls_keep_their_host(self):
+        BlogPost.objects.filter(pk=self.blog_post.pk).update(document='blog_post_documents/notes.pdf')
+        url = f'/blog/blogpost/{self.blog_post.id}/'
+        self.assertTrue(self.get(url)['document'].startswith('http://testserver/'))
+        response = self.client.get(url, HTTP_HOST='other.example.com')
+        self.assertTrue(response.data['document'].startswith('http://other.example.com/'))
+
+    def test_query_string_is_normalized(self):
+        self.get('/blog/blogpost/?page_size=1&count=true')
+        with self.assertNumQueries(0):
+            self.get('/blog/blogpost/?count=true&page_size=1&format=json')
+
+    def test_actions_invalidate_list_and_detail(self):
+        detail_url = f'/blog/blogpost/{self.blog_post.id}/'
+        self.get('/blog/blogpost/archived_posts/')
+        self.get(detail_url)
+
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/blog/blogpost/{self.blog_post.id}/archive/')
+        self.client.force_authenticate(None)
+        self.assertEqual(len(self.get('/blog/blogpost/archived_posts/')), 1)
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(detail_url, {'title': 'Changed'})
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get(detail_url)['title'], 'Changed')
+
+        Author.objects.filter(blog_posts=self.blog_post).first().save()
+        with self.assertNumQueries(3):
+            self.get(detail_url)
+
+    def test_bulk_task_invalidates_list(self):
+        self.assertEqual(len(self.get('/blog/blogpost/')['results']['paginated_results']), 1)
+        BlogPost.objects.filter(id=self.blog_post.id).update(is_active=False)
+        delete_inactive_blog_posts()
+        self.assertEqual(self.get('/blog/blogpost/')['results']['paginated_results'], [])
+        response = self.client.get(f'/blog/blogpost/{self.blog_post.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class BlogPostConditionalGetTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog_post = create_blog_posts(1)[0]
+
+    def test_detail_not_modified_after_one_query(self):
+        for url in (f'/blog/blogpost/{self.blog_post.id}/', f'/blog/blog_post/{self.blog_post.id}/'):
+            response = self.client.get(url)
+            # Not derived from the versions, If-Modified-Since would miss author and cover changes
+            self.assertNotIn('Last-Modified', response.headers)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_detail_etag_changes_with_post_and_authors(self):
+        url = f'/blog/blogpost/{self.blog_post.id}/'
+        etag = self.client.get(url).headers['ETag']
+
+        self.blog_post.authors.add(Author.objects.create(first_name='New', last_name='Author', email='new@example.com'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        etag = response.headers['ETag']
+        self.blog_post.title = 'Changed'
+        self.blog_post.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_alone_never_answers_not_modified(self):
+        url = f'/blog/blogpost/{self.blog_post.id}/'
+        self.client.get(url)
+        Author.objects.filter(blog_posts=self.blog_post).update(first_name='Renamed')
+        Author.objects.filter(blog_posts=self.blog_post).first().save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['authors'][0]['first_name'], 'Renamed')
+
+    def test_list_not_modified_without_queries(self):
+        response = self.client.get('/blog/blogpost/?page_size=1')
+        with self.assertNumQueries(0):
+            response = self.client.get('/blog/blogpost/?page_size=1', HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        etag = response.headers['ETag']
+        create_blog_posts(1)
+        self.assertEqual(self.client.get('/blog/blogpost/?page_size=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(
+            self.client.get('/blog/blogpost/?page_size=2').headers['ETag'],
+            self.client.get('/blog/blogpost/?page_size=1').headers['ETag'],
+        )
+
+    def test_missing_post_is_not_found(self):
+        response = self.client.get('/blog/blogpost/999999/', HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(response.status_code, 404)
+
+    def test_recent_filter_expires_with_the_time_bucket(self):
+        url = '/blog/blogpost/?recent=true'
+        bucket = get_time_bucket()
+        with mock.patch('blog.cache.get_time_bucket', return_value=bucket):
+            response = self.client.get(url)
+            self.assertEqual(len(response.data['results']['paginated_results']), 1)
+            etag = response.headers['ETag']
+            plain_etag = self.client.get('/blog/blogpost/').headers['ETag']
+
+        # Falls out of the window with time, no write invalidates anything
+        BlogPost.objects.update(created_at=timezone.now() - timedelta(days=6))
+        with mock.patch('blog.cache.get_time_bucket', return_value=bucket + 1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results']['paginated_results'], [])
+            self.assertEqual(self.client.get('/blog/blogpost/').headers['ETag'], plain_etag)
+
+
+class BlogPostFastListSerializerTests(BlogAPITestCase):
+
+    def test_same_json_as_model_serializer(self):
+        create_blog_posts(4, authors_per_post=3, category=2)
+        create_blog_posts(1, authors_per_post=0)
+        url = '/blog/blogpost/?page_size=10'
+        fast = self.client.get(url)
+        cache.clear()
+        with override_settings(BLOG_POST_FAST_LIST_SERIALIZER=False):
+            regular = self.client.get(url)
+        self.assertEqual(fast.content, regular.content)
+
+    def test_text_column_is_not_read(self):
+        create_blog_posts(2)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/blog/blogpost/')
+        self.assertFalse(any('"blog_blogpost"."text"' in query['sql'] for query in context.captured_queries))
+
+
+class SparseFieldsetTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog_posts = create_blog_posts(3)
+        BlogPostCover.objects.create(blog_post=self.blog_posts[0], image='blog_post_covers/cover.png')
+
+    def get_with_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in context.captured_queries]
+
+    def assertColumnsNotRead(self, queries, *columns):
+        for column in columns:
+            self.assertFalse(any(f'"blog_blogpost"."{column}"' in sql for sql in queries), column)
+
+    def test_list_fields_prune_columns_and_prefetches(self):
+        for url in ('/blog/blogpost/?fields=id,title', '/blog/blog_posts/?fields=id,title'):
+            data, queries = self.get_with_queries(url)
+            results = data['results']
+            results = results['paginated_results'] if isinstance(results, dict) else results
+            self.assertEqual(set(results[0]), {'id', 'title'})
+            self.assertColumnsNotRead(queries, 'text', 'document', 'created_at')
+            self.assertFalse(any('blog_author' in sql for sql in queries))
+
+    def test_detail_fields_prune_columns(self):
+        data, queries = self.get_with_queries(f'/blog/blogpost/{self.blog_posts[1].id}/?fields=id,title')
+        self.assertEqual(set(data), {'id', 'title'})
+        self.assertColumnsNotRead(queries, 'text', 'document', 'website')
+
+    def test_expand_cover(self):
+        url = f'/blog/blogpost/{self.blog_posts[0].id}/'
+        self.assertNotIn('cover', self.client.get(url).data)
+        data, queries = self.get_with_queries(f'{url}?expand=cover&fields=id,cover')
+        self.assertTrue(data['cover']['image'].endswith('/media/blog_post_covers/cover.png'))
+        # ETag lookup and the post joined with its cover
+        self.assertEqual(len(queries), 2)
+
+    def test_fast_list_matches_model_serializer_with_fieldsets(self):
+        url = '/blog/blogpost/?page_size=5&fields=id,category,cover&expand=cover'
+        fast = self.client.get(url)
+        cache.clear()
+        with override_settings(BLOG_POST_FAST_LIST_SERIALIZER=False):
+            regular = self.client.get(url)
+        self.assertEqual(fast.content, regular.content)
+
+    def test_author_fields_respect_action_defaults(self):
+        data, queries = self.get_with_queries('/blog/author/?fields=first_name,email')
+        self.assertEqual(set(data['results'][0]), {'first_name'})
+        self.assertFalse(any('"blog_author"."email"' in sql for sql in queries))
+
+
+class ExplainBlogPostQueriesTests(BlogAPITestCase):
+
+    def explain(self, endpoint):
+        output = StringIO()
+        call_command('explain_blog_post_queries', endpoint=[endpoint], stdout=output)
+        return output.getvalue()
+
+    def test_endpoints_use_their_indexes(self):
+        self.assertIn('blog_post_live_order_idx', self.explain('/blog/blogpost/ next page'))
+        self.assertIn('blog_post_archived_order_idx', self.explain('archived_posts'))
+        self.assertIn('blog_post_inactive_idx', self.explain('delete_inactive'))
+
+
+class ReorderBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog_posts = create_blog_posts(5, authors_per_post=0)
+        BlogPost.objects.filter(pk=self.blog_posts[1].pk).update(title='A first', deleted=True)
+
+    def get_orders(self):
+        return list(BlogPost.objects.order_by('order').values_list('id', flat=True))
+
+    def test_reorder_paths_agree(self):
+        expected = list(BlogPost.objects.order_by('-title').values_list('id', flat=True))
+        for set_based in (True, False):
+            BlogPost.objects.update(order=0)
+            with CaptureQueriesContext(connection) as context:
+                updated = reorder.reorder_blog_posts('title', 'des', set_based=set_based)
+            self.assertEqual(updated, 5)
+            self.assertEqual(self.get_orders(), expected)
+            self.assertEqual(
+                list(BlogPost.objects.order_by('order').values_list('order', flat=True)),
+                [reorder.ORDER_GAP * rank for rank in range(1, 6)])
+            if set_based:
+                self.assertEqual(len(context.captured_queries), 3)
+
+    def test_unchanged_rows_are_not_written(self):
+        reorder.reorder_blog_posts('id', 'asc')
+        self.assertEqual(reorder.reorder_blog_posts('id', 'asc'), 0)
+        self.assertEqual(reorder.reorder_blog_posts('id', 'asc', set_based=False), 0)
+
+    def test_reorder_invalidates_cached_lists(self):
+        def get_first_id():
+            return self.client.get('/blog/blogpost/?page_size=1').data['results']['paginated_results'][0]['id']
+
+        self.assertEqual(get_first_id(), self.blog_posts[0].id)
+        reorder.reorder_blog_posts('id', 'des')
+        self.assertEqual(get_first_id(), self.blog_posts[-1].id)
+
+    def test_sort_field_allow_list(self):
+        with self.assertRaises(ValueError):
+            reorder.reorder_blog_posts('text; DROP TABLE blog_blogpost', 'asc')
+        with self.assertRaises(ValueError):
+            reorder.reorder_blog_posts('title', 'sideways')
+
+        user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.client.force_authenticate(user)
+        response = self.client.post('/blog/blogpost/reorder_blog_posts/', {'sort_field': 'text', 'asc_des': 'asc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MoveBlogPostTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.client.force_authenticate(self.user)
+        self.blog_posts = create_blog_posts(5, authors_per_post=0, owner=self.user)
+        reorder.reorder_blog_posts('id', 'asc')
+        for blog_post in self.blog_posts:
+            blog_post.refresh_from_db(fields=['order'])
+
+    def move(self, blog_post, **data):
+        return self.client.post(f'/blog/blogpost/{blog_post.id}/move/', data)
+
+    def get_ids(self):
+        return list(BlogPost.objects.filter(deleted=False).order_by('order', 'id').values_list('id', flat=True))
+
+    def get_updates(self, context):
+        return [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+
+    def test_move_writes_one_row(self):
+        first, second, third, fourth, fifth = self.blog_posts
+        cases = [
+            (fifth, {'after': first.id}, [first, fifth, second, third, fourth]),
+            (first, {'before': fourth.id}, [fifth, second, third, first, fourth]),
+            (fourth, {'position': 1}, [fourth, fifth, second, third, first]),
+            (fifth, {'position': 4}, [fourth, second, third, fifth, first]),
+            (second, {'position': 99}, [fourth, third, fifth, first, second]),
+        ]
+        for blog_post, data, expected in cases:
+            with CaptureQueriesContext(connection) as context:
+                response = self.move(blog_post, **data)
+            self.assertEqual(response.status_code, 200, data)
+            self.assertEqual(self.get_ids(), [post.id for post in expected], data)
+            self.assertEqual(len(self.get_updates(context)), 1, data)
+
+    def test_move_renumbers_when_gaps_run_out(self):
+        first, second = self.blog_posts[:2]
+        BlogPost.objects.filter(pk=second.pk).update(order=first.order + 1)
+        with CaptureQueriesContext(connection) as context:
+            response = self.move(self.blog_posts[4], after=first.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.get_updates(context)), 2)
+        ids = [post.id for post in self.blog_posts]
+        self.assertEqual(self.get_ids(), [ids[0], ids[4], *ids[1:4]])
+
+    def test_low_gaps_schedule_a_rebalance(self):
+        first, second = self.blog_posts[:2]
+        BlogPost.objects.filter(pk=second.pk).update(order=first.order + 10)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.move(self.blog_posts[4], after=first.id)
+        self.assertIn(rebalance_blog_posts.delay, callbacks)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.move(self.blog_posts[4], position=5)
+        self.assertNotIn(rebalance_blog_posts.delay, callbacks)
+
+    def test_move_validation(self):
+        first, second = self.blog_posts[:2]
+        self.assertEqual(self.move(first, before=second.id, after=second.id).status_code, 400)
+        self.assertEqual(self.move(first).status_code, 400)
+        self.assertEqual(self.move(first, after=first.id).status_code, 400)
+        self.assertEqual(self.move(first, position=0).status_code, 400)
+        BlogPost.objects.filter(pk=second.pk).update(deleted=True)
+        self.assertEqual(self.move(first, after=second.id).status_code, 400)
+
+
+class DeleteInactiveBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.inactive = create_blog_posts(7, authors_per_post=0, is_active=False)
+        self.active = create_blog_posts(2, authors_per_post=0)
+
+    def test_deletes_in_chunks_without_counting(self):
+        progress = []
+        with CaptureQueriesContext(connection) as context:
+            deleted = jobs.delete_inactive_blog_posts(
+                chunk_size=3, progress=lambda processed, last_pk: progress.append((processed, last_pk)))
+        self.assertEqual(deleted, 7)
+        self.assertEqual(progress, [(3, self.inactive[2].id), (6, self.inactive[5].id), (7, self.inactive[6].id)])
+        self.assertEqual(BlogPost.objects.filter(deleted=True).count(), 7)
+        # Only the grouped counter deltas count rows, totals come from update()
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] and 'GROUP BY' not in query['sql'] for query in context.captured_queries))
+        self.assertEqual(counters.get_count('deleted'), 7)
+        self.assertEqual(counters.get_count('live'), 2)
+
+        checkpoint = JobCheckpoint.objects.get(name=jobs.DELETE_INACTIVE_JOB)
+        self.assertEqual(checkpoint.processed, 7)
+        self.assertIsNotNone(checkpoint.finished_at)
+
+    def test_dry_run_writes_nothing(self):
+        self.assertEqual(jobs.delete_inactive_blog_posts(chunk_size=3, dry_run=True), 7)
+        self.assertFalse(BlogPost.objects.filter(deleted=True).exists())
+        self.assertFalse(JobCheckpoint.objects.exists())
+
+    def test_resumes_after_interruption(self):
+        def interrupt(processed, last_pk):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            jobs.delete_inactive_blog_posts(chunk_size=3, progress=interrupt)
+        self.assertEqual(BlogPost.objects.filter(deleted=True).count(), 3)
+
+        # Rows before the checkpoint are not looked at again
+        BlogPost.objects.filter(pk=self.inactive[0].pk).update(deleted=False)
+        self.assertEqual(jobs.delete_inactive_blog_posts(chunk_size=3), 7)
+        self.assertEqual(BlogPost.objects.filter(deleted=True).count(), 6)
+
+        self.assertEqual(jobs.delete_inactive_blog_posts(chunk_size=3), 1)
+        self.assertEqual(BlogPost.objects.filter(deleted=True).count(), 7)
+
+
+class PurgeDeletedBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        long_ago = timezone.now() - timedelta(days=40)
+        self.old, self.shared, self.recent = create_blog_posts(3)
+        self.live = create_blog_posts(1)[0]
+        for blog_post in (self.old, self.shared, self.recent, self.live):
+            blog_post.document = default_storage.save(f'blog_post_documents/{blog_post.id}.txt', ContentFile(b'doc'))
+            blog_post.save()
+            BlogPostCover.objects.create(
+                blog_post=blog_post,
+                image=default_storage.save(f'blog_post_covers/{blog_post.id}.png', ContentFile(b'png')))
+        BlogPostImage.objects.create(blog_post=self.shared, image=self.live.cover.image.name)
+        counters.update_blog_posts(
+            BlogPost.objects.filter(pk__in=[self.old.pk, self.shared.pk]), deleted=True, deleted_at=long_ago)
+        counters.update_blog_posts(BlogPost.objects.filter(pk=self.recent.pk), deleted=True, deleted_at=timezone.now())
+
+    def test_purges_old_posts_with_related_rows_and_files(self):
+        old_files = [self.old.document.name, self.old.cover.image.name, self.shared.document.name]
+        with self.captureOnCommitCallbacks(execute=True):
+            purged = jobs.purge_deleted_blog_posts(days=30, chunk_size=1, pause=0)
+
+        self.assertEqual(purged, 2)
+        self.assertEqual(
+            set(BlogPost.objects.values_list('id', flat=True)), {self.recent.id, self.live.id})
+        self.assertEqual(BlogPostCover.objects.count(), 2)
+        self.assertFalse(BlogPostImage.objects.exists())
+        self.assertEqual(counters.get_count('total'), 2)
+        self.assertEqual(counters.get_count('deleted'), 1)
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name), name)
+        # Still used by the live post's cover
+        self.assertTrue(default_storage.exists(self.live.cover.image.name))
+        self.assertTrue(default_storage.exists(self.recent.document.name))
+
+    def test_dry_run_keeps_rows_and_files(self):
+        self.assertEqual(jobs.purge_deleted_blog_posts(days=30, dry_run=True), 2)
+        self.assertEqual(BlogPost.objects.count(), 4)
+        self.assertTrue(default_storage.exists(self.old.document.name))
+
+    def test_missing_deleted_at_falls_back_to_updated_at(self):
+        BlogPost.objects.filter(pk=self.old.pk).update(
+            deleted_at=None, updated_at=timezone.now() - timedelta(days=40))
+        BlogPost.objects.filter(pk=self.shared.pk).update(deleted_at=None, updated_at=timezone.now())
+        self.assertEqual(jobs.purge_deleted_blog_posts(days=30, pause=0), 1)
+        self.assertFalse(BlogPost.objects.filter(pk=self.old.pk).exists())
+
+    def test_deleting_again_after_a_restore_starts_over(self):
+        self.old.refresh_from_db()
+        self.old.deleted = False
+        self.old.save()
+        self.assertIsNone(BlogPost.objects.get(pk=self.old.pk).deleted_at)
+        # Deleted again like the admin does, without setting deleted_at
+        self.old.deleted = True
+        self.old.save(update_fields=['deleted'])
+        self.assertGreater(BlogPost.objects.get(pk=self.old.pk).deleted_at, timezone.now() - timedelta(minutes=1))
+
+        counters.update_blog_posts(BlogPost.objects.filter(pk=self.shared.pk), deleted=False)
+        self.assertIsNone(BlogPost.objects.get(pk=self.shared.pk).deleted_at)
+        counters.update_blog_posts(BlogPost.objects.filter(pk=self.shared.pk), deleted=True)
+
+        self.assertEqual(jobs.purge_deleted_blog_posts(days=30, pause=0), 0)
+        self.assertEqual(BlogPost.objects.filter(deleted=True).count(), 3)
+
+
+class ArchiveBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.archived, self.deleted, self.recently_deleted, self.live = create_blog_posts(4, owner=self.user)
+        BlogPostCover.objects.create(blog_post=self.archived, image='blog_post_covers/archived.png')
+        BlogPostImage.objects.create(blog_post=self.archived, image='blog_post_images/archived.png')
+        BlogPostAuthorThroughTable.objects.create(
+            blog_post=self.archived, authors=self.live.authors.first(), date='2024-05-01')
+        self.archived.archived = True
+        self.archived.save()
+        counters.update_blog_posts(
+            BlogPost.objects.filter(pk=self.deleted.pk), deleted=True, deleted_at=timezone.now() - timedelta(days=10))
+        counters.update_blog_posts(
+            BlogPost.objects.filter(pk=self.recently_deleted.pk), deleted=True, deleted_at=timezone.now())
+
+    def test_moves_archived_and_old_deleted_posts(self):
+        authors = set(self.archived.authors.all())
+        self.assertEqual(archive.archive_blog_posts(days=7, chunk_size=1), 2)
+        self.assertEqual(
+            set(BlogPost.objects.values_list('id', flat=True)), {self.recently_deleted.id, self.live.id})
+        self.assertEqual(set(ArchivedBlogPost.objects.values_list('id', flat=True)), {self.archived.id, self.deleted.id})
+        self.assertFalse(BlogPostCover.objects.exists())
+        self.assertEqual(counters.get_count('total'), 2)
+        self.assertEqual(counters.get_count('archived'), 0)
+
+        archived = ArchivedBlogPost.objects.get(pk=self.archived.pk)
+        self.assertEqual(archived.cover_image.name, 'blog_post_covers/archived.png')
+        self.assertEqual(list(archived.images.values_list('image', flat=True)), ['blog_post_images/archived.png'])
+        self.assertEqual(set(archived.authors.all()), authors)
+        self.assertEqual(archived.created_at, self.archived.created_at)
+
+    def test_archived_posts_reads_both_tables(self):
+        archive.archive_blog_posts(days=7)
+        pending = create_blog_posts(1, archived=True)[0]
+        response = self.client.get('/blog/blogpost/archived_posts/?expand=cover')
+        self.assertEqual([item['id'] for item in response.data], [self.archived.id, pending.id])
+        self.assertEqual(set(response.data[0]), set(response.data[1]))
+        self.assertTrue(response.data[0]['cover']['image'].endswith('/media/blog_post_covers/archived.png'))
+        self.assertEqual(len(response.data[0]['authors']), 2)
+
+    def test_restore(self):
+        archive.archive_blog_posts(days=7)
+        other = CustomUser.objects.create_user(email='other@example.com', password='password', full_name='Other')
+        self.client.force_authenticate(other)
+        response = self.client.post('/blog/blogpost/restore_archived_posts/', {'ids': [self.archived.id]})
+        self.assertEqual(response.data, {'restored': 0})
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/blog/blogpost/restore_archived_posts/', {'ids': [self.archived.id]})
+        self.assertEqual(response.data, {'restored': 1})
+        restored = BlogPost.objects.get(pk=self.archived.pk)
+        self.assertFalse(restored.archived)
+        self.assertEqual(restored.created_at, self.archived.created_at)
+        self.assertEqual(restored.cover.image.name, 'blog_post_covers/archived.png')
+        self.assertEqual(restored.images.count(), 1)
+        self.assertEqual(restored.authors.count(), 2)
+        self.assertEqual(BlogPostAuthorThroughTable.objects.get(blog_post=restored).date.isoformat(), '2024-05-01')
+        self.assertFalse(ArchivedBlogPost.objects.filter(pk=self.archived.pk).exists())
+        self.assertEqual(counters.get_count('live'), 2)
+        self.assertEqual(self.client.get(f'/blog/blogpost/{restored.id}/').status_code, 200)
+
+    def test_restore_reports_reused_titles(self):
+        archive.archive_blog_posts(days=7)
+        BlogPost.objects.create(title=self.archived.title, text=self.archived.text, owner=self.user)
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            '/blog/blogpost/restore_archived_posts/', {'ids': [self.archived.id, self.deleted.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['ids']), {self.archived.id})
+        self.assertEqual(ArchivedBlogPost.objects.count(), 2)
+
+    def test_purge_covers_the_archive(self):
+        archive.archive_blog_posts(days=7)
+        ArchivedBlogPost.objects.filter(pk=self.deleted.pk).update(deleted_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(jobs.purge_deleted_blog_posts(days=30, pause=0), 1)
+        self.assertEqual(list(ArchivedBlogPost.objects.values_list('id', flat=True)), [self.archived.id])
+
+
+class BulkBlogPostTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password', full_name='Owner')
+        self.client.force_authenticate(self.user)
+
+    def post(self, action, data):
+        return self.client.post(f'/blog/blogpost/{action}/', data, format='json')
+
+    def test_bulk_create_in_one_insert(self):
+        items = [{'title': f'Bulk {index}', 'text': 'Text', 'category': 1} for index in range(50)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.post('bulk_create', items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 50)
+        self.assertTrue(all(item['id'] for item in response.data))
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "blog_blogpost"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(BlogPost.objects.filter(owner=self.user).count(), 50)
+        self.assertEqual(counters.get_count('category:1'), 50)
+
+    def test_created_posts_get_gapped_order_keys(self):
+        self.post('bulk_create', [{'title': f'Bulk {index}', 'text': 'Text'} for index in range(2)])
+        self.assertEqual(self.client.post('/blog/blogpost/', {'title': 'Single', 'text': 'Text'}).status_code, 201)
+        orders = list(BlogPost.objects.order_by('id').values_list('order', flat=True))
+        self.assertEqual(orders, [reorder.ORDER_GAP, 2 * reorder.ORDER_GAP, 3 * reorder.ORDER_GAP])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        create_blog_posts(1, authors_per_post=0)
+        existing = BlogPost.objects.get()
+        items = [
+            {'title': 'Fine', 'text': 'Text'},
+            {'title': existing.title, 'text': existing.text},
+            {'text': 'No title'},
+            {'title': 'Fine', 'text': 'Text'},
+        ]
+        response = self.post('bulk_create', items)
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('non_field_errors', errors[1])
+        self.assertIn('title', errors[2])
+        self.assertIn('non_field_errors', errors[3])
+        self.assertEqual(BlogPost.objects.count(), 1)
+
+    @override_settings(BLOG_POST_BULK_MAX_BATCH_SIZE=2)
+    def test_max_batch_size(self):
+        response = self.post('bulk_create', [{'title': f'T{index}', 'text': 'Text'} for index in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BlogPost.objects.exists())
+
+    def test_bulk_authors(self):
+        first, second = (
+            Author.objects.create(first_name=name, last_name='Author', email=f'{name}@example.com')
+            for name in ('first', 'second'))
+        items = [
+            {'title': 'With authors', 'text': 'Text', 'authors': [first.id, second.id, first.id]},
+            {'title': 'Unknown', 'text': 'Text', 'authors': [first.id, 999999]},
+        ]
+        response = self.post('bulk_create', items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('999999', str(response.data['errors'][1]['authors']))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.post('bulk_create', items[:1] + [{'title': 'Without', 'text': 'Text'}])
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('authors', response.data[0])
+        links = [
+            query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "blog_blogpost_authors"')
+        ]
+        self.assertEqual(len(links), 1)
+        with_authors, without = BlogPost.objects.order_by('id')
+        self.assertEqual(set(with_authors.authors.all()), {first, second})
+        self.assertFalse(without.authors.exists())
+
+        response = self.post(
+            'bulk_update', [{'id': with_authors.id, 'authors': [second.id]}, {'id': without.id, 'title': 'Kept'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(with_authors.authors.all()), [second])
+        self.assertFalse(without.authors.exists())
+
+    def test_bulk_update(self):
+        mine = create_blog_posts(3, authors_per_post=0, owner=self.user, category=1)
+        other = create_blog_posts(1, authors_per_post=0)[0]
+        response = self.post('bulk_update', [{'id': mine[0].id, 'title': 'Changed'}, {'id': other.id, 'title': 'No'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('id', response.data['errors'][1])
+
+        response = self.post('bulk_update', [{'id': 'abc', 'title': 'No'}, {'id': {}, 'title': 'No'}, {'title': 'No'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([set(error) for error in response.data['errors']], [{'id'}, {'id'}, {'id'}])
+
+        items = [{'id': blog_post.id, 'category': 2} for blog_post in mine] + [{'id': mine[0].id, 'title': 'Changed'}]
+        self.assertEqual(self.post('bulk_update', items).status_code, 400)
+        with CaptureQueriesContext(connection) as context:
+            response = self.post('bulk_update', items[:3])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['category'] for item in response.data], [2, 2, 2])
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "blog_blogpost"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(counters.get_count('category:1'), 0)
+        self.assertEqual(counters.get_count('category:2'), 3)
+
+    def test_bulk_delete(self):
+        mine = create_blog_posts(2, authors_per_post=0, owner=self.user)
+        other = create_blog_posts(1, authors_per_post=0)[0]
+        response = self.post('bulk_delete', {'ids': [mine[0].id, other.id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{}, {'id': ['Blog post not found.']}])
+
+        response = self.post('bulk_delete', {'ids': [blog_post.id for blog_post in mine]})
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(counters.get_count('live'), 1)
+        self.assertTrue(all(BlogPost.objects.filter(pk__in=[mine[0].id, mine[1].id]).values_list('deleted', flat=True)))
+
+
+# The smallest valid GIF, ImageField checks uploads with Pillow
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class BlogPostUpdateQueryTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(email='writer@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.blog_post = create_blog_posts(1, authors_per_post=0, owner=self.user, category=1)[0]
+        self.url = f'/blog/blogpost/{self.blog_post.id}/'
+
+    def patch(self, data, format='json'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, data, format=format)
+        self.assertEqual(response.status_code, 200, response.data)
+        writes = [
+            query['sql'].split(' ', 1)[0] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        return response, writes
+
+    def test_fields_only(self):
+        response, queries = self.patch({'website': 'https://example.com/'})
+        # The post lookup and one UPDATE, nothing is read back
+        self.assertEqual(queries, ['SELECT', 'UPDATE'])
+        self.assertEqual(response.data['website'], 'https://example.com/')
+
+    def test_title_change_checks_uniqueness(self):
+        response, queries = self.patch({'title': 'Changed'})
+        # The (title, text) uniqueness check is the only extra read
+        self.assertEqual(queries, ['SELECT', 'SELECT', 'UPDATE'])
+        self.assertEqual(response.data['title'], 'Changed')
+        self.blog_post.refresh_from_db()
+        self.assertEqual(self.blog_post.title, 'Changed')
+        self.assertFalse(BlogPostCover.objects.exists())
+
+    def test_category_change_updates_counters(self):
+        response, queries = self.patch({'category': 2})
+        # The counter rows are written after the post, never read
+        self.assertEqual(queries[:2], ['SELECT', 'UPDATE'])
+        self.assertNotIn('SELECT', queries[1:])
+        self.assertEqual(response.data['category'], 2)
+        self.assertEqual(counters.get_count('category:1'), 0)
+        self.assertEqual(counters.get_count('category:2'), 1)
+
+    def test_cover_is_upserted(self):
+        # The old cover is loaded with the post, the blob row and the cover are upserted, the blob counts updated
+        expected = [
+            ['SELECT', 'UPDATE', 'INSERT', 'INSERT', 'UPDATE'],
+            ['SELECT', 'UPDATE', 'INSERT', 'INSERT', 'UPDATE', 'UPDATE'],
+        ]
+        for name, content, expected_queries in zip(('first.gif', 'second.gif'), (GIF, GIF + b'second'), expected):
+            cover = SimpleUploadedFile(name, content, content_type='image/gif')
+            response, queries = self.patch({'website': f'https://example.com/{name}', 'cover': cover}, format='multipart')
+            self.assertEqual(queries, expected_queries)
+        self.assertEqual(BlogPostCover.objects.count(), 1)
+        cover = BlogPostCover.objects.get()
+        self.assertEqual(cover.blog_post_id, self.blog_post.id)
+        self.assertEqual(cover.image.name, blob_storage.get_blob_name(hashlib.sha256(GIF + b'second').hexdigest(), 'second.gif'))
+        self.assertTrue(default_storage.exists(cover.image.name))
+        self.assertEqual(dict(MediaBlob.objects.values_list('sha256', 'ref_count')), {
+            hashlib.sha256(GIF).hexdigest(): 0,
+            hashlib.sha256(GIF + b'second').hexdigest(): 1,
+        })
+
+
+class ExportBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.blog_posts = create_blog_posts(5, category=1)
+        self.other = create_blog_posts(1, category=2)[0]
+
+    def get_lines(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines(), response
+
+    def test_ndjson(self):
+        lines, response = self.get_lines('/blog/blogpost/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [blog_post.id for blog_post in [*self.blog_posts, self.other]])
+        self.assertEqual(
+            [author['email'] for author in rows[0]['authors']],
+            list(self.blog_posts[0].authors.order_by('id').values_list('email', flat=True)))
+
+    def test_csv_reuses_the_list_filters(self):
+        lines, response = self.get_lines('/blog/blogpost/export/?export_format=csv&category=2')
+        self.assertTrue(response['Content-Disposition'].endswith('blog_posts.csv"'))
+        rows = list(csv.DictReader(lines))
+        self.assertEqual([int(row['id']) for row in rows], [self.other.id])
+        self.assertEqual(
+            rows[0]['authors'].split(';'), list(self.other.authors.order_by('id').values_list('email', flat=True)))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/blog/blogpost/export/?export_format=xml').status_code, 400)
+
+    def test_authors_are_read_per_chunk(self):
+        with CaptureQueriesContext(connection) as context:
+            rows = list(export.iter_rows(BlogPost.objects.all(), chunk_size=2))
+        self.assertEqual(len(rows), 6)
+        # One query for the posts, then the links and the authors of each of the 3 chunks
+        self.assertEqual(len(context.captured_queries), 1 + 3 * 2)
+
+    def test_archived_merges_both_tables(self):
+        archived = create_blog_posts(2, archived=True)
+        archive.archive_blog_posts(days=7)
+        pending = create_blog_posts(1, archived=True)[0]
+        # Ties are broken by id, like the archived_posts list
+        BlogPost.objects.filter(pk=pending.pk).update(order=archived[0].order)
+        lines, response = self.get_lines('/blog/blogpost/export_archived/')
+        self.assertEqual([json.loads(line)['id'] for line in lines], [archived[0].id, pending.id, archived[1].id])
+
+    def test_command(self):
+        output = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        stdout = StringIO()
+        call_command('export_blog_posts', export_format='csv', category='1', output=output.name, stdout=stdout)
+        self.assertIn('Exported 5 blog posts', stdout.getvalue())
+        with open(output.name, encoding='utf-8', newline='') as file:
+            self.assertEqual(len(list(csv.DictReader(file))), 5)
+
+        stdout = StringIO()
+        call_command('export_blog_posts', keyword='Title', stdout=stdout)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 6)
+
+
+class ImportBlogPostsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = Author.objects.create(first_name='Known', last_name='Author', email='known@example.com')
+        self.existing = create_blog_posts(1, authors_per_post=0)[0]
+
+    def write_file(self, suffix, content):
+        file = tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False)
+        with file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def write_jsonl(self, records):
+        return self.write_file('.jsonl', ''.join(
+            (record if isinstance(record, str) else json.dumps(record)) + '\n' for record in records))
+
+    def test_jsonl(self):
+        path = self.write_jsonl([
+            {'title': 'New', 'text': 'Text', 'category': 2, 'authors': [{'email': 'KNOWN@example.com'}]},
+            {'title': self.existing.title, 'text': self.existing.text},
+            {'title': 'New', 'text': 'Text', 'authors': ['known@example.com']},
+            {'title': 'Other', 'text': 'Text', 'published': True, 'authors': ['nobody@example.com']},
+            {'text': 'No title'},
+            'not json',
+        ])
+        stdout, stderr = StringIO(), StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command('import_blog_posts', path, workers=1, chunk_size=3, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Imported 2 blog posts from 6 records: 2 already stored, 2 invalid', stdout.getvalue())
+        self.assertIn('Line 5: {"title"', stderr.getvalue())
+        self.assertIn('Line 6:', stderr.getvalue())
+        new = BlogPost.objects.get(title='New')
+        self.assertEqual(list(new.authors.all()), [self.author])
+        self.assertEqual(new.category, 2)
+        self.assertGreater(new.order, self.existing.order)
+        self.assertFalse(BlogPost.objects.get(title='Other').authors.exists())
+        self.assertEqual(counters.get_count('live'), 3)
+        self.assertEqual(counters.get_count('published'), 1)
+        # One insert per batch, the stored pairs are left out of it
+        inserts = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('INSERT') and 'INTO "blog_blogpost" ' in query['sql']
+        ]
+        self.assertEqual(len(inserts), 2)
+
+    def test_posts_written_meanwhile_are_not_taken_for_imported_ones(self):
+        path = self.write_jsonl([{'title': 'Race', 'text': 'Imported', 'authors': ['known@example.com']}])
+        bulk_create = BlogPost.objects.bulk_create
+
+        def write_meanwhile(blog_posts, *args, **kwargs):
+            # Another writer stores a post with the same title right before the batch
+            BlogPost.objects.create(title='Race', text='Live')
+            return bulk_create(blog_posts, *args, **kwargs)
+
+        with mock.patch.object(BlogPost.objects, 'bulk_create', side_effect=write_meanwhile):
+            with open(path, encoding='utf-8') as file:
+                stats, errors = imports.import_blog_posts(file, 'ndjson', workers=1)
+        self.assertEqual((stats['created'], stats['author_links']), (1, 1))
+        self.assertEqual(list(BlogPost.objects.get(text='Imported').authors.all()), [self.author])
+        self.assertFalse(BlogPost.objects.get(text='Live').authors.exists())
+        self.assertEqual(counters.get_count('live'), 3)
+
+    def test_csv_round_trip(self):
+        create_blog_posts(3, category=3)
+        output = StringIO()
+        call_command('export_blog_posts', export_format='csv', category='3', stdout=output)
+        BlogPost.objects.filter(category=3).delete()
+        path = self.write_file('.csv', output.getvalue())
+
+        with open(path, encoding='utf-8', newline='') as file:
+            stats, errors = imports.import_blog_posts(file, 'csv', workers=1)
+        self.assertEqual(errors, [])
+        self.assertEqual((stats['created'], stats['author_links']), (3, 6))
+        self.assertEqual(BlogPost.objects.filter(category=3).count(), 3)
+
+    def test_process_pool(self):
+        path = self.write_jsonl([{'title': f'Pooled {index}', 'text': 'Text'} for index in range(10)] + [{}])
+        with open(path, encoding='utf-8') as file:
+            stats, errors = imports.import_blog_posts(file, 'ndjson', chunk_size=3, workers=2)
+        self.assertEqual((stats['read'], stats['created'], stats['invalid']), (11, 10, 1))
+        self.assertEqual(errors[0][0], 11)
+
+    def test_dry_run(self):
+        path = self.write_jsonl([{'title': 'New', 'text': 'Text'}, {}])
+        stdout = StringIO()
+        call_command('import_blog_posts', path, workers=1, dry_run=True, stdout=stdout, stderr=StringIO())
+        self.assertIn('1 of 2 records are valid', stdout.getvalue())
+        self.assertEqual(BlogPost.objects.count(), 1)
+
+
+class BenchmarkTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_generate_blog_data(self):
+        stdout = StringIO()
+        options = {'users': 3, 'authors': 5, 'posts': 12, 'files': 2, 'batch_size': 5, 'stdout': stdout}
+        call_command('generate_blog_data', **options)
+        self.assertIn('Created 3 users, 5 authors, 12 blog posts, 24 author links', stdout.getvalue())
+        call_command('generate_blog_data', **{**options, 'seed': 1})
+
+        self.assertEqual(BlogPost.objects.count(), 24)
+        self.assertEqual(CustomUser.objects.count(), 6)
+        self.assertEqual(counters.get_count('total'), 24)
+        self.assertEqual(BlogPostImage.objects.count(), 24)
+        self.assertTrue(default_storage.exists(BlogPostImage.objects.first().image.name))
+        # bulk_create() stamps created_at, the generator spreads it over the year again
+        self.assertGreater(len(set(BlogPost.objects.values_list('created_at', flat=True))), 1)
+
+    def test_baseline(self):
+        baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(baseline))
+        options = {'posts': 20, 'repeat': 2, 'warmup': 0, 'scenario': ['category', 'detail'], 'baseline': baseline}
+        call_command('benchmark_blog_api', save_baseline=True, stdout=StringIO(), **options)
+        with open(baseline, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(set(results), {'list ?category=', 'detail'})
+        self.assertEqual(results['detail']['queries'], 3)
+        self.assertFalse(BlogPost.objects.exists())
+
+        # Generous tolerance, only the query counts are compared for real here
+        stdout = StringIO()
+        call_command('benchmark_blog_api', tolerance=100, stdout=stdout, **options)
+        self.assertIn('No regressions', stdout.getvalue())
+
+        results['detail']['queries'] -= 1
+        with open(baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file)
+        stderr = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            call_command('benchmark_blog_api', tolerance=100, stdout=StringIO(), stderr=stderr, **options)
+        self.assertIn('detail: 3 queries, was 2', stderr.getvalue())
+
+    def test_compare_with_baseline_ignores_noise(self):
+        baseline = {'list': {'p95_ms': 1.0, 'queries': 2, 'peak_kb': 50.0}}
+        noisy = {'list': {'p95_ms': 2.5, 'queries': 2, 'peak_kb': 100.0}}
+        self.assertEqual(benchmarks.compare_with_baseline(noisy, baseline), [])
+        slower = {'list': {'p95_ms': 10.0, 'queries': 2, 'peak_kb': 500.0}}
+        self.assertEqual(len(benchmarks.compare_with_baseline(slower, baseline)), 2)
+
+
+@override_settings(BLOG_REQUEST_INSTRUMENTATION=True)
+class RequestInstrumentationTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset_report()
+        self.addCleanup(instrumentation.reset_report)
+        create_blog_posts(3)
+
+    def get_report(self):
+        return {item['view']: item for item in instrumentation.get_report()}
+
+    def test_server_timing_and_report(self):
+        response = self.client.get('/blog/blogpost/')
+        self.client.get('/blog/blogpost/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="2 queries, 0 duplicated", serialize;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$')
+
+        report = self.get_report()
+        self.assertEqual(report['BlogPostViewSet.list']['requests'], 2)
+        # The second response comes from the response cache
+        self.assertEqual(report['BlogPostViewSet.list']['max_queries'], 2)
+        self.assertEqual(report['BlogPostViewSet.list']['avg_bytes'], len(response.content))
+
+    def test_actions_are_named(self):
+        user = CustomUser.objects.create_user(email='staff@example.com', password='password', is_staff=True)
+        self.client.force_authenticate(user)
+        blog_post = BlogPost.objects.first()
+        self.client.post(f'/blog/blogpost/{blog_post.id}/publish/')
+        self.client.get('/blog/missing/')
+        self.assertIn('BlogPostViewSet.publish', self.get_report())
+        self.assertIn('404 GET', self.get_report())
+
+    def test_duplicated_queries(self):
+        with instrumentation.collect() as metrics:
+            list(BlogPost.objects.filter(pk=1))
+            list(BlogPost.objects.filter(pk=1))
+            list(BlogPost.objects.filter(pk=2))
+        self.assertEqual((metrics.queries, metrics.duplicated_queries), (3, 1))
+
+    def test_report_endpoint_is_staff_only(self):
+        self.client.get('/blog/blogpost/')
+        user = CustomUser.objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get('/blog/instrumentation_report/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/blog/instrumentation_report/')
+        self.assertTrue(response.data['enabled'])
+        self.assertIn('BlogPostViewSet.list', [item['view'] for item in response.data['views']])
+        self.assertEqual(self.client.delete('/blog/instrumentation_report/').status_code, 204)
+        self.assertNotIn('BlogPostViewSet.list', self.get_report())
+
+    @override_settings(BLOG_REQUEST_INSTRUMENTATION=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestInstrumentationMiddleware(lambda request: None)
+        self.assertFalse(self.client.get('/blog/blogpost/').has_header('Server-Timing'))
+
+
+def create_image_file(name, size=(2000, 1000), mode='RGB', color='red', image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new(mode, size, color).save(buffer, image_format)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+class ImageVariantsTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.blog_post = create_blog_posts(1)[0]
+
+    def create_cover(self, **kwargs):
+        return BlogPostCover.objects.create(
+            blog_post=self.blog_post, image=create_image_file('blog_post_covers/cover.jpg', **kwargs))
+
+    def test_render_variants(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(buffer, 'JPEG', exif=exif)
+
+        rendered = images.render_variants(buffer.getvalue())
+        # The EXIF orientation is applied, the aspect ratio kept
+        sizes = {variant: (files['width'], files['height']) for variant, files in rendered.items()}
+        self.assertEqual(sizes, {'full': (800, 1600), 'card': (160, 320), 'thumbnail': (80, 160)})
+        for files in rendered.values():
+            for image_format, pillow_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with Image.open(BytesIO(files[image_format])) as image:
+                    self.assertEqual(image.format, pillow_format)
+                    self.assertEqual(image.size, (files['width'], files['height']))
+                    self.assertFalse(image.getexif())
+                    self.assertNotIn('icc_profile', image.info)
+
+    def test_small_and_transparent_images(self):
+        name = create_image_file(
+            'blog_post_images/small.png', size=(100, 50), mode='RGBA', color=(255, 0, 0, 128), image_format='PNG')
+        with default_storage.open(name, 'rb') as file:
+            rendered = images.render_variants(file.read())
+        # Never upscaled
+        self.assertEqual({(files['width'], files['height']) for files in rendered.values()}, {(100, 50)})
+        with Image.open(BytesIO(rendered['card']['webp'])) as image:
+            self.assertEqual(image.mode, 'RGBA')
+        with Image.open(BytesIO(rendered['card']['jpeg'])) as image:
+            self.assertEqual(image.mode, 'RGB')
+
+    def get_scheduled(self, callbacks):
+        return [
+            callback.args for callback in callbacks
+            if getattr(callback, 'func', None) == generate_image_variants.delay
+        ]
+
+    def test_saving_schedules_generation(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            cover = self.create_cover()
+        self.assertEqual(self.get_scheduled(callbacks), [('blog.BlogPostCover', cover.pk)])
+
+        # The cover upserted by an update has no post_save
+        user = CustomUser.objects.create_user(email='writer@example.com', password='password')
+        BlogPost.objects.filter(pk=self.blog_post.pk).update(owner=user)
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(
+                f'/blog/blogpost/{self.blog_post.id}/',
+                {'cover': SimpleUploadedFile('new.gif', GIF, content_type='image/gif')}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_scheduled(callbacks), [('blog.BlogPostCover', cover.pk)])
+
+    def test_replaced_cover_drops_its_variants(self):
+        cover = self.create_cover()
+        names = images.get_variant_names(images.generate_variants(BlogPostCover, cover.pk))
+        user = CustomUser.objects.create_user(email='writer@example.com', password='password')
+        BlogPost.objects.filter(pk=self.blog_post.pk).update(owner=user)
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(
+                f'/blog/blogpost/{self.blog_post.id}/',
+                {'cover': SimpleUploadedFile('new.gif', GIF, content_type='image/gif')}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BlogPostCover.objects.get(pk=cover.pk).variants, {})
+
+        for callback in callbacks:
+            if getattr(callback, 'func', None) == images.delete_variant_files:
+                callback()
+        for name in names:
+            self.assertFalse(default_storage.exists(name), name)
+
+    def test_generate_records_variants_and_replaces_old_files(self):
+        cover = self.create_cover()
+        variants = images.generate_variants(BlogPostCover, cover.pk)
+        cover.refresh_from_db()
+        self.assertEqual(cover.variants, variants)
+        self.assertEqual(set(variants), {'thumbnail', 'card', 'full'})
+        old_names = images.get_variant_names(variants)
+        self.assertEqual(len(old_names), 6)
+        for name in old_names:
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertTrue(variants['thumbnail']['webp'].startswith('blog_post_covers/variants/cover'))
+
+        new_variants = images.generate_variants(BlogPostCover, cover.pk)
+        for name in old_names - images.get_variant_names(new_variants):
+            self.assertFalse(default_storage.exists(name), name)
+
+    def test_replaced_image_keeps_no_stale_files(self):
+        cover = self.create_cover()
+        row = BlogPostCover.objects.filter(pk=cover.pk).values(*images.ROW_FIELDS).get()
+        rendered = images.render_file(row['image'])
+        BlogPostCover.objects.filter(pk=cover.pk).update(image='blog_post_covers/other.jpg')
+        self.assertIsNone(images.store_variants(BlogPostCover, row, rendered))
+        self.assertEqual(default_storage.listdir('blog_post_covers/variants')[1], [])
+        self.assertEqual(BlogPostCover.objects.get(pk=cover.pk).variants, {})
+
+    def test_serializers_expose_variant_urls(self):
+        cover = self.create_cover()
+        image = BlogPostImage.objects.create(
+            blog_post=self.blog_post, image=create_image_file('blog_post_images/image.png', image_format='PNG'))
+        images.generate_variants(BlogPostCover, cover.pk)
+        images.generate_variants(BlogPostImage, image.pk)
+
+        detail = self.client.get(f'/blog/blogpost/{self.blog_post.id}/?expand=cover,images').data
+        self.assertEqual(detail['cover']['variants']['card']['width'], 480)
+        self.assertTrue(detail['cover']['variants']['card']['webp'].startswith('http://testserver/media/'))
+        self.assertEqual(len(detail['images']), 1)
+        self.assertTrue(detail['images'][0]['variants']['thumbnail']['jpeg'].endswith('.jpg'))
+
+        url = '/blog/blogpost/?fields=id,cover&expand=cover'
+        fast = self.client.get(url)
+        self.assertEqual(fast.data['results']['paginated_results'][0]['cover'], detail['cover'])
+        cache.clear()
+        with override_settings(BLOG_POST_FAST_LIST_SERIALIZER=False):
+            regular = self.client.get(url)
+        self.assertEqual(fast.content, regular.content)
+
+    def test_command_generates_missing_variants(self):
+        done = self.create_cover()
+        images.generate_variants(BlogPostCover, done.pk)
+        pending = BlogPostImage.objects.create(
+            blog_post=self.blog_post, image=create_image_file('blog_post_images/image.jpg'))
+        broken = BlogPostImage.objects.create(
+            blog_post=self.blog_post, image=default_storage.save('blog_post_images/broken.jpg', ContentFile(b'no')))
+
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertIn('Generated the variants of 1 images, 1 could not be read', out.getvalue())
+        self.assertTrue(BlogPostImage.objects.get(pk=pending.pk).variants)
+        self.assertEqual(BlogPostImage.objects.get(pk=broken.pk).variants, {})
+
+    def test_archive_and_purge_keep_track_of_variant_files(self):
+        cover = self.create_cover()
+        names = images.get_variant_names(images.generate_variants(BlogPostCover, cover.pk))
+        self.blog_post.archived = True
+        self.blog_post.save()
+        archive.archive_blog_posts()
+        archived = ArchivedBlogPost.objects.get(pk=self.blog_post.pk)
+        self.assertEqual(images.get_variant_names(archived.cover_variants), names)
+
+        ArchivedBlogPost.objects.filter(pk=archived.pk).update(deleted=True, deleted_at=timezone.now() - timedelta(days=40))
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.purge_deleted_blog_posts(days=30, pause=0)
+        for name in names:
+            self.assertFalse(default_storage.exists(name), name)
+
+    def create_blob_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'blue').save(buffer, 'JPEG')
+        return BlogPostImage.objects.create(
+            blog_post=self.blog_post, image=SimpleUploadedFile('image.jpg', buffer.getvalue()))
+
+    def test_same_blob_shares_its_variants(self):
+        first, second = self.create_blob_image(), self.create_blob_image()
+        variants = images.generate_variants(BlogPostImage, first.pk)
+        names = images.get_variant_names(variants)
+        sha256 = posixpath.splitext(posixpath.basename(first.image.name))[0]
+        self.assertEqual(
+            names, {f'blobs/{sha256[:2]}/{sha256[2:4]}/variants/{sha256}-{variant}.{extension}'
+                    for variant in ('full', 'card', 'thumbnail') for extension in ('webp', 'jpg')})
+
+        # Not rendered again, the source isn't even read
+        source = blob_storage.path(first.image.name)
+        os.rename(source, f'{source}.moved')
+        self.assertEqual(images.generate_variants(BlogPostImage, second.pk), variants)
+        os.rename(f'{source}.moved', source)
+
+        # Deleting one of the rows keeps the shared files, the blob takes them along
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.purge_blog_posts(BlogPost.objects.filter(pk=self.blog_post.pk))
+        for name in names:
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertEqual(jobs.collect_media_garbage(hours=0), 1)
+        self.assertEqual(default_storage.listdir(posixpath.dirname(next(iter(names)))), ([], []))
+
+    def test_command_renders_every_blob_once(self):
+        self.create_blob_image()
+        self.create_blob_image()
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertIn('Generated the variants of 1 images', out.getvalue())
+        self.assertIn('1 reused the variants of the same file', out.getvalue())
+        first, second = BlogPostImage.objects.order_by('pk').values_list('variants', flat=True)
+        self.assertEqual(first, second)
+
+
+class StreamedCoverUploadTests(BlogAPITestCase):
+    boundary = 'cover-upload-boundary'
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, FILE_UPLOAD_TEMP_DIR=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password')
+        self.blog_post = create_blog_posts(1, owner=self.user)[0]
+        self.url = f'/blog/blogpost/{self.blog_post.id}/create_blog_post_cover/'
+        self.view = BlogPostViewSet.as_view({'post': 'create_blog_post_cover'})
+
+    def write_body(self, size):
+        """A multipart body on disk holding a JPEG padded to size bytes, returns (path, sha256 of the JPEG)."""
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, 'JPEG')
+        digest = hashlib.sha256()
+        path = os.path.join(self.media_root, f'body-{size}')
+        with open(path, 'wb') as body:
+            body.write(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="image"; filename="cover.jpg"\r\n'
+                f'Content-Type: image/jpeg\r\n\r\n'.encode())
+            # Bytes after the JPEG end marker are ignored by decoders
+            chunks = [buffer.getvalue()]
+            remaining = size - len(chunks[0])
+            while remaining > 0:
+                chunks.append(b'\0' * min(remaining, 2 ** 20))
+                remaining -= len(chunks[-1])
+            for chunk in chunks:
+                digest.update(chunk)
+                body.write(chunk)
+            body.write(f'\r\n--{self.boundary}--\r\n'.encode())
+        return path, digest.hexdigest()
+
+    def post_body(self, path):
+        """Posts the body straight from disk, like a WSGI server streaming the socket."""
+        with open(path, 'rb') as body:
+            environ = RequestFactory()._base_environ(
+                PATH_INFO=self.url,
+                REQUEST_METHOD='POST',
+                CONTENT_TYPE=f'multipart/form-data; boundary={self.boundary}',
+                CONTENT_LENGTH=str(os.path.getsize(path)),
+                **{'wsgi.input': body},
+            )
+            request = WSGIRequest(environ)
+            force_authenticate(request, self.user)
+            tracemalloc.start()
+            try:
+                response = self.view(request, pk=self.blog_post.pk)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                # The handler would close the uploads after the response
+                request.close()
+        return response, peak
+
+    def test_peak_memory_is_independent_of_file_size(self):
+        peaks = {}
+        # The first request also loads modules and fills caches. Every size is posted twice and the
+        # lower peak kept, one-off growth of interpreter tables (interned strings) lands in either.
+        for size in (4 * 2 ** 20, 4 * 2 ** 20, 4 * 2 ** 20, 32 * 2 ** 20, 32 * 2 ** 20):
+            path, sha256 = self.write_body(size)
+            with self.captureOnCommitCallbacks() as callbacks:
+                response, peak = self.post_body(path)
+            peaks[size] = min(peak, peaks.get(size, peak))
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data['sha256'], sha256)
+            self.assertEqual(len(callbacks), 1)
+            stored = callbacks[0].keywords['image_url']
+            self.assertEqual(default_storage.size(stored), size)
+        # Well below even the smaller file, and not growing with the size
+        self.assertLess(max(peaks.values()), 2 ** 20, peaks)
+        self.assertLess(abs(peaks[32 * 2 ** 20] - peaks[4 * 2 ** 20]), 256 * 2 ** 10, peaks)
+
+    def test_small_uploads_are_hashed_in_memory(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            self.url, {'image': SimpleUploadedFile('cover.gif', GIF, content_type='image/gif')}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(GIF).hexdigest())
+
+    def test_images_are_validated_from_the_header(self):
+        self.client.force_authenticate(self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, 'BMP')
+        for name, content in (('cover.txt', b'not an image'), ('cover.bmp', buffer.getvalue())):
+            response = self.client.post(
+                self.url, {'image': SimpleUploadedFile(name, content)}, format='multipart')
+            self.assertEqual(response.status_code, 400, name)
+            self.assertIn('image', response.data)
+
+
+class MediaBlobTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password')
+        self.first, self.second = create_blog_posts(2, authors_per_post=0, owner=self.user)
+
+    def get_ref_count(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def test_same_content_is_stored_once(self):
+        for blog_post in (self.first, self.second):
+            BlogPostCover.objects.create(blog_post=blog_post, image=SimpleUploadedFile('cover.gif', GIF))
+        names = set(BlogPostCover.objects.values_list('image', flat=True))
+        self.assertEqual(names, {blob_storage.get_blob_name(hashlib.sha256(GIF).hexdigest(), 'cover.gif')})
+        name = names.pop()
+        self.assertTrue(blobs.is_blob(name))
+        self.assertEqual(os.listdir(os.path.dirname(blob_storage.path(name))), [os.path.basename(name)])
+        blob = MediaBlob.objects.get()
+        self.assertEqual((blob.name, blob.size, blob.ref_count), (name, len(GIF), 2))
+
+    def test_replacing_and_deleting_release_the_blob(self):
+        cover = BlogPostCover.objects.create(blog_post=self.first, image=SimpleUploadedFile('cover.gif', GIF))
+        old_name = cover.image.name
+        cover.image = SimpleUploadedFile('cover.gif', GIF + b'new')
+        cover.save()
+        self.assertEqual(self.get_ref_count(old_name), 0)
+        self.assertEqual(self.get_ref_count(cover.image.name), 1)
+        cover.delete()
+        self.assertEqual(self.get_ref_count(cover.image.name), 0)
+
+    def test_archive_keeps_and_purge_releases_the_references(self):
+        self.first.document = SimpleUploadedFile('document.txt', b'document')
+        self.first.save()
+        name = self.first.document.name
+        BlogPostImage.objects.create(blog_post=self.first, image=SimpleUploadedFile('image.gif', GIF))
+        BlogPostImage.objects.create(blog_post=self.second, image=SimpleUploadedFile('image.gif', GIF))
+        image_name = self.second.images.get().image.name
+        self.assertEqual(self.get_ref_count(image_name), 2)
+
+        counters.update_blog_posts(
+            BlogPost.objects.filter(pk=self.first.pk), deleted=True, deleted_at=timezone.now() - timedelta(days=40))
+        archive.archive_blog_posts(days=7)
+        self.assertTrue(ArchivedBlogPost.objects.filter(pk=self.first.pk).exists())
+        self.assertEqual(self.get_ref_count(name), 1)
+        self.assertEqual(self.get_ref_count(image_name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.purge_deleted_blog_posts(days=30, pause=0)
+        self.assertEqual(self.get_ref_count(name), 0)
+        self.assertEqual(self.get_ref_count(image_name), 1)
+        # Unreferenced blobs are left alone for the grace period
+        self.assertEqual(jobs.collect_media_garbage(), 0)
+        self.assertTrue(default_storage.exists(name))
+
+        self.assertEqual(jobs.collect_media_garbage(hours=0), 1)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertTrue(default_storage.exists(image_name))
+
+    def test_garbage_collection_recounts_before_deleting(self):
+        cover = BlogPostCover.objects.create(blog_post=self.first, image=SimpleUploadedFile('cover.gif', GIF))
+        MediaBlob.objects.update(ref_count=0)
+        self.assertEqual(jobs.collect_media_garbage(hours=0), 0)
+        self.assertTrue(default_storage.exists(cover.image.name))
+        self.assertEqual(self.get_ref_count(cover.image.name), 1)
+
+    def test_upload_writes_a_missing_blob_file_again(self):
+        name = blob_storage.save('cover.gif', SimpleUploadedFile('cover.gif', GIF))
+        default_storage.delete(name)
+        self.assertEqual(blob_storage.save('cover.gif', SimpleUploadedFile('cover.gif', GIF)), name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_reconcile(self):
+        cover = BlogPostCover.objects.create(blog_post=self.first, image=SimpleUploadedFile('cover.gif', GIF))
+        MediaBlob.objects.update(ref_count=5)
+        self.assertEqual(blobs.reconcile(), 1)
+        self.assertEqual(self.get_ref_count(cover.image.name), 1)
+        self.assertEqual(blobs.reconcile(), 0)
+
+    def test_variants_are_not_blobs(self):
+        name = blob_storage.get_blob_name(hashlib.sha256(GIF).hexdigest(), 'cover.gif')
+        self.assertFalse(blobs.is_blob(images.get_variant_name(name, 'thumbnail', 'webp')))
+        self.assertFalse(blobs.is_blob('blog_post_covers/cover.gif'))
+
+
+class DocumentUploadSessionTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, BLOG_DOCUMENT_UPLOAD_DIR=os.path.join(media_root, 'document_uploads'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.blog_post = create_blog_posts(1, authors_per_post=0, owner=self.user)[0]
+        self.url = f'/blog/blogpost/{self.blog_post.id}/document_uploads/'
+        self.content = os.urandom(300 * 2 ** 10)
+
+    def start(self, size=None):
+        response = self.client.post(
+            self.url, {'filename': '../report.pdf', 'size': size or len(self.content)}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put(self, upload_id, start, end, body=None):
+        return self.client.put(
+            f'{self.url}{upload_id}/', self.content[start:end] if body is None else body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.content)}',
+        )
+
+    def test_chunks_in_any_order_are_assembled_and_attached(self):
+        session = self.start()
+        self.assertEqual(session['filename'], 'report.pdf')
+        self.assertEqual(session['missing'], [[0, len(self.content)]])
+        for start, end in ((200 * 2 ** 10, len(self.content)), (0, 100 * 2 ** 10)):
+            response = self.put(session['id'], start, end)
+            self.assertEqual(response.status_code, 200, response.data)
+
+        # Resuming starts from the status
+        response = self.client.get(f"{self.url}{session['id']}/")
+        self.assertEqual(response.data['missing'], [[100 * 2 ** 10, 200 * 2 ** 10]])
+        finalize_url = f"{self.url}{session['id']}/finalize/"
+        response = self.client.post(finalize_url, {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing'], [f'bytes {100 * 2 ** 10}-{200 * 2 ** 10 - 1}'])
+
+        self.assertEqual(self.put(session['id'], 100 * 2 ** 10, 200 * 2 ** 10).data['missing'], [])
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(finalize_url, {'sha256': sha256}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['sha256'], sha256)
+
+        self.blog_post.refresh_from_db()
+        name = self.blog_post.document.name
+        self.assertEqual(name, blob_storage.get_blob_name(sha256, 'report.pdf'))
+        self.assertTrue(response.data['document'].endswith(name))
+        with self.blog_post.document.open('rb') as document:
+            self.assertEqual(document.read(), self.content)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertFalse(DocumentUploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.BLOG_DOCUMENT_UPLOAD_DIR), [])
+
+    def test_invalid_chunks_record_nothing(self):
+        session = self.start()
+        chunk_url = f"{self.url}{session['id']}/"
+        for headers in ({}, {'HTTP_CONTENT_RANGE': 'bytes 0-9/10'}, {'HTTP_CONTENT_RANGE': 'bytes 5-2/*'}):
+            response = self.client.put(chunk_url, b'x' * 10, content_type='application/octet-stream', **headers)
+            self.assertEqual(response.status_code, 400, headers)
+        # A body shorter than its range, like a dropped connection
+        self.assertEqual(self.put(session['id'], 0, 1000, body=b'x' * 10).status_code, 400)
+        self.assertEqual(DocumentUploadSession.objects.get().received, [])
+
+    def test_checksum_mismatch_keeps_the_session(self):
+        session = self.start()
+        self.put(session['id'], 0, len(self.content))
+        response = self.client.post(f"{self.url}{session['id']}/finalize/", {'sha256': '0' * 64}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sha256', response.data)
+        self.assertTrue(DocumentUploadSession.objects.exists())
+        self.blog_post.refresh_from_db()
+        self.assertFalse(self.blog_post.document)
+
+    def test_sessions_are_private_to_the_uploader(self):
+        session = self.start()
+        other = CustomUser.objects.create_user(email='other@example.com', password='password')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"{self.url}{session['id']}/").status_code, 404)
+        self.assertEqual(self.put(session['id'], 0, 10).status_code, 403)
+
+    def test_size_is_limited(self):
+        with override_settings(BLOG_DOCUMENT_UPLOAD_MAX_SIZE=1000):
+            response = self.client.post(self.url, {'filename': 'big.pdf', 'size': 1001}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('size', response.data)
+
+    def test_expired_sessions_are_deleted_with_their_files(self):
+        expired, active = self.start(), self.start()
+        DocumentUploadSession.objects.filter(pk=expired['id']).update(expires_at=timezone.now() - timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(upload_sessions.delete_expired_document_uploads(), 1)
+        self.assertEqual(list(DocumentUploadSession.objects.values_list('id', flat=True)), [active['id']])
+        self.assertEqual(
+            os.listdir(settings.BLOG_DOCUMENT_UPLOAD_DIR), [f"{active['id']}.part"])
+
+
+class MediaServingTests(BlogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, BLOG_MEDIA_OFFLOAD=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='password')
+        self.blog_post = create_blog_posts(1, authors_per_post=0, owner=self.user)[0]
+        self.content = bytes(range(256)) * 40
+        self.blog_post.document = SimpleUploadedFile('report.pdf', self.content)
+        self.blog_post.save()
+        self.url = f'/blog/blogpost/{self.blog_post.id}/document/'
+        self.etag = f'"{hashlib.sha256(self.content).hexdigest()}"'
+
+    def get(self, url=None, **headers):
+        self.client.force_authenticate(self.user)
+        return self.client.get(url or self.url, **headers)
+
+    def test_document_needs_a_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        response = self.get(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        # A changed file is sent whole
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_revalidation(self):
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_offloaded_to_the_proxy(self):
+        name = self.blog_post.document.name
+        with override_settings(BLOG_MEDIA_OFFLOAD='x-accel-redirect', BLOG_MEDIA_ACCEL_REDIRECT_PREFIX='/protected/'):
+            response = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{name}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], self.etag)
+
+        with override_settings(BLOG_MEDIA_OFFLOAD='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.blog_post.document.path)
+        self.assertEqual(response.content, b'')
+
+    def test_cover_image_and_variants_are_public(self):
+        cover = BlogPostCover.objects.create(
+            blog_post=self.blog_post, image=SimpleUploadedFile('cover.gif', GIF),
+            variants={'thumbnail': {
+                'webp': default_storage.save('blog_post_covers/variants/c.webp', ContentFile(b'w')),
+                'jpeg': default_storage.save('blog_post_covers/variants/c.jpg', ContentFile(b'j')),
+            }})
+        image = BlogPostImage.objects.create(blog_post=self.blog_post, image=SimpleUploadedFile('image.gif', GIF))
+        url = f'/blog/blogpost/{self.blog_post.id}/'
+
+        response = self.client.get(f'{url}cover/', HTTP_ACCEPT='image/webp,image/*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), GIF)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        response = self.client.get(f'{url}cover/?variant=thumbnail')
+        self.assertEqual(b''.join(response.streaming_content), b'w')
+        response = self.client.get(f'{url}cover/?variant=thumbnail&variant_format=jpeg', HTTP_ACCEPT='image/*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(b''.join(response.streaming_content), b'j')
+        self.assertEqual(self.client.get(f'{url}cover/?variant=card').status_code, 404)
+        self.assertEqual(self.client.get(f'{url}cover/?variant=thumbnail&variant_format=width').status_code, 400)
+        response = self.client.get(f'{url}images/{image.id}/')
+        self.assertEqual(b''.join(response.streaming_content), GIF)
+
+        cover.delete()
+        self.assertEqual(self.client.get(f'{url}cover/', HTTP_ACCEPT='image/webp').status_code, 404)
+        self.assertEqual(self.client.get(f'{url}images/{image.id + 1}/').status_code, 404)
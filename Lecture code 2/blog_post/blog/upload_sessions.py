@@ -0,0 +1,179 @@
+"""
+Resumable, chunked uploads of BlogPost.document.
+
+A client creates a session with the file name and size, PUTs byte ranges
+of the file in any order and as often as it needs to, then finalizes:
+
+    POST   /blog/blogpost/<id>/document_uploads/                {"filename", "size"}
+    PUT    /blog/blogpost/<id>/document_uploads/<upload id>/    Content-Range: bytes 0-1048575/4194304
+    GET    /blog/blogpost/<id>/document_uploads/<upload id>/    received and missing ranges
+    POST   /blog/blogpost/<id>/document_uploads/<upload id>/finalize/   {"sha256"} (optional)
+
+Every chunk is copied from the request stream straight to its offset in
+one file under settings.BLOG_DOCUMENT_UPLOAD_DIR, a chunk at a time. The
+session records the ranges that were written completely, so a dropped
+request is simply sent again. Finalizing hashes the assembled file once,
+moves it into the document field's storage and points the post at it.
+
+Sessions expire BLOG_DOCUMENT_UPLOAD_EXPIRY_HOURS after their last chunk,
+delete_expired_document_uploads() removes them. However a session is
+deleted, post_delete removes its partial file once the transaction commits.
+"""
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions, serializers
+
+from blog.jobs import CHUNK_SIZE, run_in_chunks
+from blog.models import BlogPost, DocumentUploadSession
+from blog.uploads import get_sha256
+
+EXPIRED_UPLOADS_JOB = 'delete_expired_document_uploads'
+# Bytes copied from the request to the file at a time
+COPY_CHUNK_SIZE = 64 * 2 ** 10
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class AssembledFile(File):
+    # Storages move a file that has a temporary_file_path() instead of copying it
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_path(session):
+    return os.path.join(settings.BLOG_DOCUMENT_UPLOAD_DIR, f'{session.pk}.part')
+
+
+def get_expires_at():
+    return timezone.now() + timedelta(hours=settings.BLOG_DOCUMENT_UPLOAD_EXPIRY_HOURS)
+
+
+def create_session(blog_post, owner, filename, size):
+    session = DocumentUploadSession.objects.create(
+        blog_post=blog_post, owner=owner, filename=filename, size=size, expires_at=get_expires_at())
+    os.makedirs(settings.BLOG_DOCUMENT_UPLOAD_DIR, exist_ok=True)
+    # Sparse where the filesystem allows it, chunks are written in place
+    with open(get_path(session), 'wb') as file:
+        file.truncate(size)
+    return session
+
+
+def add_range(ranges, start, end):
+    """ranges with [start, end) added, sorted and with touching ranges merged."""
+    merged = []
+    for range_start, range_end in sorted([*ranges, [start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def get_missing(ranges, size):
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+def parse_content_range(header, size):
+    """(start, end) of a `bytes <first>-<last>/<size>` header, end exclusive."""
+    match = CONTENT_RANGE.match(header or '')
+    if match is None:
+        raise serializers.ValidationError({'Content-Range': ['Expected "bytes <first>-<last>/<size>".']})
+    first, last, total = (int(value) for value in match.groups())
+    if total != size:
+        raise serializers.ValidationError({'Content-Range': [f'The upload is {size} bytes, not {total}.']})
+    if first > last or last >= size:
+        raise serializers.ValidationError({'Content-Range': [f'Bytes {first}-{last} are outside of the upload.']})
+    return first, last + 1
+
+
+def write_chunk(session, start, end, stream):
+    """
+    Copies end - start bytes of stream to their place in the upload and
+    records the range. A short body records nothing and can be sent again.
+    """
+    remaining = end - start
+    try:
+        file = open(get_path(session), 'r+b')
+    except FileNotFoundError:
+        # Finalized or deleted since the session was read
+        raise exceptions.NotFound()
+    with file:
+        file.seek(start)
+        while remaining:
+            chunk = stream.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                break
+            file.write(chunk)
+            remaining -= len(chunk)
+    if remaining or stream.read(1):
+        raise serializers.ValidationError({'Content-Range': [f'Expected a body of exactly {end - start} bytes.']})
+
+    with transaction.atomic():
+        # Chunks may arrive in parallel, the ranges are merged under the row lock
+        session = DocumentUploadSession.objects.select_for_update().get(pk=session.pk)
+        session.received = add_range(session.received, start, end)
+        session.expires_at = get_expires_at()
+        session.save(update_fields=['received', 'expires_at', 'updated_at'])
+    return session
+
+
+def finalize_session(session, blog_post, sha256=None):
+    """
+    Attaches the assembled upload to blog_post as its document and ends the
+    session. sha256, when given, must match the assembled file. Returns
+    (storage name, sha256).
+    """
+    missing = get_missing(session.received, session.size)
+    if missing:
+        raise serializers.ValidationError({'missing': [f'bytes {start}-{end - 1}' for start, end in missing]})
+    field = BlogPost._meta.get_field('document')
+    with AssembledFile(open(get_path(session), 'rb'), name=session.filename) as file:
+        # Read once, the chunks arrived in any order
+        digest = get_sha256(file)
+        if sha256 is not None and sha256.lower() != digest:
+            raise serializers.ValidationError({'sha256': [f'The assembled file has SHA-256 {digest}.']})
+        with transaction.atomic():
+            # Also removes what is left of the file, when the storage already held the content
+            if not DocumentUploadSession.objects.filter(pk=session.pk).delete()[0]:
+                raise exceptions.NotFound()
+            name = field.storage.save(field.generate_filename(blog_post, session.filename), file)
+            blog_post.document = name
+            blog_post.save(update_fields=['document', 'updated_at'])
+    return name, digest
+
+
+def delete_partial_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Moved into the storage, or never created
+            pass
+        except OSError as error:
+            print(f"Could not delete {path}: {error}")
+
+
+def delete_expired_document_uploads(chunk_size=CHUNK_SIZE, dry_run=False, restart=False, progress=None):
+    """Deletes the expired upload sessions with their partial files, returns how many were deleted."""
+    return run_in_chunks(
+        EXPIRED_UPLOADS_JOB,
+        DocumentUploadSession.objects.filter(expires_at__lt=timezone.now()),
+        lambda chunk: chunk.delete()[0],
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        restart=restart,
+        progress=progress,
+    )
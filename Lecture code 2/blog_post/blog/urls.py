@@ -7,7 +7,8 @@ from blog.views import (
     BlogPostUpdateViewSet,
     BlogPostDeleteViewSet,
     BlogPostViewSet,
-    AuthorViewSet
+    AuthorViewSet,
+    InstrumentationReportView
 )
 
 router = DefaultRouter()
@@ -21,5 +22,6 @@ router.register(r'author', AuthorViewSet, basename='author')
 
 
 urlpatterns = [
+    path('instrumentation_report/', InstrumentationReportView.as_view(), name='instrumentation_report'),
     path('', include(router.urls) )
 ]
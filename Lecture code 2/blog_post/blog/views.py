@@ -1,33 +1,63 @@
-from django.core.files.base import ContentFile
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from blog import counters, instrumentation, media, upload_sessions
+from blog.archive import restore_blog_posts
+from blog.bulk import bulk_create_blog_posts, bulk_delete_blog_posts, bulk_update_blog_posts
+from blog.export import export_response, iter_archived_rows, iter_rows
+from blog.reorder import move_blog_post
+from blog.cache import cache_response, conditional_response
 from blog.filtersets import BlogPostFilter
-from blog.models import BlogPost, Author
-from blog.pagination import BlogPostPagination
+from blog.mixins import EagerLoadingViewSetMixin
+from blog.models import ArchivedBlogPost, BlogPost, BlogPostCover, BlogPostImage, Author, DocumentUploadSession
+from blog.pagination import BlogPostPagination, BlogPostKeysetPagination
 from blog.permissions import ReadOnlyOrAdmin, ReadOnlyOrIsOwnerOrAdmin
 from blog.serializers import (
+    ArchivedBlogPostSerializer,
     BlogPostListSerializer,
+    BlogPostListValuesSerializer,
     BlogPostDetailSerializer,
     BlogPostCreateUpdateSerializer,
+    BlogPostBulkSerializer,
+    BlogPostBulkDeleteSerializer,
+    BlogPostExportSerializer,
     AuthorSerializer,
     BlogPostReorderSerializer,
+    BlogPostMoveSerializer,
+    BlogPostRestoreSerializer,
     BlogPostSendEmailSerializer,
-    BlogPostCoverSerializer
+    BlogPostCoverUploadSerializer,
+    BlogPostImageVariantSerializer,
+    DocumentUploadSessionSerializer,
+    DocumentUploadFinalizeSerializer,
 )
 from blog.tasks import (
     delete_inactive_blog_posts,
     reorder_blog_posts,
+    rebalance_blog_posts,
     send_blog_post_to_email,
     create_blog_post_cover
 )
+from blog.uploads import get_sha256
 
-class BlogPostListViewSet(mixins.ListModelMixin,
+class BlogPostListViewSet(EagerLoadingViewSetMixin,
+                          mixins.ListModelMixin,
                          viewsets.GenericViewSet):
     queryset = BlogPost.objects.filter(deleted=False)
     serializer_class = BlogPostListSerializer
@@ -36,15 +66,21 @@ class BlogPostListViewSet(mixins.ListModelMixin,
     permission_classes = [ReadOnlyOrAdmin]
 
 
-class BlogPostDetailViewSet(mixins.RetrieveModelMixin,
+class BlogPostDetailViewSet(EagerLoadingViewSetMixin,
+                            mixins.RetrieveModelMixin,
                             viewsets.GenericViewSet):
     queryset = BlogPost.objects.filter(deleted=False)
     serializer_class = BlogPostDetailSerializer
 
+    @conditional_response(detail=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class BlogPostUpdateViewSet(mixins.UpdateModelMixin,
                             viewsets.GenericViewSet):
-    queryset = BlogPost.objects.filter(deleted=False)
+    # The cover upsert replaces the loaded cover, see BlogPostCreateUpdateSerializer.update()
+    queryset = BlogPost.objects.filter(deleted=False).select_related('cover')
     serializer_class = BlogPostCreateUpdateSerializer
 
 
@@ -60,14 +96,19 @@ class  BlogPostDeleteViewSet(mixins.DestroyModelMixin,
     serializer_class = BlogPostListSerializer
 
 
-class BlogPostViewSet(ModelViewSet):
+class BlogPostViewSet(EagerLoadingViewSetMixin, ModelViewSet):
     queryset = BlogPost.objects.filter(deleted=False)
     filterset_class = BlogPostFilter
+    pagination_class = BlogPostKeysetPagination
+    ordering_fields = BlogPostKeysetPagination.ordering_fields
     # permission_classes = [IsAuthenticated, ReadOnlyOrIsOwnerOrAdmin]
 
     def get_permissions(self):
         if self.action == 'retrieve' or self.action == 'list' or self.action == 'archived_posts':
             self.permission_classes = [AllowAny]
+        elif self.action == 'cover' or self.action == 'image':
+            # Readable like the post itself, documents fall through to the login below
+            self.permission_classes = [AllowAny]
         else:
             self.permission_classes = [IsAuthenticated, ReadOnlyOrIsOwnerOrAdmin]
         return [permission() for permission in self.permission_classes]
@@ -75,38 +116,88 @@ class BlogPostViewSet(ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return BlogPostDetailSerializer
-        elif self.action == 'create' or self.action == 'update':
+        elif self.action in ('create', 'update', 'partial_update'):
             return BlogPostCreateUpdateSerializer
         elif self.action == 'publish':
             return  BlogPostListSerializer
         elif self.action == 'reorder_blog_posts':
             return BlogPostReorderSerializer
+        elif self.action == 'bulk_create' or self.action == 'bulk_update':
+            return BlogPostBulkSerializer
+        elif self.action == 'bulk_delete':
+            return BlogPostBulkDeleteSerializer
+        elif self.action == 'export' or self.action == 'export_archived':
+            return BlogPostExportSerializer
+        elif self.action == 'restore_archived_posts':
+            return BlogPostRestoreSerializer
+        elif self.action == 'move':
+            return BlogPostMoveSerializer
         elif self.action == 'send_blog_post_to_email':
             return BlogPostSendEmailSerializer
         elif self.action == 'create_blog_post_cover':
-            return BlogPostCoverSerializer
+            return BlogPostCoverUploadSerializer
+        elif self.action in ('document_uploads', 'document_upload', 'put_document_upload_chunk'):
+            return DocumentUploadSessionSerializer
+        elif self.action == 'finalize_document_upload':
+            return DocumentUploadFinalizeSerializer
+        elif self.action == 'cover' or self.action == 'image':
+            return BlogPostImageVariantSerializer
+        elif self.action == 'list' and settings.BLOG_POST_FAST_LIST_SERIALIZER:
+            return BlogPostListValuesSerializer
         else:
             return BlogPostListSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('update', 'partial_update'):
+            # The cover upsert replaces the loaded cover, see BlogPostCreateUpdateSerializer.update()
+            queryset = queryset.select_related('cover')
+        return queryset
+
+    @conditional_response()
+    @cache_response('blog_post_list')
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_values_queryset'):
+            queryset = serializer_class.get_values_queryset(queryset, **self.get_fieldset())
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response({
-                "total_products": queryset.count(),
-                "paginated_results": serializer.data
-            })
+            data = {"paginated_results": serializer.data}
+            # The keyset paginator only counts when the client asks for ?count=true
+            if self.paginator.count is not None:
+                data = {"total_products": self.paginator.count, **data}
+            return self.get_paginated_response(data)
         # If pagination is not used
         serializer = self.get_serializer(queryset, many=True)
         return Response({
-            "total_products": queryset.count(),
+            "total_products": self.get_count(queryset),
             "paginated_results": serializer.data
         })
 
+    @conditional_response(detail=True)
+    @cache_response('blog_post_detail', detail=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_count(self, queryset):
+        # Unfiltered and category-only lists are answered from the counters table
+        active_filters = {
+            name: self.request.query_params[name]
+            for name in self.filterset_class.base_filters
+            if self.request.query_params.get(name, '') != ''
+        }
+        if not active_filters:
+            return counters.get_count('live')
+        if list(active_filters) == ['category']:
+            return counters.get_count(f"category:{active_filters['category']}")
+        return queryset.count()
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.deleted = True
+        instance.deleted_at = timezone.now()
         instance.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -125,11 +216,69 @@ class BlogPostViewSet(ModelViewSet):
         return Response({'status': 'archived'}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
+    @cache_response('blog_post_archived')
     def archived_posts(self, request):
-        archived_posts = BlogPost.objects.filter(archived=True)
-        serializer = self.get_serializer(archived_posts, many=True)
+        # Posts archived since the last archive_blog_posts run are still in the hot table
+        archived_posts = list(self.setup_eager_loading(BlogPost.objects.filter(archived=True)))
+        fieldset = {key: value for key, value in self.get_fieldset().items() if value is not None}
+        cold_posts, field_names = ArchivedBlogPostSerializer.prune_queryset(
+            ArchivedBlogPost.objects.filter(archived=True), required=['order'], **fieldset)
+        cold_posts = list(ArchivedBlogPostSerializer.setup_eager_loading(cold_posts, field_names))
+
+        data = [
+            *self.get_serializer(archived_posts, many=True).data,
+            *ArchivedBlogPostSerializer(
+                cold_posts, many=True, context=self.get_serializer_context(), **fieldset).data,
+        ]
+        keys = [(blog_post.order, blog_post.id) for blog_post in [*archived_posts, *cold_posts]]
+        data = [item for key, item in sorted(zip(keys, data), key=lambda pair: pair[0])]
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def restore_archived_posts(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        archived_posts = ArchivedBlogPost.objects.filter(pk__in=serializer.validated_data['ids'])
+        if not request.user.is_staff:
+            archived_posts = archived_posts.filter(owner=request.user)
+        restored = restore_blog_posts(archived_posts)
+        return Response({'restored': restored}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        serializer_class = self.get_serializer_class()
+        blog_posts = bulk_create_blog_posts(request.data, serializer_class, self.get_serializer_context())
+        serializer = serializer_class(blog_posts, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        serializer_class = self.get_serializer_class()
+        blog_posts = bulk_update_blog_posts(request.data, serializer_class, self.get_serializer_context())
+        serializer = serializer_class(blog_posts, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted = bulk_delete_blog_posts(serializer.validated_data['ids'], request.user)
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(iter_rows(queryset), serializer.validated_data['export_format'])
+
+    @action(detail=False, methods=['get'])
+    def export_archived(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return export_response(
+            iter_archived_rows(), serializer.validated_data['export_format'], filename='archived_blog_posts')
+
     @action(detail=False, methods=['post'])
     def delete_inactive_blog_posts(self, request):
         delete_inactive_blog_posts.delay()
@@ -142,6 +291,17 @@ class BlogPostViewSet(ModelViewSet):
         reorder_blog_posts.delay(**serializer.validated_data)
         return Response({'Process started successfully'}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        blog_post = self.get_object()
+        serializer = self.get_serializer(
+            data=request.data, context={**self.get_serializer_context(), 'blog_post': blog_post})
+        serializer.is_valid(raise_exception=True)
+        order, low_on_gaps = move_blog_post(blog_post, queryset=self.queryset, **serializer.validated_data)
+        if low_on_gaps:
+            transaction.on_commit(rebalance_blog_posts.delay)
+        return Response({'id': blog_post.id, 'order': order}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def send_blog_post_to_email(self, request, pk=None):
         blop_post = self.get_object()
@@ -156,23 +316,131 @@ class BlogPostViewSet(ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         image = serializer.validated_data.get('image')
-        file_path = default_storage.save(f"blog_post_covers/{image.name}", ContentFile(image.read()))
+        # Hashed while it was received, stored by moving the temporary file or copying it chunk by chunk.
+        # Stored where the cover field stores it, content already stored isn't written again.
+        sha256 = get_sha256(image)
+        field = BlogPostCover._meta.get_field('image')
+        file_path = field.storage.save(field.generate_filename(None, image.name), image)
 
-        create_blog_post_cover.delay(image_url=file_path, blog_post_id=blop_post.id)
-        return Response({'Process started successfully'}, status=status.HTTP_200_OK)
+        transaction.on_commit(partial(create_blog_post_cover.delay, image_url=file_path, blog_post_id=blop_post.id))
+        return Response({'status': 'Process started successfully', 'sha256': sha256}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def document_uploads(self, request, pk=None):
+        blog_post = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = upload_sessions.create_session(blog_post, request.user, **serializer.validated_data)
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+    def get_document_upload(self, upload_id):
+        blog_post = self.get_object()
+        # Readers of the post can't see its uploads, only the uploader and staff
+        sessions = DocumentUploadSession.objects.filter(blog_post=blog_post)
+        if not self.request.user.is_staff:
+            sessions = sessions.filter(owner=self.request.user)
+        return blog_post, get_object_or_404(sessions, pk=upload_id)
+
+    @action(detail=True, methods=['get'], url_path=r'document_uploads/(?P<upload_id>[0-9]+)')
+    def document_upload(self, request, pk=None, upload_id=None):
+        _, session = self.get_document_upload(upload_id)
+        return Response(self.get_serializer(session).data, status=status.HTTP_200_OK)
+
+    @document_upload.mapping.put
+    def put_document_upload_chunk(self, request, pk=None, upload_id=None):
+        _, session = self.get_document_upload(upload_id)
+        start, end = upload_sessions.parse_content_range(request.headers.get('Content-Range'), session.size)
+        # The body is read straight from the request, never parsed. DRF has no stream for an empty body.
+        session = upload_sessions.write_chunk(session, start, end, request.stream or BytesIO())
+        return Response(self.get_serializer(session).data, status=status.HTTP_200_OK)
+
+    @document_upload.mapping.delete
+    def delete_document_upload(self, request, pk=None, upload_id=None):
+        _, session = self.get_document_upload(upload_id)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], url_path=r'document_uploads/(?P<upload_id>[0-9]+)/finalize')
+    def finalize_document_upload(self, request, pk=None, upload_id=None):
+        blog_post, session = self.get_document_upload(upload_id)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        _, sha256 = upload_sessions.finalize_session(session, blog_post, serializer.validated_data.get('sha256'))
+        return Response({
+            'document': request.build_absolute_uri(blog_post.document.url),
+            'sha256': sha256,
+        }, status=status.HTTP_200_OK)
+
+    def get_media_object(self, queryset, **lookup):
+        # Only the file columns, without the eager loading of get_object()
+        obj = get_object_or_404(queryset, **lookup)
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, media.PassthroughRenderer])
+    def document(self, request, pk=None):
+        blog_post = self.get_media_object(self.queryset.only('id', 'owner_id', 'document'), pk=pk)
+        if not blog_post.document:
+            raise Http404
+        response = media.serve_file(request, blog_post.document.storage, blog_post.document.name, as_attachment=True)
+        patch_cache_control(response, private=True)
+        return response
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, media.PassthroughRenderer])
+    def cover(self, request, pk=None):
+        """The cover, or one of its variants with ?variant=<name>&variant_format=<webp|jpeg>."""
+        cover = self.get_media_object(
+            BlogPostCover.objects.filter(blog_post__in=self.queryset).only('id', 'blog_post_id', 'image', 'variants'),
+            blog_post_id=pk)
+        return self.serve_image(request, cover)
+
+    @action(detail=True, methods=['get'], url_path=r'images/(?P<image_id>[0-9]+)',
+            renderer_classes=[JSONRenderer, media.PassthroughRenderer])
+    def image(self, request, pk=None, image_id=None):
+        image = self.get_media_object(
+            BlogPostImage.objects.only('id', 'blog_post_id', 'image', 'variants'),
+            blog_post__in=self.queryset, blog_post_id=pk, pk=image_id)
+        return self.serve_image(request, image)
+
+    def serve_image(self, request, obj):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        variant = serializer.validated_data.get('variant')
+        if variant is None:
+            return media.serve_file(request, obj.image.storage, obj.image.name)
+        # Variants are written to the default storage
+        name = obj.variants.get(variant, {}).get(serializer.validated_data['variant_format'])
+        if not name:
+            raise Http404
+        return media.serve_file(request, default_storage, name)
 
     def partial_update(self, request, *args, **kwargs):
         kwargs['partial'] = True
         # code
         return self.update(request, *args, **kwargs)
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
 
-    def get_serializer(self, *args, **kwargs):
+    def get_default_fields(self):
         if self.action == 'list':
-            kwargs['fields'] = ('first_name', 'last_name')
+            return ('first_name', 'last_name')
         elif self.action == 'update':
-            kwargs['fields'] = ('first_name', 'last_name', 'email')
-        return super().get_serializer(*args, **kwargs)
+            return ('first_name', 'last_name', 'email')
+        return None
+
+
+class InstrumentationReportView(APIView):
+    """Per-view request costs collected by RequestInstrumentationMiddleware in this process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.BLOG_REQUEST_INSTRUMENTATION,
+            'views': instrumentation.get_report(),
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        instrumentation.reset_report()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -68,6 +69,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'blog.middleware.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -151,6 +153,12 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Django's handlers, hashing every upload while it is received (see blog.uploads)
+FILE_UPLOAD_HANDLERS = [
+    'blog.uploads.HashingMemoryFileUploadHandler',
+    'blog.uploads.HashingTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -167,6 +175,73 @@ EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "no-reply@example.com")
 
 
+# Shared by the web and Celery workers, the response cache versions (see blog.cache) are
+# bumped by one process and read by all of them. Redis database 1, the broker uses 0.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
+if sys.argv[1:2] == ['test']:
+    # The test runner is a single process and has no Redis
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'blog-post',
+        }
+    }
+
+# Seconds a cached BlogPost list/detail response is kept, writes invalidate it earlier
+BLOG_POST_RESPONSE_CACHE_TIMEOUT = 60 * 5
+# Seconds a list filtered relative to the current time (?recent=) is cached and keeps its ETag
+BLOG_POST_TIME_FILTER_BUCKET = 60
+
+# Serve BlogPostViewSet.list from .values() rows instead of model instances
+BLOG_POST_FAST_LIST_SERIALIZER = True
+
+# Most items accepted by one bulk create/update/delete request
+BLOG_POST_BULK_MAX_BATCH_SIZE = 1000
+
+# Soft-deleted BlogPosts move to the archive table after this many days
+BLOG_POST_ARCHIVE_DELETED_AFTER_DAYS = 7
+# Soft-deleted BlogPosts are purged with their files after this many days
+BLOG_POST_PURGE_AFTER_DAYS = 30
+# Seconds the purge job sleeps between chunks so live traffic gets the write lock
+BLOG_POST_PURGE_PAUSE = 0.1
+# Hours an unreferenced media blob is kept before collect_media_garbage deletes it, so an upload
+# stored before the row pointing at it is written survives
+BLOG_MEDIA_BLOB_GRACE_HOURS = 24
+
+# Chunked BlogPost.document uploads (see blog.upload_sessions) are assembled here, on the
+# filesystem of MEDIA_ROOT so finalizing moves the file instead of copying it
+BLOG_DOCUMENT_UPLOAD_DIR = os.path.join(BASE_DIR, 'document_uploads')
+# Largest document accepted by an upload session, in bytes
+BLOG_DOCUMENT_UPLOAD_MAX_SIZE = 4 * 2 ** 30
+# Hours an upload session lives after its last chunk before delete_expired_document_uploads removes it
+BLOG_DOCUMENT_UPLOAD_EXPIRY_HOURS = 24
+
+# How the media actions of BlogPostViewSet hand files to the front proxy (see blog.media):
+# 'x-accel-redirect' (nginx), 'x-sendfile' (Apache mod_xsendfile, lighttpd) or None to stream them from Django
+BLOG_MEDIA_OFFLOAD = None
+# The nginx `internal` location aliasing MEDIA_ROOT, for 'x-accel-redirect'
+BLOG_MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Server-Timing headers and the per-view cost report at /blog/instrumentation_report/,
+# the middleware removes itself when this is off
+BLOG_REQUEST_INSTRUMENTATION = False
+
+# Resized copies generated for every cover and gallery image, name: (max width, max height)
+BLOG_IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 320),
+    'full': (1600, 1600),
+}
+# Every variant is written in each of these formats, 'webp' and/or 'jpeg'
+BLOG_IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+BLOG_IMAGE_VARIANT_QUALITY = 80
+
+
 # Celery configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'